@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks (time and peak memory) of loading and querying results images.
+"""
+from qa4sm_reader.img import QA4SMImg
+from qa4sm_reader.plot_utils import geotraj_to_geo2d
+from .common import sizes, results_file
+
+class Load:
+    params = (sizes, [2, 6])
+    param_names = ['n_points', 'n_datasets']
+    timeout = 600
+
+    def setup(self, n_points, n_datasets):
+        self.filepath = results_file(n_points, n_datasets)
+
+    def time_load(self, n_points, n_datasets):
+        QA4SMImg(self.filepath)
+
+    def peakmem_load(self, n_points, n_datasets):
+        QA4SMImg(self.filepath)
+
+    def time_load_lazy(self, n_points, n_datasets):
+        QA4SMImg(self.filepath, lazy=True)
+
+    def peakmem_load_lazy(self, n_points, n_datasets):
+        QA4SMImg(self.filepath, lazy=True)
+
+    def time_load_extent(self, n_points, n_datasets):
+        QA4SMImg(self.filepath, extent=(-10, 30, 35, 60), lazy=True)
+
+class LoadTC:
+    params = (sizes, [3, 6])
+    param_names = ['n_points', 'n_datasets']
+    timeout = 600
+
+    def setup(self, n_points, n_datasets):
+        self.filepath = results_file(n_points, n_datasets, tc=True)
+
+    def time_load(self, n_points, n_datasets):
+        QA4SMImg(self.filepath)
+
+    def peakmem_load(self, n_points, n_datasets):
+        QA4SMImg(self.filepath)
+
+class Query:
+    params = sizes
+    param_names = ['n_points']
+    timeout = 600
+
+    def setup(self, n_points):
+        self.img = QA4SMImg(results_file(n_points, 3, tc=True))
+        self.lazy_img = QA4SMImg(results_file(n_points, 3, tc=True), lazy=True)
+
+    def time_metric_df(self, n_points):
+        self.img.metric_df('R')
+
+    def time_metric_df_tc(self, n_points):
+        self.img.metric_df('snr')
+
+    def time_metric_df_lazy(self, n_points):
+        self.lazy_img.metric_df('R')
+        self.lazy_img.release_values()
+
+    def peakmem_metric_df_lazy(self, n_points):
+        self.lazy_img.metric_df('R')
+        self.lazy_img.release_values()
+
+    def time_metric_stats(self, n_points):
+        self.img._stats.clear()
+        self.img.metric_stats('R')
+
+    def time_iter_variables(self, n_points):
+        for _ in self.lazy_img.iter_variables():
+            pass
+
+    def peakmem_iter_variables(self, n_points):
+        for _ in self.lazy_img.iter_variables():
+            pass
+
+    def time_query_bbox(self, n_points):
+        self.img.query_bbox(-10, 30, 35, 60)
+
+class GeotrajToGeo2d:
+    params = sizes
+    param_names = ['n_points']
+    timeout = 600
+
+    def setup(self, n_points):
+        img = QA4SMImg(results_file(n_points, 2), lazy=True)
+        self.var = img.ls_vars(False)[1]
+        self.df = img._ds2df([self.var])
+        self.grid_stepsize = img.ref_dataset_grid_stepsize
+
+    def time_geotraj_to_geo2d(self, n_points):
+        geotraj_to_geo2d(self.df, self.var, grid_stepsize=self.grid_stepsize)
+
+    def peakmem_geotraj_to_geo2d(self, n_points):
+        geotraj_to_geo2d(self.df, self.var, grid_stepsize=self.grid_stepsize)
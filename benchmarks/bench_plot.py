@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks (time and peak memory) of the box plots, maps and plot_all.
+"""
+from qa4sm_reader.img import QA4SMImg
+from qa4sm_reader.plotter import QA4SMPlotter
+from qa4sm_reader.plot_all import plot_all
+from .common import sizes, results_file
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import shutil
+import tempfile
+
+class Plot:
+    params = ([n for n in sizes if n <= 10 ** 6], [False, True])
+    param_names = ['n_points', 'scattered']
+    timeout = 900
+
+    def setup(self, n_points, scattered):
+        self.img = QA4SMImg(results_file(n_points, 3, scattered=scattered), lazy=True)
+        self.var = [var for var in self.img.ls_vars(False) if var.startswith('R_')][0]
+        self.out_dir = tempfile.mkdtemp()
+        self.plotter = QA4SMPlotter(self.img, out_dir=self.out_dir)
+
+    def teardown(self, n_points, scattered):
+        plt.close('all')
+        shutil.rmtree(self.out_dir)
+
+    def time_boxplot_basic(self, n_points, scattered):
+        self.plotter.boxplot_basic('R', out_type='png')
+
+    def time_mapplot(self, n_points, scattered):
+        self.plotter.mapplot_var(self.var, out_type='png')
+
+    def peakmem_mapplot(self, n_points, scattered):
+        self.plotter.mapplot_var(self.var, out_type='png')
+
+class PlotAll:
+    params = [n for n in sizes if n <= 10 ** 5]
+    param_names = ['n_points']
+    timeout = 1800
+
+    def setup(self, n_points):
+        self.filepath = results_file(n_points, 3, tc=True)
+        self.out_dir = tempfile.mkdtemp()
+
+    def teardown(self, n_points):
+        plt.close('all')
+        shutil.rmtree(self.out_dir)
+
+    def time_plot_all(self, n_points):
+        plot_all(self.filepath, out_dir=self.out_dir)
+
+    def peakmem_plot_all(self, n_points):
+        plot_all(self.filepath, out_dir=self.out_dir)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic results files shared by the benchmarks. The files are created on
+first use and kept in QA4SM_BENCH_DIR (default: a directory in the temp dir),
+so that each file is only created once for all benchmarks and runs.
+"""
+from qa4sm_reader.synthetic import create_results
+import os
+import tempfile
+
+bench_dir = os.environ.get('QA4SM_BENCH_DIR',
+                           os.path.join(tempfile.gettempdir(), 'qa4sm_bench'))
+
+# number of locations, 1e7 only if QA4SM_BENCH_LARGE is set (takes long and needs a lot of memory)
+sizes = [10 ** 3, 10 ** 5, 10 ** 6]
+if os.environ.get('QA4SM_BENCH_LARGE'):
+    sizes.append(10 ** 7)
+
+def results_file(n_points:int, n_datasets:int=2, tc:bool=False, scattered:bool=False) -> str:
+    """ Path of a synthetic results file with these settings, created if it does not exist """
+    out_dir = os.path.join(bench_dir, 'n{}_ds{}{}{}'.format(
+        n_points, n_datasets, '_tc' if tc else '', '_scattered' if scattered else ''))
+    if not os.path.isdir(out_dir):  # create in a temporary directory, so that no partial files are used
+        os.makedirs(bench_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=bench_dir)
+        create_results(tmp_dir, n_points=n_points, n_datasets=n_datasets, tc=tc,
+                       scattered=scattered)
+        os.rename(tmp_dir, out_dir)
+    fname = [f for f in os.listdir(out_dir) if f.endswith('.nc')][0]
+    return os.path.join(out_dir, fname)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache for parsed qa4sm results, stored as sidecar files (json for
+metadata, npz for arrays) in a cache directory with size based LRU eviction.
+"""
+from qa4sm_reader import globals
+import os
+import json
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+
+class QA4SMCache(object):
+    """
+    Directory of cache entries. Each entry consists of a json file with
+    metadata and an optional npz file with arrays, both named after the key.
+    The least recently used entries are deleted when the total size of the
+    directory exceeds max_size.
+    """
+    def __init__(self, cache_dir, max_size=globals.cache_max_size):
+        """
+        Parameters
+        ----------
+        cache_dir : str
+            Directory to store the cache files in, is created if it does not exist.
+        max_size : int, optional (default: from globals)
+            Maximum size of all cache files in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)  # workers may create it at the same time
+
+    @staticmethod
+    def file_key(filepath, **settings) -> str:
+        """
+        Create a key for a file and the settings it was read with. The key
+        changes when the file is modified (path, modification time and size).
+        For directories (zarr stores), the latest modification time and the
+        total size of all files in it are used.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the file (or directory) that is cached.
+        settings : dict
+            Additional settings that change the cached content.
+
+        Returns
+        -------
+        key : str
+            Hash of the file path, mtime, size and the settings.
+        """
+        if os.path.isdir(filepath):
+            stats = [os.stat(os.path.join(root, f))
+                     for root, _, files in os.walk(filepath) for f in files]
+            mtime = max([s.st_mtime_ns for s in stats], default=0)
+            size = sum(s.st_size for s in stats)
+        else:
+            stat = os.stat(filepath)
+            mtime, size = stat.st_mtime_ns, stat.st_size
+        parts = [os.path.abspath(filepath), mtime, size,
+                 sorted((k, repr(v)) for k, v in settings.items())]
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key, ext) -> str:
+        return os.path.join(self.cache_dir, key + ext)
+
+    def _write_atomic(self, path, write):
+        """ Write to a temporary file first, so that readers never see partial files """
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def read_meta(self, key) -> dict or None:
+        """ Get the metadata of an entry, None if it is not cached """
+        path = self._path(key, '.json')
+        try:
+            with open(path, 'r') as f:
+                meta = json.load(f)
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):  # also if it was evicted by another process meanwhile
+            return None
+        return meta
+
+    def write_meta(self, key, meta:dict):
+        """ Store the metadata of an entry and evict old entries if necessary """
+        self._write_atomic(self._path(key, '.json'),
+                           lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        self.evict()
+
+    def open_arrays(self, key) -> np.lib.npyio.NpzFile or None:
+        """ Open the arrays of an entry, they are read on access by name """
+        try:
+            return np.load(self._path(key, '.npz'), allow_pickle=False)
+        except OSError:
+            return None
+
+    def write_arrays(self, key, arrays):
+        """
+        Store arrays for an entry. Arrays are written one after another, so
+        they don't have to be in memory at the same time.
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry.
+        arrays : iterable
+            (name, np.array) pairs to store.
+        """
+        def write(f):
+            with zipfile.ZipFile(f, mode='w', compression=zipfile.ZIP_STORED,
+                                 allowZip64=True) as zf:
+                for name, arr in arrays:
+                    with zf.open(name + '.npy', mode='w', force_zip64=True) as af:
+                        np.lib.format.write_array(af, np.asanyarray(arr),
+                                                  allow_pickle=False)
+
+        self._write_atomic(self._path(key, '.npz'), write)
+
+    def _entries(self) -> dict:
+        """ Size and last use of all entries, with the key as the key """
+        entries = dict()
+        for fname in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(fname)
+            if ext not in ['.json', '.npz']:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, fname))
+            except FileNotFoundError:  # evicted by another process meanwhile
+                continue
+            size, used = entries.get(key, (0, 0))
+            used = max(used, stat.st_mtime) if ext == '.json' else used
+            entries[key] = (size + stat.st_size, used)
+        return entries
+
+    def evict(self):
+        """ Delete the least recently used entries until the cache fits into max_size """
+        entries = self._entries()
+        total = sum(size for size, _ in entries.values())
+        for key in sorted(entries.keys(), key=lambda k: entries[k][1]):
+            if total <= self.max_size:
+                break
+            for ext in ['.json', '.npz']:
+                try:
+                    os.remove(self._path(key, ext))
+                except OSError:
+                    pass
+            total -= entries[key][0]
+
+    def clear(self):
+        """ Delete all entries """
+        for key in self._entries().keys():
+            for ext in ['.json', '.npz']:
+                try:
+                    os.remove(self._path(key, ext))
+                except OSError:
+                    pass
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Collection of QA4SM validation result images, loaded and queried in parallel.
+"""
+from qa4sm_reader.img import QA4SMImg
+from qa4sm_reader.handlers import QA4SMAttributes
+from qa4sm_reader.zarr_store import is_zarr
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import glob
+import pandas as pd
+
+def _find_files(paths) -> list:
+    """ Get the sorted netcdf files (and zarr stores) from a directory, a glob pattern or a list of paths """
+    if isinstance(paths, str):
+        if is_zarr(paths):
+            filepaths = [paths]
+        elif os.path.isdir(paths):
+            filepaths = glob.glob(os.path.join(paths, '*.nc')) + \
+                        glob.glob(os.path.join(paths, '*.zarr'))
+        else:
+            filepaths = glob.glob(paths)
+    else:
+        filepaths = list(paths)
+    return sorted(filepaths)
+
+def _load_img(filepath, img_kwargs) -> QA4SMImg:
+    """
+    Open a single image, module level function so that it can run in a
+    process pool. The image is opened lazily, so that only the parsed
+    variables (and no values) are sent back to the parent process.
+    """
+    return QA4SMImg(filepath, **dict(img_kwargs, lazy=True))
+
+class QA4SMImgCollection(object):
+    """
+    Multiple QA4SM validation results images, e.g. all results of a campaign.
+    """
+    def __init__(self, paths, workers=None, **img_kwargs):
+        """
+        Open all results files in parallel. Files are opened in a process
+        pool, as opening netcdf files concurrently in threads is not safe
+        (HDF5 is not thread safe). Images are always opened lazily, the values
+        of a variable are read (in this process) when they are first accessed.
+
+        Parameters
+        ----------
+        paths : str or list
+            A directory (all *.nc files and *.zarr stores in it are loaded),
+            a glob pattern or a list of paths to results files.
+        workers : int or None, optional (default: None)
+            Number of parallel workers, if None, the number of cores is used.
+        **img_kwargs : dict, optional
+            Keyword arguments that are passed to QA4SMImg, e.g. extent,
+            metrics or chunks.
+        """
+        self.filepaths = _find_files(paths)
+        self.workers = workers
+        self.img_kwargs = img_kwargs
+
+        self.imgs = self._load_imgs()
+
+    def _keys(self) -> list:
+        """ File names to refer to the images, the paths if names are not unique """
+        names = [os.path.basename(path) for path in self.filepaths]
+        if len(set(names)) == len(names):
+            return names
+        else:
+            return list(self.filepaths)
+
+    def _load_imgs(self) -> OrderedDict:
+        """ Load all images in parallel, ordered as the file paths """
+        if len(self.filepaths) == 0:
+            return OrderedDict()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            imgs = list(pool.map(_load_img, self.filepaths,
+                                 [self.img_kwargs] * len(self.filepaths)))
+        return OrderedDict(zip(self._keys(), imgs))
+
+    def __len__(self):
+        return len(self.imgs)
+
+    def __iter__(self):
+        return iter(self.imgs.items())
+
+    def __getitem__(self, key) -> QA4SMImg:
+        return self.imgs[key]
+
+    def ls_metrics(self) -> list:
+        """ Get the sorted list of metrics that are in any of the images """
+        metrics = set()
+        for img in self.imgs.values():
+            metrics.update(str(m) for m in img.ls_metrics(as_groups=False))
+        return sorted(metrics)
+
+    def metadata(self) -> pd.DataFrame:
+        """
+        Get the datasets, versions and metrics of all images.
+
+        Returns
+        -------
+        meta : pd.DataFrame
+            One row per file, with the reference dataset and version, the
+            short names and versions of all datasets (reference first), the
+            metrics and the number of metric variables in the file.
+        """
+        rows = OrderedDict()
+        for key, img in self.imgs.items():
+            ref_names, other_names = QA4SMAttributes(img.ds.attrs, img.datasets).get_all_names()
+            names = [ref_names] + [other_names[dc] for dc in sorted(other_names.keys())]
+            rows[key] = {
+                'ref_dataset': ref_names['short_name'],
+                'ref_version': ref_names['short_version'],
+                'datasets': [n['short_name'] for n in names],
+                'versions': [n['short_version'] for n in names],
+                'metrics': [str(m) for m in img.ls_metrics(as_groups=False)],
+                'n_vars': len(img.ls_vars(as_groups=False))}
+        meta = pd.DataFrame.from_dict(rows, orient='index')
+        meta.index.name = 'file'
+        return meta
+
+    def _img_metric_df(self, img, metric) -> pd.DataFrame or None:
+        """ Metric frame of one image, frames of TC metrics are combined """
+        if metric not in img.ls_metrics(as_groups=False):
+            return None
+        df = img.metric_df(metric)
+        if isinstance(df, list):
+            df = pd.concat(df, axis=1, sort=True)
+        return df
+
+    def metric_df(self, metric, workers=None) -> pd.DataFrame:
+        """
+        Combine the variables for a metric from all images in one data frame.
+
+        Parameters
+        ----------
+        metric : str
+            Name of a metric, files that don't contain it are skipped.
+        workers : int or None, optional (default: None)
+            Number of threads to collect the frames with, if None, the
+            number of workers of the collection is used. Reads from the
+            (already opened) files are locked by xarray.
+
+        Returns
+        -------
+        df : pd.DataFrame
+            The variables in the columns, with the file as an additional
+            (first) index level. Variables that are not in a file are NaN.
+        """
+        workers = self.workers if workers is None else workers
+        keys = list(self.imgs.keys())
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            dfs = list(pool.map(lambda k: self._img_metric_df(self.imgs[k], metric), keys))
+        dfs = OrderedDict((k, df) for k, df in zip(keys, dfs) if df is not None)
+        if len(dfs) == 0:
+            raise ValueError("The metric '{}' is not in any of the files.".format(metric))
+        return pd.concat(dfs, names=['file'], sort=False)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Export of qa4sm results to columnar formats (Parquet and Arrow IPC), and
+readers for the exported files. Requires pyarrow.
+"""
+from qa4sm_reader import globals
+import numpy as np
+import json
+
+_meta_key = b'qa4sm'  # key of the qa4sm metadata in the (schema and field) metadata
+
+def _var_meta(Var) -> dict:
+    """ Metadata of a variable, as stored with its column """
+    ref_meta, dss_meta, mds_meta = Var.get_varmeta()
+    return {'metric': Var.metric, 'group': Var.g,
+            'ref': list(ref_meta) if ref_meta is not None else None,
+            'datasets': [list(m) for m in dss_meta] if dss_meta is not None else None,
+            'metric_dataset': list(mds_meta) if mds_meta is not None else None}
+
+def _region_order(img, regions:dict) -> (np.array, list):
+    """
+    Order of the locations so that the locations of each region are in one
+    block, and the name and number of locations of each block. A location
+    belongs to the first region it is in, locations that are in no region
+    are put into a last block without a name. Empty regions get no block.
+    """
+    n = len(img.spatial_index)
+    assigned = np.zeros(n, dtype=bool)
+    order, blocks = [], []
+    for name, extent in regions.items():
+        idx = img.spatial_index.bbox(*extent)
+        idx = idx[~assigned[idx]]
+        if len(idx) == 0:  # no block for empty regions
+            continue
+        assigned[idx] = True
+        order.append(idx)
+        blocks.append([name, len(idx)])
+    rest = np.flatnonzero(~assigned)
+    if len(rest) > 0:
+        order.append(rest)
+        blocks.append([None, len(rest)])
+    return np.concatenate(order) if order else np.array([], dtype=np.int64), blocks
+
+def to_arrow_table(img, metrics:list=None, regions:dict=None):
+    """
+    Combine the locations and the metric variables of an image in a table.
+
+    Parameters
+    ----------
+    img : QA4SMImg
+        The results, must be stored as a list of locations.
+    metrics : list or None, optional (default: None)
+        Metrics to export the variables of, if None are passed, all loaded
+        variables are exported.
+    regions : dict or None, optional (default: None)
+        Region names and their extents (min_lon, max_lon, min_lat, max_lat).
+        Locations are ordered by region and the region is stored in an
+        additional column.
+
+    Returns
+    -------
+    table : pyarrow.Table
+        Table with lat, lon, (gpi), (region) and one column per variable.
+        The dataset names and versions are stored in the metadata of the
+        schema, the metadata of each variable in the metadata of its column.
+    """
+    import pyarrow as pa
+
+    if img._loc_dim is None:
+        raise NotImplementedError(
+            "Export is only supported for results that are stored as a list "
+            "of locations.")
+
+    if regions is not None:
+        order, blocks = _region_order(img, regions)
+        region = np.repeat(np.arange(len(blocks)), [n for _, n in blocks])
+    else:
+        n = img.ds.sizes[img._loc_dim]
+        order, blocks = None, [[None, n]] if n > 0 else []
+        region = None
+
+    def column(values):
+        values = np.asarray(values)
+        return values[order] if order is not None else values
+
+    lat, lon = img.index_names
+    names = [lat, lon]
+    arrays = [pa.array(column(img.ds[lat].values)), pa.array(column(img.ds[lon].values))]
+    fields_meta = [None, None]
+    if globals.gpi_name in img.ds.variables:
+        names.append(globals.gpi_name)
+        arrays.append(pa.array(column(img.ds[globals.gpi_name].values)))
+        fields_meta.append(None)
+    if region is not None:
+        names.append('region')
+        named = [name for name, _ in blocks if name is not None]  # the unnamed block is last
+        arrays.append(pa.DictionaryArray.from_arrays(
+            pa.array(region, type=pa.int32(), mask=region >= len(named)),
+            pa.array(named, type=pa.string())))
+        fields_meta.append(None)
+
+    for varname, Var in img._vars.items():
+        if (metrics is not None) and (Var.metric not in metrics):
+            continue
+        names.append(varname)
+        arrays.append(pa.array(column(img.ds[varname].values), from_pandas=True))
+        fields_meta.append(_var_meta(Var))
+
+    fields = [pa.field(name, array.type, metadata=None if meta is None else
+                       {_meta_key: json.dumps(meta).encode('utf-8')})
+              for name, array, meta in zip(names, arrays, fields_meta)]
+
+    ref_names, other_names = img.datasets.names(img.datasets.ref_dc), \
+        {dc: img.datasets.names(dc) for dc in img.datasets.other_dcs.keys()}
+    meta = {'filename': img.filename,
+            'ref_dc': img.datasets.ref_dc,
+            'ref_dataset': ref_names,
+            'datasets': {str(dc): names for dc, names in sorted(other_names.items())},
+            'regions': blocks}
+    schema = pa.schema(fields, metadata={_meta_key: json.dumps(meta).encode('utf-8')})
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def _blocks(table) -> list:
+    """ The region blocks of a table, from the schema metadata """
+    return json.loads(table.schema.metadata[_meta_key])['regions']
+
+def to_parquet(img, path:str, metrics:list=None, regions:dict=None, **kwargs):
+    """
+    Export the variables of an image to a Parquet file, with one row group
+    per region.
+
+    Parameters
+    ----------
+    img : QA4SMImg
+        The results, must be stored as a list of locations.
+    path : str
+        Path of the Parquet file to create.
+    metrics : list or None, optional (default: None)
+        Metrics to export, if None are passed, all are exported.
+    regions : dict or None, optional (default: None)
+        Region names and extents, see to_arrow_table.
+    **kwargs : dict, optional
+        Additional keyword arguments for pyarrow.parquet.ParquetWriter,
+        e.g. compression.
+    """
+    import pyarrow.parquet as pq
+
+    table = to_arrow_table(img, metrics=metrics, regions=regions)
+    with pq.ParquetWriter(path, table.schema, **kwargs) as writer:
+        start = 0
+        for _, n in _blocks(table):
+            writer.write_table(table.slice(start, n), row_group_size=n)
+            start += n
+
+def to_arrow(img, path:str, metrics:list=None, regions:dict=None):
+    """
+    Export the variables of an image to an (uncompressed) Arrow IPC file,
+    with one record batch per region. The file can be memory mapped with
+    read_arrow.
+
+    Parameters
+    ----------
+    img : QA4SMImg
+        The results, must be stored as a list of locations.
+    path : str
+        Path of the Arrow file to create.
+    metrics : list or None, optional (default: None)
+        Metrics to export, if None are passed, all are exported.
+    regions : dict or None, optional (default: None)
+        Region names and extents, see to_arrow_table.
+    """
+    import pyarrow as pa
+
+    table = to_arrow_table(img, metrics=metrics, regions=regions)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            start = 0
+            for _, n in _blocks(table):
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [col.chunk(0).slice(start, n) for col in table.columns],
+                    schema=table.schema))
+                start += n
+
+def _region_indices(blocks:list, regions:list) -> list:
+    """ Positions of the blocks (row groups, batches) of the selected regions """
+    if regions is None:
+        return list(range(len(blocks)))
+    return [i for i, (name, _) in enumerate(blocks) if name in regions]
+
+def read_arrow(path:str, columns:list=None, regions:list=None):
+    """
+    Read an exported Arrow file. The file is memory mapped, the columns of
+    the returned table point into the mapped file (no copies, no decoding).
+
+    Parameters
+    ----------
+    path : str
+        Path of the Arrow file (from to_arrow).
+    columns : list or None, optional (default: None)
+        Columns to select, if None are passed, all are returned.
+    regions : list or None, optional (default: None)
+        Names of the regions to read, if None are passed, all are read.
+
+    Returns
+    -------
+    table : pyarrow.Table
+        The exported table, the metadata is in its schema.
+    """
+    import pyarrow as pa
+
+    reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+    blocks = json.loads(reader.schema.metadata[_meta_key])['regions']
+    batches = [reader.get_batch(i) for i in _region_indices(blocks, regions)]
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+    return table.select(columns) if columns is not None else table
+
+def read_parquet(path:str, columns:list=None, regions:list=None):
+    """
+    Read an exported Parquet file, only the row groups of the selected
+    regions are read.
+
+    Parameters
+    ----------
+    path : str
+        Path of the Parquet file (from to_parquet).
+    columns : list or None, optional (default: None)
+        Columns to read, if None are passed, all are read.
+    regions : list or None, optional (default: None)
+        Names of the regions to read, if None are passed, all are read.
+
+    Returns
+    -------
+    table : pyarrow.Table
+        The exported table, the metadata is in its schema.
+    """
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path, memory_map=True)
+    blocks = json.loads(pf.schema_arrow.metadata[_meta_key])['regions']
+    return pf.read_row_groups(_region_indices(blocks, regions), columns=columns)
+
+def read_meta(table) -> (dict, dict):
+    """
+    Get the qa4sm metadata of an exported table.
+
+    Parameters
+    ----------
+    table : pyarrow.Table
+        Table from read_arrow or read_parquet.
+
+    Returns
+    -------
+    meta : dict
+        File name, reference dataset, other datasets and regions.
+    var_meta : dict
+        Metric, group and dataset names of each variable column.
+    """
+    meta = json.loads(table.schema.metadata[_meta_key])
+    var_meta = {field.name: json.loads(field.metadata[_meta_key])
+                for field in table.schema
+                if field.metadata is not None and _meta_key in field.metadata}
+    return meta, var_meta
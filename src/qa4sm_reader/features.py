@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Process wide cache of the NaturalEarth geometries drawn on maps. The
+shapefiles are read once per feature and resolution, the geometries are
+clipped to the map extent and projected once per extent and projection.
+Warm the cache before forking worker processes, so that they share it.
+"""
+from qa4sm_reader import globals
+from collections import OrderedDict
+import os
+from cartopy import config as cconfig
+import cartopy.feature as cfeature
+import cartopy.io.shapereader as shapereader
+from shapely.geometry import box
+cconfig['data_dir'] = os.path.join(os.path.dirname(__file__), 'cartopy')
+
+# features drawn by style_map: (category, name)
+map_features = [('physical', 'coastline'), ('physical', 'land'),
+                ('cultural', 'admin_0_countries')]
+
+_geometries = {}  # (category, name, resolution) -> geometries in globals.data_crs
+_clipped = OrderedDict()  # (category, name, resolution, extent, crs) -> geometries in crs
+
+def load_geometries(category, name, resolution) -> tuple:
+    """
+    Read the geometries of a NaturalEarth feature, the shapefile is read only
+    on the first call.
+
+    Parameters
+    ----------
+    category : str
+        'physical' or 'cultural'
+    name : str
+        Name of the feature, e.g. 'coastline'.
+    resolution : str
+        One of '10m', '50m' and '110m'.
+
+    Returns
+    -------
+    geometries : tuple
+        Shapely geometries in lon/lat.
+    """
+    key = (category, name, resolution)
+    if key not in _geometries:
+        path = shapereader.natural_earth(resolution=resolution, category=category, name=name)
+        _geometries[key] = tuple(shapereader.Reader(path).geometries())
+    return _geometries[key]
+
+def clipped_geometries(category, name, resolution, extent, crs=None) -> tuple:
+    """
+    Geometries of a NaturalEarth feature, clipped to the extent (plus a margin
+    of globals.feature_clip_pad degree) and projected to crs. Computed once
+    for each extent and projection.
+
+    Parameters
+    ----------
+    category, name, resolution : str
+        The feature, see load_geometries.
+    extent : tuple
+        (x_min, x_max, y_min, y_max) in lon/lat.
+    crs : cartopy.crs, optional (default: None)
+        Projection of the map, if None, globals.crs is used.
+
+    Returns
+    -------
+    geometries : tuple
+        Shapely geometries in crs that are not empty after clipping.
+    """
+    if crs is None:
+        crs = globals.crs
+    key = (category, name, resolution, tuple(float(e) for e in extent), crs)
+    if key in _clipped:
+        _clipped.move_to_end(key)
+        return _clipped[key]
+
+    pad = globals.feature_clip_pad
+    clip_box = box(max(extent[0] - pad, -180), max(extent[2] - pad, -90),
+                   min(extent[1] + pad, 180), min(extent[3] + pad, 90))
+    geometries = []
+    for geom in load_geometries(category, name, resolution):
+        if not geom.intersects(clip_box):
+            continue
+        if not clip_box.contains(geom):
+            geom = geom.intersection(clip_box)
+            if geom.is_empty:
+                continue
+        if crs != globals.data_crs:
+            geom = crs.project_geometry(geom, globals.data_crs)
+            if geom.is_empty:
+                continue
+        geometries.append(geom)
+    geometries = tuple(geometries)
+
+    _clipped[key] = geometries
+    while len(_clipped) > globals.feature_cache_size:
+        _clipped.popitem(last=False)
+    return geometries
+
+def get_feature(category, name, resolution, extent, crs=None, **kwargs) -> cfeature.ShapelyFeature:
+    """
+    A feature with the cached geometries for the map extent. Geometries are
+    already in the map projection, so cartopy does not project them again.
+
+    Parameters
+    ----------
+    category, name, resolution : str
+        The feature, see load_geometries.
+    extent : tuple
+        (x_min, x_max, y_min, y_max) in lon/lat.
+    crs : cartopy.crs, optional (default: None)
+        Projection of the map, if None, globals.crs is used.
+    **kwargs : dict, optional
+        Style of the feature, e.g. edgecolor and facecolor.
+    """
+    if crs is None:
+        crs = globals.crs
+    return cfeature.ShapelyFeature(
+        clipped_geometries(category, name, resolution, extent, crs), crs, **kwargs)
+
+def warm_feature_cache(resolutions=None, extent=None, crs=None, features=None):
+    """
+    Read the shapefiles (and clip and project the geometries if extent is
+    given) in advance, e.g. before worker processes are forked.
+
+    Parameters
+    ----------
+    resolutions : list, optional (default: None)
+        Resolutions to load, if None, globals.naturalearth_resolution.
+    extent : tuple, optional (default: None)
+        Map extent to prepare the clipped geometries for.
+    crs : cartopy.crs, optional (default: None)
+        Projection to prepare the geometries for, if None, globals.crs is used.
+    features : list, optional (default: None)
+        (category, name) of the features, if None, the features of style_map.
+    """
+    if resolutions is None:
+        resolutions = [globals.naturalearth_resolution]
+    elif isinstance(resolutions, str):
+        resolutions = [resolutions]
+    if features is None:
+        features = map_features
+    for resolution in resolutions:
+        for category, name in features:
+            if extent is None:
+                load_geometries(category, name, resolution)
+            else:
+                clipped_geometries(category, name, resolution, extent, crs)
+
+def clear_feature_cache(resolution=None):
+    """
+    Drop cached geometries, e.g. when the shapefiles were updated.
+
+    Parameters
+    ----------
+    resolution : str, optional (default: None)
+        Only drop the geometries of this resolution, if None, all are dropped.
+    """
+    for cache in [_geometries, _clipped]:
+        for key in list(cache.keys()):
+            if (resolution is None) or (key[2] == resolution):
+                del cache[key]
@@ -10,7 +10,9 @@ import cartopy.crs as ccrs
 matplotlib_ppi = 72  # Don't change this, it's a matplotlib convention.
 index_names = ['lat', 'lon']  # Names used for 'lattitude' and 'longitude' coordinate.
 time_name = 'time' # not used at the moment, dropped on load
+gpi_name = 'gpi' # grid point indices of the locations
 dpi = 100  # Resolution in which plots are going to be rendered.
+buffer_formats = ['.png', '.jpg', '.jpeg', '.tif', '.tiff']  # raster formats that are cut from one shared render when saving a plot in multiple formats
 title_pad = 12.0  # Padding below the title in points. default padding is matplotlib.rcParams['axes.titlepad'] = 6.0
 data_crs = ccrs.PlateCarree()  # Default map projection. use one of
 
@@ -18,11 +20,24 @@ data_crs = ccrs.PlateCarree()  # Default map projection. use one of
 scattered_datasets = ['ISMN']  # dataset names which require scatterplots (values is scattered in lat/lon)
 map_figsize = [11.32, 6.10]  # size of the output figure in inches.
 naturalearth_resolution = '110m'  # One of '10m', '50m' and '110m'. Finer resolution slows down plotting. see https://www.naturalearthdata.com/
+feature_clip_pad = 5.  # margin in degree around the map extent that NaturalEarth geometries are clipped to
+feature_cache_size = 64  # number of clipped and projected NaturalEarth features (by extent and projection) kept in memory
 crs = ccrs.PlateCarree()  # projection. Must be a class from cartopy.crs. Note, that plotting labels does not work for most projections.
 markersize = 4  # diameter of Marker in points.
 map_pad = 0.15  # padding relative to map height.
 grid_intervals = [2, 5, 10, 30]  # grid spacing in degree to choose from (plotter will try to make 5 gridlines in the smaller dimension)
 max_title_len = 8 * map_figsize[0]  # maximum length of plot title in chars. if longer, it will be broken in multiple lines.
+map_background_cache_size = 4  # number of styled base maps (by extent, projection and style) that a plotter keeps for reuse
+multi_map_ncols = 2  # number of panels per row in maps with all variables of a metric (QA4SMPlotter.mapplot_multi)
+multi_map_panel_size = [5.66, 3.05]  # size of each panel in inches in maps with all variables of a metric
+
+# === grid inference for maps ===
+grid_steps = [0.01, 0.05, 0.1, 0.25, 0.5, 1.]  # grid spacings (degree) of QA4SM datasets, inferred steps close to one are snapped to it
+grid_atol = 1e-5  # differences between coordinates (degree) below this are noise
+grid_step_rtol = 0.01  # tolerance of coordinate differences to multiples of the grid step, relative to the step
+grid_max_divisor = 10  # the grid step is searched among the smallest coordinate difference divided by 1 to this
+max_raster_bytes = 512 * 1024 ** 2  # maximum size of a map raster, values are binned into coarser cells if it would be larger
+lut_cache_size = 4  # number of nearest neighbour look-up tables (for oversampled irregular grids) kept in memory
 
 # === boxplot_basic defaults ===
 boxplot_printnumbers = True  # Print 'median', 'nObs', 'stdDev' to the boxplot_basic.
@@ -31,6 +46,33 @@ boxplot_height = 4.68
 boxplot_width = 1.7  # times (n+1), where n is the number of boxes.
 boxplot_title_len = 8 * boxplot_width  # times the number of boxes. maximum length of plot title in chars.
 
+# === summary statistics ===
+stats_quantiles = [0.025, 0.975]  # quantiles in the summary statistics, used for the value range of maps
+stats_whis = 1.5  # whiskers at the most extreme values within whis * IQR of the quartiles (as in boxplots)
+
+# === chunked (dask) backend ===
+chunked_quantile_bins = 10000  # histogram bins used to find quantiles chunk by chunk
+chunked_quantile_max_values = 100000  # bins with more values are divided further before their values are loaded
+
+# === spatial index ===
+spatial_index_cell_size = 1.  # size of the lat/lon cells in degree, that points are sorted into for spatial queries
+earth_radius = 6371000.  # mean earth radius in m, used for distances in spatial queries
+
+# === cache ===
+cache_max_size = 2 * 1024 ** 3  # maximum size of a cache directory in bytes, least recently used entries are deleted
+
+# === timing ===
+trace_env = 'QA4SM_TRACE'  # environment variable to enable the timing report of plot_all ('1' or a path to the report)
+trace_report = 'plot_all_timing.json'  # file name of the timing report of plot_all in the output directory
+
+# === zarr stores ===
+zarr_chunk_bytes = 4 * 1024 ** 2  # target size of the chunks (uncompressed, in bytes) of zarr stores converted from netcdf
+
+# === map tiles ===
+tile_size = 256  # width and height of exported XYZ tiles in pixels
+tile_zooms = [0, 1, 2, 3, 4, 5]  # zoom levels of exported XYZ tile pyramids
+tile_max_lat = 85.0511287798  # latitude limit of Web-Mercator tiles in degree
+
 # === watermark defaults ===
 watermark = u'made with QA4SM (qa4sm.eodc.eu)'  # Watermark string
 watermark_pos = 'bottom'  # Default position ('top' or 'bottom' or None)
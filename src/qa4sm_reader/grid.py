@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Inference of the regular lon/lat grid behind the locations of a qa4sm results
+file, for rasterizing the values of variables in maps.
+"""
+from qa4sm_reader import globals
+from collections import OrderedDict
+from pygeogrids.grids import BasicGrid, genreg_grid
+import hashlib
+import warnings
+import numpy as np
+import pandas as pd
+
+_luts = OrderedDict()  # nearest neighbour look-up tables of oversampled grids, by GridDescriptor.lut_key
+
+def _float_gcd(a, b, atol=1e-08):
+    "Greatest common divisor (=groesster gemeinsamer teiler)"
+    while abs(b) > atol:
+        a, b = b, a % b
+    return a
+
+def infer_step(a, atol=globals.grid_atol, rtol=globals.grid_step_rtol,
+               known_steps=globals.grid_steps, max_divisor=globals.grid_max_divisor):
+    """
+    Find the stepsize of the regular grid axis behind the coordinates a.
+    Differences between coordinates up to atol are treated as noise. The
+    largest step that all differences are (within rtol * step) a multiple
+    of is searched among the smallest difference divided by 1 to max_divisor,
+    and snapped to a known grid spacing if it is close to one.
+
+    Parameters
+    ----------
+    a : np.array
+        Coordinates (lon or lat) of the locations, in any order.
+    atol : float, optional (default: from globals)
+        Differences between coordinates below this are noise.
+    rtol : float, optional (default: from globals)
+        Tolerance of the differences to multiples of the step, relative to
+        the step.
+    known_steps : list, optional (default: from globals)
+        Grid spacings (of QA4SM datasets) to snap the step to.
+    max_divisor : int, optional (default: from globals)
+        Maximum number of steps that the smallest difference is divided into.
+
+    Returns
+    -------
+    step : float or None
+        The stepsize, None if there is only one coordinate or the
+        coordinates are not on a regular grid.
+    """
+    a = np.unique(np.asarray(a, dtype=np.float64))
+    d = np.diff(a)
+    d = d[d > atol]
+    if len(d) == 0:
+        return None
+    d = np.unique(d)
+    d_min = d[0]
+    for k in range(1, max_divisor + 1):
+        step = d_min / k
+        if np.all(np.abs(d - np.rint(d / step) * step) <= rtol * step):
+            for known in known_steps:
+                if abs(step - known) <= rtol * known:
+                    return known
+            return step
+    return None
+
+def _grid_axis(a) -> (float, float, float, int, bool):
+    "Parameters of the grid axis behind a and whether a is on a regular grid."
+    a = np.asarray(a, dtype=np.float64)
+    a_min, a_max = np.nanmin(a), np.nanmax(a)
+    da = infer_step(a)
+    regular = da is not None
+    if not regular:  # irregular or a single coordinate, use the smallest difference
+        d = np.diff(np.unique(a))
+        d = d[d > globals.grid_atol]
+        da = d.min() if len(d) > 0 else 1.
+    len_a = int(np.rint((a_max - a_min) / da)) + 1
+    return a_min, a_max, da, len_a, regular
+
+def _get_grid(a):
+    "Find the stepsize of the grid behind a and return the parameters for that grid axis."
+    return _grid_axis(a)[:4]
+
+def _get_grid_for_irregulars(a, grid_stepsize):
+    "Find the stepsize of the grid behind a for datasets with predeifned grid stepsize, and return the parameters for that grid axis."
+    a = np.asarray(a, dtype=np.float64)
+    a_min = np.nanmin(a)
+    a_max = np.nanmax(a)
+    da = grid_stepsize
+    len_a = int((a_max - a_min) / da + 1)
+    return a_min, a_max, da, len_a
+
+def _value2index(a, a_min, da):
+    "Return the indexes corresponding to a (the nearest grid point). a and the returned index is a numpy array."
+    return np.rint((a - a_min) / da).astype('int')
+
+def oversample_lut(lon, lat, extent, dx, dy) -> (np.array, BasicGrid):
+    """
+    Nearest neighbour look-up table from the cells of a regular grid to
+    irregular locations.
+
+    Parameters
+    ----------
+    lon, lat : np.array
+        Coordinates of the (irregular) locations.
+    extent : tuple
+        (x_min, x_max, y_min, y_max) of the regular grid.
+    dx, dy : float
+        Stepsize of the regular grid.
+
+    Returns
+    -------
+    lut : np.array
+        Position of the nearest location for each cell of the regular grid,
+        -1 where there is none within about one step.
+    reg_grid : BasicGrid
+        The regular grid, the raster is lut.reshape(-1, reg_grid.shape[1]).
+    """
+    other = BasicGrid(lon, lat)
+    reg_grid = genreg_grid(dx, dy, minlat=extent[2], maxlat=extent[3],
+                           minlon=extent[0], maxlon=extent[1])
+    max_dist = dx * 111 * 1000 # a mean distance for one degree it's around 111 km
+    lut = reg_grid.calc_lut(other, max_dist=max_dist)
+    return lut, reg_grid
+
+class GridDescriptor(object):
+    """
+    The regular grid behind a set of locations (origin, step and shape), with
+    the row and column of each location in the grid. Inferred once, e.g. for
+    all variables of an image, the values of a variable are then only
+    scattered into the 2d raster.
+
+    If the locations are not on a regular grid, or the raster would be larger
+    than max_bytes, the values are binned (averaged) into a coarser grid,
+    that fits into max_bytes.
+    """
+    def __init__(self, lon, lat, grid_stepsize=None, max_bytes=globals.max_raster_bytes,
+                 lut_cache=None):
+        """
+        Parameters
+        ----------
+        lon : np.array
+            Longitudes of the locations.
+        lat : np.array
+            Latitudes of the locations.
+        grid_stepsize : float, optional (default: None)
+            Angular grid stepsize of irregular grids (e.g. SMOS, ASCAT), that
+            are oversampled onto a regular grid of this stepsize. If None, the
+            stepsize is found from the locations.
+        max_bytes : int, optional (default: from globals)
+            Maximum size of the (float64) raster in bytes.
+        lut_cache : QA4SMCache, optional (default: None)
+            Cache to store the look-up table of oversampled grids in, it is
+            then shared by all files with the same locations.
+        """
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        self.lon, self.lat = lon, lat
+        self.lut_cache = lut_cache
+        self._lut = None
+        self._loc_index = None
+        self.grid_stepsize = grid_stepsize
+        self.binned = False
+        if grid_stepsize is None:
+            x_min, x_max, dx, len_x, x_regular = _grid_axis(lon)
+            y_min, y_max, dy, len_y, y_regular = _grid_axis(lat)
+            self.binned = not (x_regular and y_regular)  # irregular locations
+        else:
+            x_min, x_max, dx, len_x = _get_grid_for_irregulars(lon, grid_stepsize)
+            y_min, y_max, dy, len_y = _get_grid_for_irregulars(lat, grid_stepsize)
+
+        # === memory guard ===
+        itemsize = np.dtype(np.float64).itemsize
+        n_bytes = len_x * len_y * itemsize
+        if n_bytes > max_bytes:
+            factor = int(np.ceil(np.sqrt(n_bytes / max_bytes)))
+            while True:
+                len_x = int(np.rint((x_max - x_min) / (dx * factor))) + 1
+                len_y = int(np.rint((y_max - y_min) / (dy * factor))) + 1
+                if (len_x * len_y * itemsize <= max_bytes) or (len_x == len_y == 1):
+                    break
+                factor += 1
+            dx, dy = dx * factor, dy * factor
+            if grid_stepsize is None:
+                self.binned = True
+            else:
+                self.grid_stepsize = grid_stepsize * factor
+            warnings.warn('A raster of {:.0f} MB exceeds the limit of {:.0f} MB (globals.max_raster_bytes), '
+                          'values are binned into {} times coarser cells.'.format(
+                           n_bytes / 1024. ** 2, max_bytes / 1024. ** 2, factor))
+
+        self.origin = (x_min, y_min)
+        if self.irregular:  # the oversampled grid covers all locations
+            self.end = (x_max, y_max)
+        else:
+            self.end = (x_min + (len_x - 1) * dx, y_min + (len_y - 1) * dy)
+        self.step = (dx, dy)
+        self.shape = (len_y, len_x)
+        self.rows, self.cols = self.index(lon, lat)
+
+    @property
+    def irregular(self) -> bool:
+        """ Whether the locations are oversampled onto the grid """
+        return self.grid_stepsize is not None
+
+    @property
+    def data_extent(self) -> tuple:
+        """ (x_min, x_max, y_min, y_max) of the outer edges of the grid cells """
+        (x_min, y_min), (x_max, y_max), (dx, dy) = self.origin, self.end, self.step
+        return (x_min - dx / 2., x_max + dx / 2., y_min - dy / 2., y_max + dy / 2.)
+
+    def index(self, lon, lat) -> (np.array, np.array):
+        """
+        Rows and columns of locations in the grid.
+
+        Parameters
+        ----------
+        lon, lat : np.array
+            Coordinates of locations, e.g. of a subset of the locations
+            the grid was inferred from.
+
+        Returns
+        -------
+        rows : np.array
+            Row (lat) indices.
+        cols : np.array
+            Column (lon) indices.
+        """
+        rows = _value2index(np.asarray(lat, dtype=np.float64), self.origin[1], self.step[1])
+        cols = _value2index(np.asarray(lon, dtype=np.float64), self.origin[0], self.step[0])
+        return np.clip(rows, 0, self.shape[0] - 1), np.clip(cols, 0, self.shape[1] - 1)
+
+    def to_raster(self, values, lon=None, lat=None) -> np.ndarray:
+        """
+        Scatter values into the 2d raster of the grid. For binned grids, the
+        mean of the values in a cell is used.
+
+        Parameters
+        ----------
+        values : np.array
+            Values at the locations the grid was inferred from, or at the
+            passed locations.
+        lon, lat : np.array, optional (default: None)
+            Coordinates of the values, if None, the values must be in the
+            order of the locations of the grid.
+
+        Returns
+        -------
+        zz : np.ndarray
+            Raster of shape self.shape, NaN where there are no values.
+            [0,0] is the lower left corner, plot with origin='lower'.
+        """
+        if lon is None:
+            rows, cols = self.rows, self.cols
+        else:
+            rows, cols = self.index(lon, lat)
+        values = np.asarray(values, dtype=np.float64)
+        if not self.binned:
+            zz = np.full(self.shape, np.nan, dtype=np.float64)
+            zz[rows, cols] = values
+            return zz
+
+        valid = ~np.isnan(values)
+        cells = rows[valid] * self.shape[1] + cols[valid]
+        n_cells = self.shape[0] * self.shape[1]
+        counts = np.bincount(cells, minlength=n_cells)
+        sums = np.bincount(cells, weights=values[valid], minlength=n_cells)
+        zz = np.full(n_cells, np.nan, dtype=np.float64)
+        filled = counts > 0
+        zz[filled] = sums[filled] / counts[filled]
+        return zz.reshape(self.shape)
+
+    def positions(self, lon, lat) -> np.array:
+        """
+        Positions of locations in the locations of the grid, -1 for
+        locations that are not part of the grid.
+        """
+        if self._loc_index is None:
+            index = pd.MultiIndex.from_arrays([self.lat, self.lon])
+            first = ~index.duplicated()
+            self._loc_index = (index[first], np.flatnonzero(first))
+        index, first = self._loc_index
+        pos = index.get_indexer(pd.MultiIndex.from_arrays(
+            [np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)]))
+        return np.where(pos >= 0, first[pos], -1)
+
+    def lut_key(self) -> str:
+        """ Key of the look-up table, from the locations, step and extent """
+        h = hashlib.sha1()
+        h.update(self.lon.tobytes())
+        h.update(self.lat.tobytes())
+        h.update(repr((self.step, self.data_extent)).encode('utf-8'))
+        return 'lut_' + h.hexdigest()
+
+    def nn_lut(self) -> (np.array, int):
+        """
+        The nearest neighbour look-up table of the oversampled grid and the
+        number of columns of the grid (see oversample_lut). Computed once, kept in memory (for all grids with
+        the same locations, step and extent) and in lut_cache, if it is set.
+        """
+        if self._lut is not None:
+            return self._lut
+        key = self.lut_key()
+        if key in _luts:
+            _luts.move_to_end(key)
+            self._lut = _luts[key]
+            return self._lut
+
+        arrays = None
+        if (self.lut_cache is not None) and (self.lut_cache.read_meta(key) is not None):
+            arrays = self.lut_cache.open_arrays(key)
+        if arrays is not None:
+            self._lut = (arrays['lut'], int(arrays['n_cols']))
+        else:
+            lut, reg_grid = oversample_lut(self.lon, self.lat, self.data_extent, *self.step)
+            self._lut = (lut, reg_grid.shape[1])
+            if self.lut_cache is not None:
+                self.lut_cache.write_arrays(key, [('lut', self._lut[0]),
+                                                  ('n_cols', np.array(self._lut[1]))])
+                self.lut_cache.write_meta(key, {'n_locations': len(self.lon),
+                                                'step': list(self.step)})
+
+        _luts[key] = self._lut
+        while len(_luts) > globals.lut_cache_size:
+            _luts.popitem(last=False)
+        return self._lut
+
+    def oversample(self, values, lon=None, lat=None) -> np.ma.MaskedArray:
+        """
+        Sample values onto the oversampled grid with the nearest neighbour
+        look-up table.
+
+        Parameters
+        ----------
+        values : np.array
+            Values at the locations the grid was inferred from, or at the
+            passed locations.
+        lon, lat : np.array, optional (default: None)
+            Coordinates of the values, if None, the values must be in the
+            order of the locations of the grid.
+
+        Returns
+        -------
+        img : np.ma.MaskedArray
+            Raster of the oversampled grid, masked where there are no values.
+            Plot with origin='upper'.
+        """
+        lut, n_cols = self.nn_lut()
+        values = np.asarray(values, dtype=np.float64)
+        if lon is not None:
+            pos = self.positions(lon, lat)
+            found = pos >= 0
+            full = np.full(len(self.lon), np.nan, dtype=np.float64)
+            full[pos[found]] = values[found]
+            values = full
+        img = np.ma.masked_where(lut == -1, values[lut])
+        img[np.isnan(img)] = np.ma.masked
+        return img.reshape(-1, n_cols)
@@ -2,9 +2,11 @@
 
 from qa4sm_reader import globals
 from parse import *
+from collections import namedtuple
 import warnings
+import re
 
-def _build_fname_templ(n):
+def _build_fname_templ(n, ext='.nc'):
     """
     Create a template to parse for the file name, based on the dataset-__version
     separation rule from globals.
@@ -13,6 +15,8 @@ def _build_fname_templ(n):
     ----------
     n : int
         Total number of (reference and candidate) values sets in the file.
+    ext : str, optional (default: '.nc')
+        Extension of the file name.
 
     Returns
     -------
@@ -23,7 +27,7 @@ def _build_fname_templ(n):
     for i in range(1, n):
         parts += [globals.ds_fn_templ.format(i='{i_ds%i:d}' % i, ds='{ds%i}' % i,
                                              var='{var%i}' % i)]
-    return globals.ds_fn_sep.join(parts) + '.nc'
+    return globals.ds_fn_sep.join(parts) + ext
 
 def _metr_grp(metric:str) -> int or None:
     for g in globals.metric_groups.keys():
@@ -31,43 +35,210 @@ def _metr_grp(metric:str) -> int or None:
             return g
     return None
 
+class _VarNameParser(object):
+    """
+    Parser for the names of metric variables. The variable name templates of
+    all metric groups (from globals) are translated once into one regular
+    expression, so that the metric, the group and the dataset ids and names
+    of a variable are resolved in a single match.
+    """
+    def __init__(self, metric_groups, var_name_metric_sep, var_name_ds_sep):
+        """
+        Parameters
+        ----------
+        metric_groups : dict
+            Metrics of each group, with the group as the key.
+        var_name_metric_sep : dict
+            Template of the metric part of the name, for each group.
+        var_name_ds_sep : dict
+            Template of the datasets part of the name (or None), for each group.
+        """
+        self._int_fields = dict()
+        regexs = []
+        for g in metric_groups.keys():
+            templ_d = var_name_ds_sep[g]
+            templ = '{}{}'.format(var_name_metric_sep[g],
+                                  templ_d if templ_d is not None else '')
+            regexs.append('(?P<g{}>{})'.format(g, self._templ2regex(
+                templ, g, metric_groups[g])))
+        self._regex = re.compile('|'.join(regexs))
+
+    def _templ2regex(self, templ:str, g:int, metrics:list) -> str:
+        """
+        Translate a parse template to a regular expression. Fields are named
+        after the group ('g2_ref_id'), {name:d} fields match integers, the
+        metric field only matches the metrics of the group.
+        """
+        self._int_fields[g] = []
+        regex, pos = '', 0
+        for field in re.finditer(r'\{(\w+)(:d)?\}', templ):
+            name, isint = field.group(1), field.group(2) is not None
+            if name == 'metric':  # shortest first, as parse matches lazily
+                pattern = '|'.join(re.escape(m) for m in sorted(metrics, key=len))
+            elif isint:
+                pattern = r'[-+ ]?\d+'
+                self._int_fields[g].append(name)
+            else:
+                pattern = '.+?'
+            regex += re.escape(templ[pos:field.start()])
+            regex += '(?P<g{}_{}>{})'.format(g, name, pattern)
+            pos = field.end()
+        return regex + re.escape(templ[pos:])
+
+    def parse(self, varname:str) -> (str, int, dict):
+        """
+        Parse a variable name.
+
+        Parameters
+        ----------
+        varname : str
+            Name of the variable
+
+        Returns
+        -------
+        metric : str or None
+            Metric of the variable, None if it is not a metric variable.
+        g : int or None
+            Metric group of the variable
+        parts : dict or None
+            All parts of the name (metric, dataset ids and names).
+        """
+        match = self._regex.fullmatch(varname)
+        if match is None:
+            return None, None, None
+        for g, ints in self._int_fields.items():
+            if match.group('g{}'.format(g)) is not None:
+                break
+        prefix = 'g{}_'.format(g)
+        parts = {k[len(prefix):]: v for k, v in match.groupdict().items()
+                 if k.startswith(prefix)}
+        for k in ints:
+            parts[k] = int(parts[k])
+        return parts['metric'], g, parts
+
+_varname_parser = _VarNameParser(globals.metric_groups, globals.var_name_metric_sep,
+                                 globals.var_name_ds_sep)
+
+def parse_varnames(varnames) -> list:
+    """
+    Classify multiple variable names at once.
+
+    Parameters
+    ----------
+    varnames : list
+        Names of variables, e.g. all variables in a results file.
+
+    Returns
+    -------
+    parsed : list
+        (metric, group, parts) for each variable, (None, None, None) for
+        variables that are not metric variables.
+    """
+    return [_varname_parser.parse(varname) for varname in varnames]
+
+# names of a dataset (dc) in the global attributes
+_DatasetNames = namedtuple('_DatasetNames', ['short_name', 'pretty_name',
+                                             'short_version', 'pretty_version'])
+
+class QA4SMDatasets(object):
+    """
+    Datasets described in the global attributes of a QA4SM results file.
+    The attributes are parsed once, the table is not changed afterwards and
+    is shared by all attribute handlers and variables of a file.
+    """
+    def __init__(self, global_attrs):
+        """
+        Parameters
+        ----------
+        global_attrs: dict
+            Global attributes of the QA4SM validation result
+        """
+        self.__offset_id_dc = 0
+        if 'val_ref' in global_attrs.keys():
+            id = int(parse('val_dc_dataset{id}', global_attrs['val_ref'])['id'])
+            if id != 0:
+                self.__offset_id_dc = -1
+
+        self.__ref_dc = parse(globals._ds_short_name_attr,
+                              global_attrs[globals._ref_ds_attr])[0]
+
+        other_dcs, names = dict(), dict()
+        for k in global_attrs.keys():
+            parsed = parse(globals._ds_short_name_attr, k)
+            if parsed is not None and len(list(parsed)) == 1:
+                dc = list(parsed)[0]
+                if dc != self.__ref_dc:
+                    other_dcs[dc] = k
+                try:
+                    names[dc] = _DatasetNames(
+                        short_name=global_attrs[globals._ds_short_name_attr.format(dc)],
+                        pretty_name=global_attrs[globals._ds_pretty_name_attr.format(dc)],
+                        short_version=global_attrs[globals._version_short_name_attr.format(dc)],
+                        pretty_version=global_attrs[globals._version_pretty_name_attr.format(dc)])
+                except KeyError:  # incomplete, looked up (and fails) on access
+                    pass
+        self.__other_dcs = other_dcs
+        self.__names = names
+
+    @property
+    def offset_id_dc(self) -> int:
+        """ Offset between the ids in the variable names and the dcs in the attributes """
+        return self.__offset_id_dc
+
+    @property
+    def ref_dc(self) -> int:
+        """ dc of the reference dataset """
+        return self.__ref_dc
+
+    @property
+    def other_dcs(self) -> dict:
+        """ Attribute names of the short names of the non-reference datasets, by dc """
+        return dict(self.__other_dcs)
+
+    def names(self, dc) -> dict:
+        """
+        Get the names of the passed dc.
+
+        Parameters
+        ----------
+        dc : int
+            The id of the dataset as in the global metadata of the results file
+
+        Returns
+        -------
+        names : dict
+            short name, pretty_name and short_version and pretty_version of the
+            dc dataset.
+        """
+        return dict(self.__names[dc]._asdict())
+
 class QA4SMAttributes(object):
     """ Attribute handler for QA4SM results, only from meta values """
-    def __init__(self, global_attrs):
+    def __init__(self, global_attrs, datasets=None):
         """
         Parameters
         ----------
         global_attrs: dict
             Global attributes of the QA4SM validation result
+        datasets : QA4SMDatasets, optional (default: None)
+            Parsed datasets of the global attributes, to share between handlers
+            of the same file. If None are passed, the attributes are parsed.
         """
         self.meta = global_attrs
+        self.datasets = QA4SMDatasets(global_attrs) if datasets is None else datasets
         self._get_offset()
         self.other_dcs, self.ref_dc = self._dcs()
 
     def _get_offset(self):
-        self._offset_id_dc = 0
-        if 'val_ref' in self.meta.keys():
-            id = int(parse('val_dc_dataset{id}', self.meta['val_ref'])['id'])
-            if id != 0:
-                self._offset_id_dc = -1
+        self._offset_id_dc = self.datasets.offset_id_dc
 
     def _dcs(self):
-        """ Go through the metadata and find the dataset short names """
-        ref_dc = self._ref_dc()
-        dcs = dict()
-        for k in self.meta.keys():
-            parsed = parse(globals._ds_short_name_attr, k)
-            if parsed is not None and len(list(parsed)) == 1:
-                dc = list(parsed)[0]
-                if dc != ref_dc:
-                    dcs[dc] = k
-        return dcs, ref_dc
+        """ Get the dataset short names (attribute names) and the reference dc """
+        return self.datasets.other_dcs, self._ref_dc()
 
     def _ref_dc(self):
         """ Get the short name of the reference dataset """
-        val_ref = self.meta[globals._ref_ds_attr]
-        ref_dc = parse(globals._ds_short_name_attr, val_ref)[0]
-        return ref_dc
+        return self.datasets.ref_dc
 
     def _dc_names(self, dc):
         """
@@ -84,13 +255,16 @@ class QA4SMAttributes(object):
             short name, pretty_name and short_version and pretty_version of the
             dc dataset.
         """
-        short_name = self.meta[globals._ds_short_name_attr.format(dc)]
-        pretty_name = self.meta[globals._ds_pretty_name_attr.format(dc)]
-        short_version = self.meta[globals._version_short_name_attr.format(dc)]
-        pretty_version = self.meta[globals._version_pretty_name_attr.format(dc)]
+        try:
+            return self.datasets.names(dc)
+        except KeyError:  # not complete in the attributes, fails on the missing one
+            short_name = self.meta[globals._ds_short_name_attr.format(dc)]
+            pretty_name = self.meta[globals._ds_pretty_name_attr.format(dc)]
+            short_version = self.meta[globals._version_short_name_attr.format(dc)]
+            pretty_version = self.meta[globals._version_pretty_name_attr.format(dc)]
 
-        return dict(short_name=short_name, pretty_name=pretty_name,
-                    short_version=short_version, pretty_version=pretty_version)
+            return dict(short_name=short_name, pretty_name=pretty_name,
+                        short_version=short_version, pretty_version=pretty_version)
 
     def get_all_names(self) -> (dict, dict):
         """
@@ -113,7 +287,7 @@ class QA4SMAttributes(object):
 class QA4SMNamedAttributes(QA4SMAttributes):
     """ Attribute handler for named QA4SM datasets, based on global attributes."""
 
-    def __init__(self, id, short_name, global_attrs):
+    def __init__(self, id, short_name, global_attrs, datasets=None):
         """
         QA4SMNamedAttributes handler for metdata lookup
 
@@ -125,8 +299,11 @@ class QA4SMNamedAttributes(QA4SMAttributes):
             Short name of the dataset as in the variable name
         global_attrs : dict
             Global attributes of the results file, for lookup.
+        datasets : QA4SMDatasets, optional (default: None)
+            Parsed datasets of the global attributes, if None are passed, the
+            attributes are parsed.
         """
-        super(QA4SMNamedAttributes, self).__init__(global_attrs)
+        super(QA4SMNamedAttributes, self).__init__(global_attrs, datasets)
 
         self.id = id
         self.__short_name = short_name
@@ -216,7 +393,8 @@ class QA4SMNamedAttributes(QA4SMAttributes):
 
 class QA4SMMetricVariable(object):
 
-    def __init__(self, varname, global_attrs, values=None):
+    def __init__(self, varname, global_attrs, values=None, loader=None,
+                 datasets=None):
         """
         Validation results for a validation metric and a combination of datasets.
 
@@ -228,13 +406,38 @@ class QA4SMMetricVariable(object):
             Global attributes of the results.
         values : pd.DataFrame, optional (default: None)
             Values of the variable, to store together with the metadata.
+        loader : callable, optional (default: None)
+            Function that takes the variable name and returns its values. Is
+            called when the values are accessed and not yet loaded.
+        datasets : QA4SMDatasets, optional (default: None)
+            Parsed datasets of the global attributes, pass the same table to
+            all variables of a file. If None are passed, the attributes are parsed.
         """
 
         self.varname = varname
         self.attrs = global_attrs
+        self.datasets = QA4SMDatasets(global_attrs) if datasets is None else datasets
+        self._varmeta = None
         self.metric, self.g, parts = self._parse_varname()
         self.ref_ds, self.other_dss, self.metric_ds = self._named_attrs(parts)
-        self.values = values
+        self._values = values
+        self._loader = loader
+
+    @property
+    def values(self):
+        """ Values of the variable, read via the loader on first access """
+        if self._values is None and self._loader is not None:
+            self._values = self._loader(self.varname)
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+
+    def release(self):
+        """ Drop the values, if they can be read again via the loader """
+        if self._loader is not None:
+            self._values = None
 
     def _named_attrs(self, parts:dict) -> \
             (QA4SMNamedAttributes, list, QA4SMNamedAttributes):
@@ -244,37 +447,31 @@ class QA4SMMetricVariable(object):
             raise IOError(self.varname, '{} is not in form of a QA4SM metric variable.')
 
         if self.g == 0:
-            a = QA4SMAttributes(self.attrs)
+            a = QA4SMAttributes(self.attrs, self.datasets)
             ref_ds = QA4SMNamedAttributes(a.ref_dc - a._offset_id_dc,
-                                          a.get_ref_names()['short_name'], self.attrs)
+                                          a.get_ref_names()['short_name'],
+                                          self.attrs, self.datasets)
             return ref_ds, None, None
         else:
             dss = []
-            ref_ds = QA4SMNamedAttributes(parts['ref_id'], parts['ref_ds'], self.attrs)
-            ds = QA4SMNamedAttributes(parts['sat_id0'], parts['sat_ds0'], self.attrs)
+            ref_ds = QA4SMNamedAttributes(parts['ref_id'], parts['ref_ds'],
+                                          self.attrs, self.datasets)
+            ds = QA4SMNamedAttributes(parts['sat_id0'], parts['sat_ds0'],
+                                      self.attrs, self.datasets)
             dss.append(ds)
             if self.g == 3:
-                ds = QA4SMNamedAttributes(parts['sat_id1'], parts['sat_ds1'], self.attrs)
+                ds = QA4SMNamedAttributes(parts['sat_id1'], parts['sat_ds1'],
+                                          self.attrs, self.datasets)
                 dss.append(ds)
-                mds = QA4SMNamedAttributes(parts['mds_id'], parts['mds'], self.attrs)
+                mds = QA4SMNamedAttributes(parts['mds_id'], parts['mds'],
+                                           self.attrs, self.datasets)
             else:
                 mds = None
             return ref_ds, dss, mds
 
     def _parse_varname(self) -> (str, int, dict):
         """ parse the name to get the metric, group and  """
-
-        metr_groups = list(globals.metric_groups.keys())
-        for g in metr_groups:
-            templ_d = globals.var_name_ds_sep[g]
-            pattern = '{}{}'.format(globals.var_name_metric_sep[g],
-                                    templ_d if templ_d is not None else '')
-            parts = parse(pattern, self.varname)
-
-            if parts is not None and parts['metric'] in globals.metric_groups[g]:
-                return parts['metric'], g, parts.named
-
-        return None, None, None
+        return _varname_parser.parse(self.varname)
 
     def ismetr(self) -> bool:
         """ Check whether this is a metric variable or not """
@@ -289,7 +486,8 @@ class QA4SMMetricVariable(object):
 
     def get_varmeta(self):
         """
-        Get the dataset names based on metadata information
+        Get the dataset names based on metadata information. The names are
+        looked up once and then returned from memory.
 
         Returns
         -------
@@ -300,6 +498,8 @@ class QA4SMMetricVariable(object):
         mds_meta : tuple or None
             Names for the metric dataset (TC only)
         """
+        if self._varmeta is not None:
+            return self._varmeta
 
         if self.ref_ds is not None:
             ref_meta = (self.ref_ds.id, self.ref_ds._names_from_attrs('all'))
@@ -314,4 +514,5 @@ class QA4SMMetricVariable(object):
         else:
             mds_meta = None
 
-        return ref_meta, dss_meta, mds_meta
\ No newline at end of file
+        self._varmeta = (ref_meta, dss_meta, mds_meta)
+        return self._varmeta
\ No newline at end of file
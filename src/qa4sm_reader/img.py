@@ -7,23 +7,36 @@ import os
 import numpy as np
 from collections import OrderedDict
 from qa4sm_reader.handlers import _build_fname_templ
-from qa4sm_reader.handlers import QA4SMMetricVariable
+from qa4sm_reader.handlers import QA4SMMetricVariable, QA4SMDatasets, _metr_grp, \
+    parse_varnames
+from qa4sm_reader.spatial import QA4SMSpatialIndex
+from qa4sm_reader.grid import GridDescriptor
+from qa4sm_reader.cache import QA4SMCache
+from qa4sm_reader.zarr_store import is_zarr
+from qa4sm_reader.stats import summary_stats, chunked_summary_stats
+from qa4sm_reader import export
 import pandas as pd
 import itertools
+import copy
+import warnings
 
 class QA4SMImg(object):
     """
-    A QA4SM validation results netcdf image.
+    A QA4SM validation results netcdf image (or zarr store).
     """
     def __init__(self, filepath, extent=None, ignore_empty=True, metrics=None,
-                 index_names=globals.index_names):
+                 index_names=globals.index_names, lazy=False, chunks=None,
+                 cache=None):
         """
         Initialise a common QA4SM results image.
 
         Parameters
         ----------
         filepath : str
-            Path to the results netcdf file (as created by QA4SM)
+            Path to the results netcdf file (as created by QA4SM) or to a zarr
+            store converted from it (see zarr_store.nc_to_zarr). Variables of a
+            zarr store are read chunk by chunk, only the chunks that are
+            accessed are read.
         extent : tuple, optional (default: None)
             Area to subset the values for.
             (min_lon, max_lon, min_lat, max_lat)
@@ -34,17 +47,59 @@ class QA4SMImg(object):
             are loaded.
         index_names : list, optional (default: ['lat', 'lon'] - as in globals.py)
             Names of dimension variables in x and y direction (lat, lon).
+        lazy : bool, optional (default: False)
+            Do not convert the whole file into a data frame on load. Values of
+            each variable are only read from file when they are first accessed
+            and can be released again with release_values().
+        chunks : int, dict or 'auto', optional (default: None)
+            Open the file with dask, using these chunks (see xarray.open_dataset)
+            for files that do not fit into memory. For zarr stores, {} uses
+            the chunks of the store. Implies lazy=True, summary
+            statistics and value ranges are then reduced chunk by chunk.
+            Requires dask.
+        cache : str or QA4SMCache, optional (default: None)
+            Directory (or cache object) to store the parsed variables and their
+            values in. When the same (unchanged) file is opened again with the
+            same settings, they are loaded from the cache instead of the file.
+            Only supported for results that are stored as a list of locations,
+            for gridded files the cache is not used (with a warning).
         """
         self.filepath = filepath
-        self.filename = os.path.basename(self.filepath)
+        self.filename = os.path.basename(os.path.normpath(self.filepath))
 
         self.extent = extent
         self.index_names = index_names
 
         self.ignore_empty = ignore_empty
-        self.ds = xr.open_dataset(self.filepath)
-
+        self.chunks = chunks
+        self.lazy = lazy or (chunks is not None)
+        if is_zarr(self.filepath):
+            self.ds = xr.open_dataset(self.filepath, engine='zarr', chunks=chunks)
+        else:
+            self.ds = xr.open_dataset(self.filepath, chunks=chunks)
+        self._loc_dim = self._get_loc_dim()
+        self._extent_cut = self._cut_extent() if self.extent else False
+        self._spatial_index = None
+        self._grid = None
+
+        if isinstance(cache, str):
+            cache = QA4SMCache(cache)
+        self.cache = cache
+        self._cache_key = None
+        self._cache_arrays = None  # open arrays of the cache entry (lazy mode), not pickled
+        if (self.cache is not None) and (self._loc_dim is None):
+            warnings.warn('The cache is only supported for results that are stored as a list of '
+                          'locations, {} is gridded and is not cached.'.format(self.filename))
+        elif self.cache is not None:
+            self._cache_key = QA4SMCache.file_key(
+                self.filepath, extent=extent, ignore_empty=ignore_empty,
+                metrics=None if metrics is None else sorted(metrics),
+                index_names=list(index_names))
+
+        self.datasets = QA4SMDatasets(self.ds.attrs)
+        self.metrics = metrics
         self.common, self.double, self.triple = self._load_metrics_from_file(metrics)
+        self._index_vars()
 
         self.ref_dataset = self.ds.val_dc_dataset0
         # this try here is to obey tests, withouth a necessity of changing and commiting test files again
@@ -53,56 +108,241 @@ class QA4SMImg(object):
         except:
             self.ref_dataset_grid_stepsize = 'nan'
 
-    def _load_metrics_from_file(self, metrics:list=None) -> (dict, dict, dict):
-        """ Load and group all metrics from file """
-        self.df = self._ds2df(None)
+    def _get_loc_dim(self) -> str or None:
+        """ Name of the dimension of the locations, None if lat/lon are no list """
+        lat, lon = self.index_names
+        lat_dims, lon_dims = self.ds[lat].dims, self.ds[lon].dims
+        if (len(lat_dims) == 1) and (lat_dims == lon_dims):
+            return lat_dims[0]
+        else:
+            return None
 
-        common, double, triple = dict(), dict(), dict()
+    def _cut_extent(self) -> bool:
+        """
+        Select the locations within the extent in the dataset, before any values
+        are read. Only this slice of each variable is then loaded from file.
+
+        Returns
+        -------
+        cut : bool
+            Whether the extent was applied to the dataset. False if lat and lon
+            are not stored as a list of locations or as the axes of a grid.
+        """
+        indexers = self._extent_indexers(self.ds, self.extent)
+        if indexers is None:
+            return False
+        self.ds = self.ds.isel(indexers)
+        return True
+
+    def _extent_indexers(self, ds:xr.Dataset, extent:tuple) -> dict or None:
+        """
+        Positions of the locations in the extent along the dimensions of ds,
+        None if lat and lon are neither a list of locations nor grid axes.
+        """
+        lat, lon = self.index_names
+        min_lon, max_lon, min_lat, max_lat = extent
+        lats, lons = ds[lat], ds[lon]
+
+        if self._loc_dim is not None:  # list of locations
+            lat_vals, lon_vals = lats.values, lons.values
+            idx = np.flatnonzero((lon_vals >= min_lon) & (lon_vals <= max_lon) &
+                                 (lat_vals >= min_lat) & (lat_vals <= max_lat))
+            return {self._loc_dim: idx}
+        elif (lats.dims == (lat,)) and (lons.dims == (lon,)):  # lat/lon grid
+            lat_vals, lon_vals = lats.values, lons.values
+            return {lat: np.flatnonzero((lat_vals >= min_lat) & (lat_vals <= max_lat)),
+                    lon: np.flatnonzero((lon_vals >= min_lon) & (lon_vals <= max_lon))}
+        else:
+            return None
+
+    def _load_metrics_from_file(self, metrics:list=None) -> (dict, dict, dict):
+        """ Load and group all metrics from file (or from the cache) """
         if metrics is None:
             metrics = list(itertools.chain(*list(globals.metric_groups.values())))
+
+        metrics_vars = None
+        if self._cache_key is not None:
+            metrics_vars = self._classify_vars_from_cache(metrics)
+
+        if metrics_vars is None:
+            self.df = None if self.lazy else self._ds2df(None)
+            metrics_vars = self._classify_vars(metrics)
+            if self._cache_key is not None:
+                self._write_cache(metrics_vars)
+        else:
+            self.df = None
+
+        common, double, triple = dict(), dict(), dict()
         for metric in metrics:
-            # todo: loading every single variable is slow
-            metr_vars = self._load_metric_from_file(metric)
+            metr_vars = metrics_vars.get(metric, [])
             if len(metr_vars) > 0:
-                if metric in globals.metric_groups[2]:
-                    double[metric] = metr_vars
-                elif metric in globals.metric_groups[3]:
-                    triple[metric] = metr_vars
+                g = _metr_grp(metric)
+                if g == 2:
+                    double[metric] = np.array(metr_vars)
+                elif g == 3:
+                    triple[metric] = np.array(metr_vars)
                 else:
-                    common[metric] = metr_vars
+                    common[metric] = np.array(metr_vars)
 
         return common, double, triple
 
-    def _load_metric_from_file(self, metric:str) -> np.array:
-        """ Load all variables that describe the metric from file. """
+    def _index_vars(self):
+        """
+        Build the lookup tables for the loaded metric groups: the group of each
+        metric and of each variable, the variables by name and the (grouped)
+        variable names.
+        """
+        self._metric_groups, self._var_groups, self._vars = dict(), dict(), OrderedDict()
+        self._grouped_varnames = OrderedDict()
+        for name, metric_group in zip(('common', 'double', 'triple'),
+                                      (self.common, self.double, self.triple)):
+            varnames = []
+            for metric, vars in metric_group.items():
+                self._metric_groups[metric] = metric_group
+                for Var in vars:
+                    self._var_groups[Var.varname] = metric_group
+                    self._vars[Var.varname] = Var
+                    varnames.append(Var.varname)
+            self._grouped_varnames[name] = varnames
+        self._ref_meta = None
+        self._stats = dict()
 
+    def _classify_vars(self, metrics:list) -> dict:
+        """
+        Parse every variable in the file once and collect the metric variables,
+        sorted by name, for each of the passed metrics.
+
+        Parameters
+        ----------
+        metrics : list
+            Metrics to collect the variables for, other variables are skipped.
+
+        Returns
+        -------
+        metrics_vars : dict
+            Lists of QA4SMMetricVariables with the metrics as the keys.
+        """
         all_vars = np.sort(np.array(list(self.ds.variables.keys())))
-        metr_vars = []
-        for var in all_vars:
+        metrics_vars = dict()
+        for var, (metric, _, _) in zip(all_vars, parse_varnames(all_vars)):
+            if metric not in metrics:  # also no metric variable
+                continue
             Var = self._load_var(var, empty=True)
-            if Var is not None and (Var.metric == metric):
+            if not self.lazy:
                 Var.values = self.df[[var]].dropna()
-                if self.ignore_empty:
-                    if not Var.isempty():
-                        metr_vars.append(Var)
+            if self.ignore_empty:
+                if self.lazy:  # count without building a values frame (also for dask)
+                    empty = int(self._ds2da(var).count()) == 0
                 else:
-                    metr_vars.append(Var)
+                    empty = Var.isempty()
+                if empty:
+                    continue
+            metrics_vars.setdefault(Var.metric, []).append(Var)
+
+        return metrics_vars
+
+    def _write_cache(self, metrics_vars:dict):
+        """ Store the locations, the classified variables and their values in the cache """
+        lat, lon = self.index_names
 
-        return np.array(metr_vars)
+        def arrays():  # read one variable at a time
+            yield '__lat__', self.ds[lat].values
+            yield '__lon__', self.ds[lon].values
+            for vars in metrics_vars.values():
+                for Var in vars:
+                    values = self.ds[Var.varname].values
+                    idx = np.flatnonzero(~pd.isnull(values))
+                    yield Var.varname + '.idx', idx
+                    yield Var.varname + '.values', values[idx]
+
+        self.cache.write_arrays(self._cache_key, arrays())
+        self.cache.write_meta(self._cache_key, {
+            'filename': self.filename,
+            'vars': {metric: [Var.varname for Var in vars]
+                     for metric, vars in metrics_vars.items()}})
+
+    def _classify_vars_from_cache(self, metrics:list) -> dict or None:
+        """ Create the metric variables from the cache, None if they are not cached """
+        meta = self.cache.read_meta(self._cache_key)
+        arrays = self.cache.open_arrays(self._cache_key) if meta is not None else None
+        if arrays is None:
+            return None
+
+        self._cache_arrays = arrays
+        self._cache_index = pd.MultiIndex.from_arrays(
+            [arrays['__lat__'], arrays['__lon__']], names=self.index_names)
+        loader = self._load_values_from_cache if self.lazy else None
+
+        metrics_vars = dict()
+        for metric in metrics:
+            for varname in meta['vars'].get(metric, []):
+                Var = QA4SMMetricVariable(varname, self.ds.attrs, loader=loader,
+                                          datasets=self.datasets)
+                if not self.lazy:
+                    Var.values = self._load_values_from_cache(varname)
+                metrics_vars.setdefault(metric, []).append(Var)
+
+        if not self.lazy:  # all values are loaded, don't keep the file open
+            arrays.close()
+            self._cache_arrays = None
+
+        return metrics_vars
+
+    def _load_values_from_cache(self, varname:str) -> pd.DataFrame:
+        """
+        Read the values of a single variable from the cache, or from file if
+        the entry was evicted from the cache in the meantime.
+        """
+        if self._cache_arrays is None:  # e.g. after unpickling
+            self._cache_arrays = self.cache.open_arrays(self._cache_key)
+            if self._cache_arrays is None:
+                return self._load_values(varname)
+        idx = self._cache_arrays[varname + '.idx']
+        return pd.DataFrame({varname: self._cache_arrays[varname + '.values']},
+                            index=self._cache_index[idx])
+
+    def __getstate__(self):
+        # the open file of the cache entry can't be pickled, it is opened again on access
+        state = self.__dict__.copy()
+        state['_cache_arrays'] = None
+        return state
 
     def _load_var(self, varname:str, empty=False) -> (QA4SMMetricVariable or None):
         """ Create a common variable and fill it with values """
-        if empty:
+        if empty or self.lazy:
             values = None
         else:
             values = self.df[[varname]]
+        loader = self._load_values if self.lazy else None
         try:
-            Var = QA4SMMetricVariable(varname, self.ds.attrs, values=values)
+            Var = QA4SMMetricVariable(varname, self.ds.attrs, values=values,
+                                      loader=loader, datasets=self.datasets)
             return Var
         except IOError:
             return None
 
 
+    def _load_values(self, varname:str) -> pd.DataFrame:
+        """ Read the values of a single variable from file (lazy mode) """
+        return self._ds2df([varname])[[varname]]
+
+    def release_values(self, metrics:list=None):
+        """
+        Free the memory of values that were read on access (lazy mode only).
+        The values are read from file again when they are accessed next.
+
+        Parameters
+        ----------
+        metrics : list or None, optional (default: None)
+            Metrics to release the variable values for, if None are passed,
+            all are released.
+        """
+        for metric_group in [self.common, self.double, self.triple]:
+            for metric, vars in metric_group.items():
+                if (metrics is None) or (metric in metrics):
+                    for Var in vars:
+                        Var.release()
+
     def _ds2df(self, varnames:list=None) -> pd.DataFrame:
         """ Cut a variable to extent and return it as a values frame """
         try:
@@ -124,7 +364,7 @@ class QA4SMImg(object):
             df[lat] = df.index.get_level_values(lat)
             df[lon] = df.index.get_level_values(lon)
 
-        if self.extent:  # === geographical subset ===
+        if self.extent and not self._extent_cut:  # === geographical subset ===
             lat, lon = globals.index_names
             df = df[(df[lon] >= self.extent[0]) & (df[lon] <= self.extent[1]) &
                     (df[lat] >= self.extent[2]) & (df[lat] <= self.extent[3])]
@@ -134,6 +374,234 @@ class QA4SMImg(object):
 
         return df
 
+    def _ds2da(self, varname:str) -> xr.DataArray:
+        """
+        Cut a variable to extent and return it as a data array, without reading
+        the values. For a chunked image the values are backed by dask.
+        """
+        da = self.ds[varname]
+        if self.extent and not self._extent_cut:  # === geographical subset ===
+            lat, lon = globals.index_names
+            lats, lons = self.ds[lat], self.ds[lon]
+            mask = (lons >= self.extent[0]) & (lons <= self.extent[1]) & \
+                   (lats >= self.extent[2]) & (lats <= self.extent[3])
+            da = da.where(mask.compute(), drop=True)
+
+        return da
+
+    def iter_variables(self, metrics:list=None, extent:tuple=None):
+        """
+        Iterate over the metric variables, reading the values of one variable
+        at a time from file. Values are not attached to the variables, so
+        only the current variable is held in memory.
+
+        Parameters
+        ----------
+        metrics : list or None, optional (default: None)
+            Metrics to iterate over the variables of, if None are passed, all
+            variables of the image are visited.
+        extent : tuple, optional (default: None)
+            Area (min_lon, max_lon, min_lat, max_lat) to read the values for,
+            in addition to the extent of the image.
+
+        Yields
+        ------
+        Var : QA4SMMetricVariable
+            The variable, for its metric and metadata (see get_varmeta).
+        values : np.array
+            Values of the variable, without missing values.
+        gpis : np.array
+            Grid point indices of the values, positions in the (flattened)
+            variable if the file contains no grid point indices.
+        """
+        lat, lon = self.index_names
+        ds = self.ds
+        mask_extents = [self.extent] if (self.extent and not self._extent_cut) else []
+        if extent:
+            indexers = self._extent_indexers(ds, extent)
+            if indexers is None:
+                mask_extents.append(extent)
+            else:
+                ds = ds.isel(indexers)
+
+        locs = dict()  # lat, lon and gpis for the dimensions of the variables
+        for varname, Var in self._vars.items():
+            if (metrics is not None) and (Var.metric not in metrics):
+                continue
+            da = ds[varname]
+            if da.dims not in locs:
+                lats, lons = [xr.broadcast(ds[c], da)[0].values.ravel() for c in (lat, lon)]
+                if globals.gpi_name in ds.variables:
+                    gpis = xr.broadcast(ds[globals.gpi_name], da)[0].values.ravel()
+                else:
+                    gpis = np.arange(da.size)
+                locs = {da.dims: (lats, lons, gpis)}  # only keep the current ones
+            lats, lons, gpis = locs[da.dims]
+
+            values = da.values.ravel()
+            valid = ~pd.isnull(values)
+            for min_lon, max_lon, min_lat, max_lat in mask_extents:
+                valid &= (lons >= min_lon) & (lons <= max_lon) & \
+                         (lats >= min_lat) & (lats <= max_lat)
+
+            yield Var, values[valid], gpis[valid]
+
+    @property
+    def spatial_index(self) -> QA4SMSpatialIndex:
+        """ Index over the locations of the image, built on first use """
+        if self._spatial_index is None:
+            if self._loc_dim is None:
+                raise NotImplementedError(
+                    "Spatial queries are only supported for results that are "
+                    "stored as a list of locations.")
+            lat, lon = self.index_names
+            self._spatial_index = QA4SMSpatialIndex(self.ds[lon].values,
+                                                    self.ds[lat].values)
+        return self._spatial_index
+
+    def _locations(self) -> (np.array, np.array):
+        """ Longitudes and latitudes of all locations in the image (within the extent) """
+        lat, lon = self.index_names
+        if self._loc_dim is not None:
+            lons, lats = self.ds[lon].values, self.ds[lat].values
+        else:
+            lats, lons = [c.values.ravel() for c in xr.broadcast(self.ds[lat], self.ds[lon])]
+        if self.extent and not self._extent_cut:
+            keep = (lons >= self.extent[0]) & (lons <= self.extent[1]) & \
+                   (lats >= self.extent[2]) & (lats <= self.extent[3])
+            lons, lats = lons[keep], lats[keep]
+        return lons, lats
+
+    @property
+    def grid(self) -> GridDescriptor:
+        """
+        The regular grid behind the locations of the image, inferred on first
+        use and shared by the maps of all variables. For irregular reference
+        grids, the grid that the values are oversampled onto, the nearest
+        neighbour look-up table is then also stored in the cache of the image.
+        """
+        if self._grid is None:
+            grid_stepsize = self.ref_dataset_grid_stepsize
+            if grid_stepsize in ['nan', None]:
+                grid_stepsize = None
+            lons, lats = self._locations()
+            self._grid = GridDescriptor(lons, lats, grid_stepsize, lut_cache=self.cache)
+        return self._grid
+
+    def subset(self, idx) -> 'QA4SMImg':
+        """
+        Create a new image that contains only the passed locations.
+
+        Parameters
+        ----------
+        idx : np.array
+            Positions of the locations in the image, e.g. from a query.
+
+        Returns
+        -------
+        img : QA4SMImg
+            Image with the same settings and only the passed locations.
+        """
+        sub = copy.copy(self)
+        sub.ds = self.ds.isel({self._loc_dim: np.sort(np.asarray(idx, dtype=np.int64))})
+        sub.extent, sub._extent_cut = None, False
+        sub._spatial_index = None
+        sub._grid = None
+        sub._cache_key = None
+        sub.common, sub.double, sub.triple = sub._load_metrics_from_file(self.metrics)
+        sub._index_vars()
+        return sub
+
+    def query_bbox(self, min_lon, max_lon, min_lat, max_lat, as_image=False):
+        """
+        Find the locations in a box (borders included).
+
+        Parameters
+        ----------
+        min_lon, max_lon, min_lat, max_lat : float
+            Box corners. If min_lon > max_lon, the box crosses the antimeridian.
+        as_image : bool, optional (default: False)
+            Return a new image of the locations instead of their positions.
+
+        Returns
+        -------
+        idx : np.array or QA4SMImg
+            Sorted positions of the locations along the location dimension of
+            the image, or the sub-image.
+        """
+        idx = self.spatial_index.bbox(min_lon, max_lon, min_lat, max_lat)
+        return self.subset(idx) if as_image else idx
+
+    def query_polygon(self, vertices, as_image=False):
+        """
+        Find the locations in a polygon.
+
+        Parameters
+        ----------
+        vertices : list or np.array
+            (lon, lat) pairs of the polygon outline.
+        as_image : bool, optional (default: False)
+            Return a new image of the locations instead of their positions.
+
+        Returns
+        -------
+        idx : np.array or QA4SMImg
+            Sorted positions of the locations along the location dimension of
+            the image, or the sub-image.
+        """
+        idx = self.spatial_index.polygon(vertices)
+        return self.subset(idx) if as_image else idx
+
+    def query_nearest(self, lon, lat, k=1, max_dist=np.inf, as_image=False):
+        """
+        Find the k nearest locations to a point, e.g. a station.
+
+        Parameters
+        ----------
+        lon, lat : float
+            Point to search around.
+        k : int, optional (default: 1)
+            Number of locations to find.
+        max_dist : float, optional (default: np.inf)
+            Maximum distance in m.
+        as_image : bool, optional (default: False)
+            Return a new image of the locations instead of their positions.
+
+        Returns
+        -------
+        idx : np.array or QA4SMImg
+            Positions of the locations along the location dimension of the
+            image, sorted by distance, or the sub-image.
+        dist : np.array
+            Distances in m, only if as_image is False.
+        """
+        idx, dist = self.spatial_index.nearest(lon, lat, k=k, max_dist=max_dist)
+        return self.subset(idx) if as_image else (idx, dist)
+
+    def query_radius(self, lon, lat, radius, as_image=False):
+        """
+        Find the locations within a distance around a point.
+
+        Parameters
+        ----------
+        lon, lat : float
+            Point to search around.
+        radius : float
+            Maximum distance in m.
+        as_image : bool, optional (default: False)
+            Return a new image of the locations instead of their positions.
+
+        Returns
+        -------
+        idx : np.array or QA4SMImg
+            Positions of the locations along the location dimension of the
+            image, sorted by distance, or the sub-image.
+        dist : np.array
+            Distances in m, only if as_image is False.
+        """
+        idx, dist = self.spatial_index.radius(lon, lat, radius)
+        return self.subset(idx) if as_image else (idx, dist)
+
     def metric_df(self, metric):
         """
         Group all variables for the metric in a common data frame
@@ -173,6 +641,73 @@ class QA4SMImg(object):
                         ret.append(r)
                     return ret
 
+    def metric_stats(self, metric:str, quantiles:list=globals.stats_quantiles) -> pd.DataFrame:
+        """
+        Summary statistics of all variables of a metric, computed once per
+        image for all variables together and then returned from memory.
+
+        Parameters
+        ----------
+        metric : str
+            A metric that is in the file (e.g. n_obs, R, ...)
+        quantiles : list, optional (default: from globals)
+            Quantiles to compute in addition to the quartiles.
+
+        Returns
+        -------
+        stats : pd.DataFrame
+            The variables in the rows, the statistics in the columns (see
+            qa4sm_reader.stats.summary_stats).
+        """
+        key = (metric, tuple(quantiles))
+        if key not in self._stats:
+            varnames = [Var.varname for Var in self._metric_groups[metric][metric]]
+            if self.chunks is not None:
+                stats = pd.concat([chunked_summary_stats(self._ds2da(varname), quantiles)
+                                   for varname in varnames])
+            else:
+                df = self.metric_df(metric)
+                if isinstance(df, list):
+                    df = pd.concat(df, axis=1, sort=True)
+                stats = summary_stats(df, quantiles).loc[varnames]
+            self._stats[key] = stats
+        return self._stats[key]
+
+    def to_parquet(self, path:str, metrics:list=None, regions:dict=None, **kwargs):
+        """
+        Export the metric variables to a Parquet file, with the dataset names
+        and versions in the schema and one row group per region (see
+        qa4sm_reader.export). Requires pyarrow.
+
+        Parameters
+        ----------
+        path : str
+            Path of the Parquet file to create.
+        metrics : list or None, optional (default: None)
+            Metrics to export, if None are passed, all are exported.
+        regions : dict or None, optional (default: None)
+            Region names and their extents (min_lon, max_lon, min_lat, max_lat).
+        **kwargs : dict, optional
+            Additional keyword arguments for pyarrow.parquet.ParquetWriter.
+        """
+        export.to_parquet(self, path, metrics=metrics, regions=regions, **kwargs)
+
+    def to_arrow(self, path:str, metrics:list=None, regions:dict=None):
+        """
+        Export the metric variables to an Arrow IPC file, that can be memory
+        mapped with qa4sm_reader.export.read_arrow. Requires pyarrow.
+
+        Parameters
+        ----------
+        path : str
+            Path of the Arrow file to create.
+        metrics : list or None, optional (default: None)
+            Metrics to export, if None are passed, all are exported.
+        regions : dict or None, optional (default: None)
+            Region names and their extents (min_lon, max_lon, min_lat, max_lat).
+        """
+        export.to_arrow(self, path, metrics=metrics, regions=regions)
+
     def find_group(self, src):
         """
         Search the element and get the variable group that it is in.
@@ -187,26 +722,22 @@ class QA4SMImg(object):
         metric_group : dict
             A collection of metrics for 2, 3 or all datasets.
         """
-        for metric_group in [self.common, self.double, self.triple]:
-            if src in metric_group.keys():
-                return metric_group
-        for metric_group in [self.common, self.double, self.triple]:
-            for metric in metric_group.keys():
-                if src in [Var.varname for Var in metric_group[metric]]:
-                    return metric_group
+        if src in self._metric_groups:
+            return self._metric_groups[src]
+        return self._var_groups.get(src)
 
     def ref_meta(self) -> tuple:
         """ Go through all variables and check if the reference dataset is the same """
-        ref_meta = None
-        for metric_group in [self.common, self.double, self.triple]:
-            for metric, vars in metric_group.items():
-                for Var in vars:
-                    if ref_meta is None:
-                        ref_meta, _, _ = Var.get_varmeta()
-                    else:
-                        new_ref_meta, _, _ = Var.get_varmeta()
-                        assert new_ref_meta == ref_meta
-        return ref_meta
+        if self._ref_meta is None:
+            ref_meta = None
+            for varname in self._vars.keys():
+                if ref_meta is None:
+                    ref_meta, _, _ = self._vars[varname].get_varmeta()
+                else:
+                    new_ref_meta, _, _ = self._vars[varname].get_varmeta()
+                    assert new_ref_meta == ref_meta
+            self._ref_meta = ref_meta
+        return self._ref_meta
 
     def var_meta(self, varname):
         """
@@ -223,12 +754,8 @@ class QA4SMImg(object):
             metric as the key and ref_meta, dss_meta and mds_meta as the
             values.
         """
-
-        metr_group = self.find_group(varname)
-        for metric, vars in metr_group.items():
-            for Var in vars:
-                if Var.varname == varname:
-                    return {Var.metric: Var.get_varmeta()}
+        Var = self._vars[varname]
+        return {Var.metric: Var.get_varmeta()}
 
     def metric_meta(self, metric):
         """
@@ -244,10 +771,8 @@ class QA4SMImg(object):
         metric_meta : dict
             Dictionary of metadata dictionaries, with variables as the keys.
         """
-
-        group = self.find_group(metric)
         metvar_meta = {}
-        for Var in group[metric]:
+        for Var in self._metric_groups[metric][metric]:
             metvar_meta[Var.varname] = Var.get_varmeta()
         return metvar_meta
 
@@ -266,9 +791,9 @@ class QA4SMImg(object):
         ds_and_vers : dict
             The parsed datasets and version from the file name.
         """
-        filename = os.path.basename(self.filepath)
+        filename = self.filename
         parts = filename.split(globals.ds_fn_sep)
-        fname_templ = _build_fname_templ(len(parts))
+        fname_templ = _build_fname_templ(len(parts), ext=os.path.splitext(filename)[1])
         return parse(fname_templ, filename).named
 
     def ls_metrics(self, as_groups=True):
@@ -315,20 +840,8 @@ class QA4SMImg(object):
             Alphabetically sorted variables in the file (except gpi, lon, lat),
             optionally without the empty variables.
         """
-        common, double, triple = None, None, None
-        for g, metric_group in zip((0,2,3), (self.common, self.double, self.triple)):
-            varnames = []
-            for metric in metric_group.keys():
-                for Var in metric_group[metric]:
-                    varnames.append(Var.varname)
-            if g == 0:
-                common = varnames
-            elif g == 2:
-                double = varnames
-            elif g == 3:
-                triple = varnames
-            else:
-                raise NotImplementedError
+        common, double, triple = [list(self._grouped_varnames[name]) for name in
+                                  ('common', 'double', 'triple')]
 
         if as_groups:
             return OrderedDict([('common', common), ('double', double),
@@ -3,17 +3,23 @@ import os
 from qa4sm_reader.plotter import QA4SMPlotter
 from qa4sm_reader.img import QA4SMImg
 from qa4sm_reader import globals
+from qa4sm_reader.features import warm_feature_cache
+from qa4sm_reader.timing import StageTimer, stage, trace_from_env, active_timer
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 import matplotlib.pyplot as plt
 
+_worker_plotter = None  # plotter of the image that is opened once in each worker process
+
 def plot_all(filepath, metrics=None, extent=None, out_dir=None, out_type='png',
-             boxplot_kwargs=dict(), mapplot_kwargs=dict()):
+             boxplot_kwargs=dict(), mapplot_kwargs=dict(), trace=None, workers=None):
     """
     Creates boxplots for all metrics and map plots for all variables. Saves the output in a folder-structure.
 
     Parameters
     ----------
     filepath : str
-        Path to the *.nc file to be processed.
+        Path to the *.nc file (or *.zarr store) to be processed.
     metrics : set or list, optional (default: None)
         metrics to be plotted, if None are passed, all are plotted (that have data)
     extent : list
@@ -29,27 +35,158 @@ def plot_all(filepath, metrics=None, extent=None, out_dir=None, out_type='png',
         Additional keyword arguments that are passed to the boxplot function.
     **mapplot_kwargs : dict, optional
         Additional keyword arguments that are passed to the mapplot function.
+        Pass multi=True for one map per metric with a panel for each variable.
+    trace : [ None | bool | str | StageTimer ], optional (default: None)
+        Record wall time, cpu time and peak memory of each stage and plot.
+        If True, a json report (globals.trace_report) is written to out_dir,
+        if a str, the report is written to that path. If a StageTimer, the
+        stages are recorded to it and no report is written. If None, the
+        environment variable globals.trace_env is used ('1' or a path).
+    workers : int or None, optional (default: None)
+        Number of processes to render the plots in. Each worker opens the
+        file once, each box plot (per metric) and map (per variable) is a job.
+        File names and the order of the returned lists are the same as when
+        plotting in a single process. If None or 1, all plots are created in
+        this process. The kwargs must be picklable for workers > 1.
+
+    Returns
+    -------
+    fnames_boxes : list
+        Files of the box plots.
+    fnames_maps : list
+        Files of the maps.
     """
 
     if not out_dir:
-        out_dir = os.path.join(os.getcwd(), os.path.basename(filepath))
-    img = QA4SMImg(filepath, extent=extent, ignore_empty=True)
+        out_dir = os.path.join(os.getcwd(), os.path.basename(os.path.normpath(filepath)))
+    if trace is None:
+        trace = trace_from_env()
+
+    if isinstance(trace, StageTimer):
+        timer, report = trace, None
+    elif trace:
+        timer = StageTimer()
+        report = trace if isinstance(trace, str) else os.path.join(out_dir, globals.trace_report)
+    else:
+        return _plot_all(filepath, metrics, extent, out_dir, out_type,
+                         boxplot_kwargs, mapplot_kwargs, workers)
+
+    with timer:
+        with stage('plot_all', file=os.path.basename(os.path.normpath(filepath)),
+                   workers=workers):
+            fnames = _plot_all(filepath, metrics, extent, out_dir, out_type,
+                               boxplot_kwargs, mapplot_kwargs, workers)
+    if report is not None:
+        timer.to_json(report)
+    return fnames
+
+def _init_worker(filepath, extent, out_dir, map_resolution):
+    """
+    Open the image once per worker process, and read the shapefiles and infer
+    the grid (and look-up table) before the first job. Done in each worker,
+    as nothing is inherited from the parent with the spawn or forkserver
+    start methods.
+    """
+    global _worker_plotter
+    img = QA4SMImg(filepath, extent=extent, ignore_empty=True, lazy=True)
+    _worker_plotter = QA4SMPlotter(image=img, out_dir=out_dir)
+    warm_feature_cache(map_resolution)
+    if (img.ref_dataset not in globals.scattered_datasets) and img.grid.irregular:
+        img.grid.nn_lut()
+
+def _box_job(plotter, metric, out_type, boxplot_kwargs) -> list:
+    """ Create the box plot(s) of a metric """
+    if metric not in globals.metric_groups[3]:
+        return plotter.boxplot_basic(metric, out_type=out_type, **boxplot_kwargs)
+    else:
+        return plotter.boxplot_tc(metric, out_type=out_type, **boxplot_kwargs)
+
+def _run_job(job, out_type, boxplot_kwargs, mapplot_kwargs, trace_start) -> (list, list):
+    """
+    Create a box plot (job = ('boxplot', metric, None)) or a map
+    (job = ('map', metric, varname), varname is None for the maps of all
+    variables in one figure) with the plotter of the worker process.
+    Returns the files and the timing records (if trace_start is not None).
+    """
+    kind, metric, varname = job
+    timer = StageTimer(start=trace_start) if trace_start is not None else None
+    with ExitStack() as stack:
+        if timer is not None:
+            stack.enter_context(timer)
+        if kind == 'boxplot':
+            with stage('boxplot', metric=str(metric), worker=os.getpid()):
+                fnames = _box_job(_worker_plotter, metric, out_type, boxplot_kwargs)
+        elif varname is None:  # all variables in one figure (mapplot_kwargs multi=True)
+            with stage('maps', metric=str(metric), worker=os.getpid()):
+                fnames = _worker_plotter.mapplot(metric, out_type=out_type, **mapplot_kwargs)
+        else:
+            with stage('mapplot_var', metric=str(metric), var=varname, worker=os.getpid()):
+                fnames = _worker_plotter.mapplot_var(varname, out_name=None, out_type=out_type,
+                                                     **mapplot_kwargs)
+    _worker_plotter.img.release_values([metric])
+    plt.close('all')
+    return fnames, [] if timer is None else timer.records
+
+def _plot_all_parallel(img, metrics, out_dir, out_type, boxplot_kwargs,
+                       mapplot_kwargs, workers) -> (list, list):
+    """ Create all plots in a process pool, see plot_all """
+    # mapplot_var (single variable) does not take multi, it would be passed on to style_map
+    var_kwargs = {k: v for k, v in mapplot_kwargs.items() if k != 'multi'}
+    jobs, jobs_kwargs = [], []
+    for metric in metrics:
+        jobs.append(('boxplot', metric, None))
+        jobs_kwargs.append(var_kwargs)
+        if mapplot_kwargs.get('multi', False):
+            jobs.append(('map', metric, None))
+            jobs_kwargs.append(mapplot_kwargs)
+            continue
+        for varname in img.metric_meta(metric).keys():
+            jobs.append(('map', metric, varname))
+            jobs_kwargs.append(var_kwargs)
+
+    map_resolution = mapplot_kwargs.get('map_resolution', globals.naturalearth_resolution)
+    timer = active_timer()
+    trace_start = None if timer is None else timer.start
+    n = len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(img.filepath, img.extent, out_dir, map_resolution)) as pool:
+        results = list(pool.map(_run_job, jobs, [out_type] * n, [boxplot_kwargs] * n,
+                                jobs_kwargs, [trace_start] * n))
+
+    fnames_maps, fnames_boxes = [], []
+    for (kind, metric, _), (fnames, records) in zip(jobs, results):
+        if timer is not None:
+            timer.add_records(records)
+        if kind == 'boxplot':
+            fnames_boxes += fnames
+        else:
+            fnames_maps += fnames
+    return fnames_boxes, fnames_maps
+
+def _plot_all(filepath, metrics, extent, out_dir, out_type, boxplot_kwargs,
+              mapplot_kwargs, workers=None):
+    """ Create all plots, see plot_all """
+    with stage('load'):
+        img = QA4SMImg(filepath, extent=extent, ignore_empty=True, lazy=True)
     plotter = QA4SMPlotter(image=img, out_dir=out_dir)
 
     # === Metadata ===
     if not metrics:
         metrics = img.ls_metrics(False)
+
+    if (workers is not None) and (workers > 1):
+        return _plot_all_parallel(img, metrics, out_dir, out_type, boxplot_kwargs,
+                                  mapplot_kwargs, workers)
+
     fnames_maps, fnames_boxes = [], []
 
     for metric in metrics:
     # === load values and metadata ===
-        if metric not in globals.metric_groups[3]:
-            fns_box = plotter.boxplot_basic(metric, out_type=out_type,
-                                            **boxplot_kwargs)
-        else:
-            fns_box = plotter.boxplot_tc(metric, out_type=out_type,
-                                         **boxplot_kwargs)
-        fns_maps = plotter.mapplot(metric, out_type=out_type, **mapplot_kwargs)
+        with stage('boxplot', metric=str(metric)):
+            fns_box = _box_job(plotter, metric, out_type, boxplot_kwargs)
+        with stage('maps', metric=str(metric)):
+            fns_maps = plotter.mapplot(metric, out_type=out_type, **mapplot_kwargs)
+        img.release_values([metric])
         plt.close('all')
         for fn in fns_box: fnames_boxes.append(fn)
         for fn in fns_maps: fnames_maps.append(fn)
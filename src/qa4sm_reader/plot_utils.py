@@ -3,63 +3,38 @@
 Contains helper functions for plotting qa4sm results.
 """
 from qa4sm_reader import globals
+from qa4sm_reader.stats import chunked_quantiles, chunked_summary_stats
+from qa4sm_reader.timing import stage
 import numpy as np
 import pandas as pd
+import xarray as xr
 import os.path
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
+import matplotlib.image as mimage
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from collections import OrderedDict
 import matplotlib.gridspec as gridspec
-from cartopy import config as cconfig
+from qa4sm_reader.features import get_feature
 import cartopy.feature as cfeature
 from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
 import warnings
-from pygeogrids.grids import BasicGrid, genreg_grid
-cconfig['data_dir'] = os.path.join(os.path.dirname(__file__), 'cartopy')
-
-def _float_gcd(a, b, atol=1e-08):
-    "Greatest common divisor (=groesster gemeinsamer teiler)"
-    while abs(b) > atol:
-        a, b = b, a % b
-    return a
-
-def _get_grid(a):
-    "Find the stepsize of the grid behind a and return the parameters for that grid axis."
-    a = np.unique(a)  # get unique values and sort
-    das = np.unique(np.diff(a))  # get unique stepsizes and sort
-    da = das[0]  # get smallest stepsize
-    for d in das[1:]:  # make sure, all stepsizes are multiple of da
-        da = _float_gcd(d, da)
-    a_min = a[0]
-    a_max = a[-1]
-    len_a = int((a_max - a_min) / da + 1)
-    return a_min, a_max, da, len_a
-
-def _get_grid_for_irregulars(a, grid_stepsize):
-    "Find the stepsize of the grid behind a for datasets with predeifned grid stepsize, and return the parameters for that grid axis."
-    a = np.unique(a)
-    a_min = a[0]
-    a_max = a[-1]
-    da = grid_stepsize
-    len_a = int((a_max - a_min) / da + 1)
-    return a_min, a_max, da, len_a
-
-def _value2index(a, a_min, da):
-    "Return the indexes corresponding to a. a and the returned index is a numpy array."
-    return ((a - a_min) / da).astype('int')
+from qa4sm_reader.grid import GridDescriptor, oversample_lut, _float_gcd, _get_grid, \
+    _get_grid_for_irregulars, _value2index
 
 def oversample(lon, lat, data, extent, dx, dy):
-
-    other = BasicGrid(lon, lat)
-    reg_grid = genreg_grid(dx, dy, minlat=extent[2], maxlat=extent[3],
-                           minlon=extent[0], maxlon=extent[1])
-    max_dist = dx * 111 * 1000 # a mean distance for one degree it's around 111 km
-    lut = reg_grid.calc_lut(other, max_dist=max_dist)
+    """
+    Sample data at irregular locations onto a regular grid (nearest neighbour).
+    GridDescriptor.oversample reuses the look-up table for repeated calls.
+    """
+    lut, reg_grid = oversample_lut(lon, lat, extent, dx, dy)
     img = np.ma.masked_where(lut == -1, data[lut])
     img[np.isnan(img)] = np.ma.masked
 
     return img.reshape(-1, reg_grid.shape[1]), reg_grid
 
-def geotraj_to_geo2d(df, var, index=globals.index_names, grid_stepsize=None):
+def geotraj_to_geo2d(df, var, index=globals.index_names, grid_stepsize=None, grid=None):
     """
     Converts geotraj (list of lat, lon, value) to a regular grid over lon, lat.
     The values in df needs to be sampled from a regular grid, the order does not matter.
@@ -77,6 +52,10 @@ def geotraj_to_geo2d(df, var, index=globals.index_names, grid_stepsize=None):
         The default is globals.index_names
     grid_stepsize : None or float, optional
         angular grid stepsize to prepare a regular grid for plotting
+    grid : GridDescriptor, optional
+        The grid behind the locations (e.g. QA4SMImg.grid), if it is known.
+        It is then not inferred from df again, grid_stepsize is not used.
+        The default is None.
 
     Returns
     -------
@@ -89,29 +68,27 @@ def geotraj_to_geo2d(df, var, index=globals.index_names, grid_stepsize=None):
     origin : string
         'upper' or 'lower' - define how the plot should be oriented, for irregular grids it should return 'upper'
     """
-    xx = df.index.get_level_values(index[1])  # lon
-    yy = df.index.get_level_values(index[0])   # lat
+    xx = np.asarray(df.index.get_level_values(index[1]))  # lon
+    yy = np.asarray(df.index.get_level_values(index[0]))   # lat
     data = df[var]
 
-    if grid_stepsize not in ['nan', None]:
-        x_min, x_max, dx, len_x = _get_grid_for_irregulars(xx, grid_stepsize)
-        y_min, y_max, dy, len_y = _get_grid_for_irregulars(yy, grid_stepsize)
-        data_extent = (x_min - dx/2, x_max + dx/2, y_min - dy/2, y_max + dy/2)
-        zz, grid = oversample(xx, yy, data.values, data_extent, dx, dy)
+    if grid is None:
+        if grid_stepsize in ['nan', None]:
+            grid_stepsize = None
+        grid = GridDescriptor(xx, yy, grid_stepsize)
+
+    data_extent = grid.data_extent
+    if grid.irregular:
+        zz = grid.oversample(data.values, xx, yy)
         origin = 'upper'
     else:
-        x_min, x_max, dx, len_x = _get_grid(xx)
-        y_min, y_max, dy, len_y = _get_grid(yy)
-        ii = _value2index(yy, y_min, dy)
-        jj = _value2index(xx, x_min, dx)
-        zz = np.full((len_y, len_x), np.nan, dtype=np.float64)
-        zz[ii, jj] = data
-        data_extent = (x_min - dx / 2, x_max + dx / 2, y_min - dy / 2, y_max + dy / 2)
+        zz = grid.to_raster(data.values, xx, yy)
         origin = 'lower'
 
     return zz, data_extent, origin
 
-def get_value_range(ds, metric=None, force_quantile=False, quantiles=[0.025, 0.975]):
+def get_value_range(ds, metric=None, force_quantile=False, quantiles=[0.025, 0.975],
+                    quantile_values=None):
     """
     Get the value range (v_min, v_max) from globals._metric_value_ranges
     If the range is (None, None), a symmetric range around 0 is created,
@@ -120,8 +97,8 @@ def get_value_range(ds, metric=None, force_quantile=False, quantiles=[0.025, 0.9
 
     Parameters
     ----------
-    ds : pd.DataFrame or pd.Series
-        Series holding the values
+    ds : pd.DataFrame or pd.Series or xr.DataArray
+        Series holding the values, a dask backed array is reduced chunk by chunk.
     metric : str , optional (default: None)
         name of the metric (e.g. 'R'). None equals to force_quantile=True.
     force_quantile : bool, optional
@@ -130,6 +107,10 @@ def get_value_range(ds, metric=None, force_quantile=False, quantiles=[0.025, 0.9
     quantiles : list, optional
         quantile of data to include in the range.
         The default is [0.025,0.975]
+    quantile_values : list, optional
+        The (lower, upper) quantiles of the values if they are already known,
+        e.g. from QA4SMImg.metric_stats. ds is then not used.
+        The default is None.
 
     Returns
     -------
@@ -138,6 +119,11 @@ def get_value_range(ds, metric=None, force_quantile=False, quantiles=[0.025, 0.9
     v_max : float
         upper value range of plot.
     """
+    def _quantiles():
+        if quantile_values is not None:
+            return quantile_values[0], quantile_values[1]
+        return get_quantiles(ds, quantiles)
+
     if metric == None:
         force_quantile = True
 
@@ -146,13 +132,13 @@ def get_value_range(ds, metric=None, force_quantile=False, quantiles=[0.025, 0.9
             v_min = globals._metric_value_ranges[metric][0]
             v_max = globals._metric_value_ranges[metric][1]
             if (v_min is None and v_max is None):  # get quantile range and make symmetric around 0.
-                v_min, v_max = get_quantiles(ds, quantiles)
+                v_min, v_max = _quantiles()
                 v_max = max(abs(v_min), abs(v_max))  # make sure the range is symmetric around 0
                 v_min = -v_max
             elif v_min is None:
-                v_min = get_quantiles(ds, quantiles)[0]
+                v_min = _quantiles()[0]
             elif v_max is None:
-                v_max = get_quantiles(ds, quantiles)[1]
+                v_max = _quantiles()[1]
             else:  # v_min and v_max are both determinded in globals
                 pass
         except KeyError:  # metric not known, fall back to quantile
@@ -164,18 +150,19 @@ def get_value_range(ds, metric=None, force_quantile=False, quantiles=[0.025, 0.9
                           '\', \''.join([metric for metric in globals._metric_value_ranges]) + '\'')
 
     if force_quantile:  # get quantile range
-        v_min, v_max = get_quantiles(ds, quantiles)
+        v_min, v_max = _quantiles()
 
     return v_min, v_max
 
 def get_quantiles(ds, quantiles):
     """
     Gets lower and upper quantiles from pandas.Series or pandas.DataFrame
+    or xarray.DataArray
 
     Parameters
     ----------
-    ds : (pandas.Series | pandas.DataFrame)
-        Input values.
+    ds : (pandas.Series | pandas.DataFrame | xarray.DataArray)
+        Input values. A dask backed array is reduced chunk by chunk.
     quantiles : list
         quantile of values to include in the range
 
@@ -187,6 +174,12 @@ def get_quantiles(ds, quantiles):
         upper quantile.
 
     """
+    if isinstance(ds, xr.DataArray):
+        if ds.chunks is None:
+            ds = ds.to_series()
+        else:
+            q = chunked_quantiles(ds.data, quantiles)
+            return q[0], q[1]
     q = ds.quantile(quantiles)
     if isinstance(ds, pd.Series):
         return q.iloc[0], q.iloc[1]
@@ -195,7 +188,36 @@ def get_quantiles(ds, quantiles):
     else:
         raise TypeError("Inappropriate argument type. 'ds' must be pandas.Series or pandas.DataFrame.")
 
-def get_plot_extent(df, grid=False):
+def get_stats(ds):
+    """
+    Gets median, standard deviation and number of values from pandas.Series
+    or xarray.DataArray
+
+    Parameters
+    ----------
+    ds : (pandas.Series | xarray.DataArray)
+        Input values. A dask backed array is reduced chunk by chunk (see
+        stats.chunked_summary_stats).
+
+    Returns
+    -------
+    median : float
+        median of the values.
+    std : float
+        standard deviation (ddof=1) of the values.
+    count : int
+        number of values that are not NaN.
+    """
+    if isinstance(ds, xr.DataArray):
+        if ds.chunks is None:
+            ds = ds.to_series()
+        else:
+            stats = chunked_summary_stats(ds, quantiles=[]).iloc[0]
+            return stats['median'], stats['std'], int(stats['count'])
+
+    return ds.median(), ds.std(), ds.count()
+
+def get_plot_extent(df, grid=False, grid_desc=None):
     """
     Gets the plot_extent from the values. Uses range of values and
     adds a padding fraction as specified in globals.map_pad
@@ -206,6 +228,9 @@ def get_plot_extent(df, grid=False):
         whether the values in df is on a equally spaced grid (for use in mapplot)
     df : pandas.DataFrame
         Plot values.
+    grid_desc : GridDescriptor, optional (default: None)
+        The grid behind the values, if it is known (implies grid=True).
+        It is then not inferred from df again.
     
     Returns
     -------
@@ -214,9 +239,11 @@ def get_plot_extent(df, grid=False):
     
     """
     lat, lon = globals.index_names
-    if grid:
-        x_min, x_max, dx, len_x = _get_grid(df.index.get_level_values(lon))
-        y_min, y_max, dy, len_y = _get_grid(df.index.get_level_values(lat))
+    if grid or (grid_desc is not None):
+        if grid_desc is None:
+            grid_desc = GridDescriptor(df.index.get_level_values(lon),
+                                       df.index.get_level_values(lat))
+        (x_min, y_min), (x_max, y_max), (dx, dy) = grid_desc.origin, grid_desc.end, grid_desc.step
         extent = [x_min-dx/2., x_max+dx/2., y_min-dx/2., y_max+dx/2.]
     else:
         extent = [df.index.get_level_values(lon).min(), df.index.get_level_values(lon).max(),
@@ -239,20 +266,145 @@ def get_plot_extent(df, grid=False):
         extent[3] = 90
     return extent
 
-def init_plot(figsize, dpi, add_cbar=None, projection=None):
+def _add_map_axes(fig, add_cbar=None, projection=None):
+    "Add the map axes (and the colorbar axes below) to fig."
     if not projection:
         projection=globals.crs
-    fig = plt.figure(figsize=figsize, dpi=dpi)
     if add_cbar:
-        gs = gridspec.GridSpec(nrows=2, ncols=1, height_ratios=[19, 1])
+        gs = gridspec.GridSpec(nrows=2, ncols=1, height_ratios=[19, 1], figure=fig)
         ax = fig.add_subplot(gs[0], projection=projection)
         cax = fig.add_subplot(gs[1])
     else:
-        gs = gridspec.GridSpec(nrows=1, ncols=1)
+        gs = gridspec.GridSpec(nrows=1, ncols=1, figure=fig)
         ax = fig.add_subplot(gs[0], projection=projection)
         cax = None
+    return ax, cax
+
+def init_plot(figsize, dpi, add_cbar=None, projection=None):
+    fig = plt.figure(figsize=figsize, dpi=dpi)
+    ax, cax = _add_map_axes(fig, add_cbar, projection)
     return fig, ax, cax
 
+def init_multi_plot(n_panels, ncols=None, figsize=None, dpi=globals.dpi, add_cbar=True,
+                    projection=None):
+    """
+    Create a figure with a grid of map axes (and one colorbar axes below
+    all of them).
+
+    Parameters
+    ----------
+    n_panels : int
+        Number of map axes.
+    ncols : int, optional (default: None)
+        Number of map axes per row. If None, globals.multi_map_ncols.
+    figsize : tuple, optional (default: None)
+        If None, globals.multi_map_panel_size per panel.
+    dpi : int, optional (default: globals.dpi)
+    add_cbar : bool, optional (default: True)
+    projection : cartopy.crs, optional (default: None)
+        If None, globals.crs.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+    axes : list
+        The map axes, row by row.
+    cax : matplotlib.axes.Axes or None
+    """
+    if not projection:
+        projection = globals.crs
+    if not ncols:
+        ncols = globals.multi_map_ncols
+    ncols = max(min(ncols, n_panels), 1)
+    nrows = int(np.ceil(n_panels / ncols))
+    if figsize is None:
+        width, height = globals.multi_map_panel_size
+        figsize = (ncols * width, nrows * height + (0.5 if add_cbar else 0.))
+    fig = plt.figure(figsize=figsize, dpi=dpi)
+    height_ratios = [19] * nrows + ([1] if add_cbar else [])
+    gs = gridspec.GridSpec(nrows=len(height_ratios), ncols=ncols,
+                           height_ratios=height_ratios, figure=fig)
+    axes = [fig.add_subplot(gs[i // ncols, i % ncols], projection=projection)
+            for i in range(n_panels)]
+    cax = fig.add_subplot(gs[-1, :]) if add_cbar else None
+    return fig, axes, cax
+
+class MapBackground(object):
+    """
+    A styled base map (figure, map axes and colorbar axes) that is created
+    once and reused for all maps with the same extent, projection and style.
+    The figure is not managed by pyplot, so that plt.close() does not close
+    it. The data layer, colorbar, title and annotations of a map are removed
+    again with clear().
+    """
+    def __init__(self, plot_extent, figsize, dpi, add_cbar=None, projection=None,
+                 **style_kwargs):
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        self.ax, self.cax = _add_map_axes(self.fig, add_cbar, projection)
+        style_map(self.ax, plot_extent, **style_kwargs)
+        # draw once, so that the features are read and projected and the grid
+        # labels exist (bug in cartopy: https://github.com/SciTools/cartopy/issues/1207)
+        self.fig.canvas.draw()
+        self._base_artists = set(id(a) for a in self._data_artists())
+        pars = self.fig.subplotpars
+        self._subplotpars = dict(left=pars.left, right=pars.right, bottom=pars.bottom,
+                                 top=pars.top, wspace=pars.wspace, hspace=pars.hspace)
+
+    def _data_artists(self) -> list:
+        return list(self.ax.images) + list(self.ax.collections) + list(self.ax.texts)
+
+    def clear(self):
+        """ Remove everything that was added to the base map """
+        for artist in self._data_artists():
+            if id(artist) not in self._base_artists:
+                artist.remove()
+        self.ax.set_title('')
+        if self.cax is not None:
+            self.cax.clear()
+        for text in list(self.fig.texts):
+            text.remove()
+        self.fig.subplots_adjust(**self._subplotpars)
+
+class MapBackgroundCache(object):
+    """
+    Base maps (see MapBackground) by extent, projection, figure size and
+    style. The least recently used maps are dropped when there are more than
+    max_size.
+    """
+    def __init__(self, max_size=globals.map_background_cache_size):
+        self.max_size = max_size
+        self._backgrounds = OrderedDict()
+
+    def __len__(self):
+        return len(self._backgrounds)
+
+    def get(self, plot_extent, figsize, dpi, add_cbar=None, projection=None,
+            **style_kwargs) -> MapBackground:
+        """
+        Get the (cleared) base map for these settings, it is created if it
+        is not in the cache. Arguments are as for init_plot and style_map.
+        """
+        if not projection:
+            projection = globals.crs
+        key = (tuple(plot_extent), tuple(figsize), dpi, bool(add_cbar), projection,
+               tuple(sorted(style_kwargs.items())))
+        if key in self._backgrounds:
+            self._backgrounds.move_to_end(key)
+            background = self._backgrounds[key]
+            background.clear()
+        else:
+            background = MapBackground(plot_extent, figsize, dpi, add_cbar, projection,
+                                       **style_kwargs)
+            self._backgrounds[key] = background
+            while len(self._backgrounds) > self.max_size:
+                self._backgrounds.popitem(last=False)
+        return background
+
+    def clear(self):
+        """ Drop all base maps """
+        self._backgrounds.clear()
+
 def get_extend_cbar(metric):
     """
     Find out whether the colorbar should extend, based on globals._metric_value_ranges[metric]
@@ -321,20 +473,21 @@ def style_map(ax, plot_extent, add_grid=True, map_resolution=globals.naturaleart
                 print("No tick labels plotted.\n" + str(e))
     if add_topo:
         ax.stock_img()
+    # geometries are read, clipped to the extent and projected once per process (see features.py)
     if add_coastline:
-        coastline = cfeature.NaturalEarthFeature('physical', 'coastline',
-                                                 map_resolution,
-                                                 edgecolor='black', facecolor='none')
+        coastline = get_feature('physical', 'coastline', map_resolution,
+                                plot_extent, ax.projection,
+                                edgecolor='black', facecolor='none')
         ax.add_feature(coastline, linewidth=0.4, zorder=3)
     if add_land:
-        land = cfeature.NaturalEarthFeature('physical', 'land',
-                                            map_resolution,
-                                            edgecolor='none', facecolor='white')
+        land = get_feature('physical', 'land', map_resolution,
+                           plot_extent, ax.projection,
+                           edgecolor='none', facecolor='white')
         ax.add_feature(land, zorder=1)
     if add_borders:
-        borders = cfeature.NaturalEarthFeature('cultural', 'admin_0_countries',
-                                               map_resolution,
-                                               edgecolor='black', facecolor='none')
+        borders = get_feature('cultural', 'admin_0_countries', map_resolution,
+                              plot_extent, ax.projection,
+                              edgecolor='black', facecolor='none')
         ax.add_feature(borders, linewidth=0.2, zorder=3)
     if add_us_states:
         ax.add_feature(cfeature.STATES, linewidth=0.1, zorder=3)
@@ -364,14 +517,14 @@ def make_watermark(fig, placement=globals.watermark_pos, for_map=False, offset=0
     height = fig.get_size_inches()[1]
     offset = offset + (((fontsize + pad) / globals.matplotlib_ppi) / height) * 2.2
     if placement == 'top':
-        plt.annotate(globals.watermark, xy=[0.5, 1], xytext=[-pad, -pad],
+        fig.gca().annotate(globals.watermark, xy=[0.5, 1], xytext=[-pad, -pad],
                      fontsize=fontsize, color='grey',
                      horizontalalignment='center', verticalalignment='top',
                      xycoords='figure fraction', textcoords='offset points')
         top = fig.subplotpars.top
         fig.subplots_adjust(top=top - offset)
     elif placement == 'bottom':
-        plt.annotate(globals.watermark, xy=[0.5, 0], xytext=[pad, pad],
+        fig.gca().annotate(globals.watermark, xy=[0.5, 0], xytext=[pad, pad],
                      fontsize=fontsize, color='grey',
                      horizontalalignment='center', verticalalignment='bottom',
                      xycoords='figure fraction', textcoords='offset points')
@@ -379,4 +532,73 @@ def make_watermark(fig, placement=globals.watermark_pos, for_map=False, offset=0
         if not for_map:
             fig.subplots_adjust(bottom=bottom + offset)  # defaults to rc when none!
     else:
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+def _write_raster(fname, rgba, dpi):
+    "Write a rgba (uint8) image to a raster file, the format is taken from the extension."
+    ext = os.path.splitext(fname)[1].lower()
+    if ext == '.png':
+        mimage.imsave(fname, rgba, format='png', dpi=dpi)
+    else:
+        from PIL import Image
+        img = Image.fromarray(rgba)
+        if ext in ['.jpg', '.jpeg']:  # no alpha channel
+            img = img.convert('RGB')
+        img.save(fname, dpi=(dpi, dpi))
+
+def save_figure(fig, fnames, pad_inches=None):
+    """
+    Save a figure to multiple files (formats), cropped to the tight bounding
+    box as with savefig(bbox_inches='tight'). The figure is rendered once,
+    the tight bounding box is computed from that render and all raster
+    formats (globals.buffer_formats) are cut from the same buffer. Other
+    formats (e.g. svg, pdf) are rendered once each with the known bounding box.
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        Figure to save, with an Agg based canvas (other canvases are saved
+        with savefig for each file).
+    fnames : list
+        Files to save the figure to.
+    pad_inches : float, optional (default: None)
+        Padding around the tight bounding box, if None, from the rcParams.
+
+    Returns
+    -------
+    fnames : list
+        The saved files.
+    """
+    if pad_inches is None:
+        pad_inches = plt.rcParams['savefig.pad_inches']
+    if not isinstance(fig.canvas, FigureCanvasAgg):
+        for fname in fnames:
+            with stage('savefig', file=os.path.basename(fname)):
+                fig.savefig(fname, dpi='figure', bbox_inches='tight', pad_inches=pad_inches)
+        return fnames
+
+    with stage('render'):
+        canvas = fig.canvas
+        canvas.draw()  # also necessary bcs of a bug in cartopy: https://github.com/SciTools/cartopy/issues/1207
+        bbox = fig.get_tightbbox(canvas.get_renderer()).padded(pad_inches)
+
+    # bbox in pixels, from the top left corner of the buffer
+    dpi = fig.dpi
+    width, height = canvas.get_width_height()
+    x0, x1 = int(round(bbox.x0 * dpi)), int(round(bbox.x1 * dpi))
+    y0, y1 = height - int(round(bbox.y1 * dpi)), height - int(round(bbox.y0 * dpi))
+    in_buffer = (x0 >= 0) and (y0 >= 0) and (x1 <= width) and (y1 <= height)
+    rgba = None
+
+    for fname in fnames:
+        ext = os.path.splitext(fname)[1].lower()
+        with stage('savefig', file=os.path.basename(fname)):
+            if in_buffer and (ext in globals.buffer_formats):
+                if rgba is None:
+                    rgba = np.array(canvas.buffer_rgba())[y0:y1, x0:x1]
+                try:
+                    _write_raster(fname, rgba, dpi)
+                    continue
+                except ImportError:  # PIL is not installed, for formats other than png
+                    pass
+            fig.savefig(fname, dpi='figure', bbox_inches=bbox)
+    return fnames
@@ -4,6 +4,8 @@ from qa4sm_reader.img import QA4SMImg
 import os
 import seaborn as sns
 from qa4sm_reader.plot_utils import *
+from qa4sm_reader.stats import quantile_name
+from qa4sm_reader.timing import stage
 
 def _make_cbar(fig, im, cax, ref_short, metric):
     try:
@@ -67,9 +69,35 @@ def boxplot(df, label=None, figsize=None, dpi=100):
 
 
 
+def _plot_values(ax, df, var, cmap, v_min, v_max, scattered, ref_grid_stepsize=None, grid=None):
+    "Draw df[var] to the map ax (scatter for scattered references, else an image), returns the artist."
+    if scattered:  # === scatterplot ===
+        # === marker size ===
+        markersize = globals.markersize ** 2  # in points**2
+
+        # === plot ===
+        lat, lon = globals.index_names
+        with stage('scatter'):
+            im = ax.scatter(df.index.get_level_values(lon), df.index.get_level_values(lat),
+                            c=df[var], cmap=cmap, s=markersize, vmin=v_min, vmax=v_max, edgecolors='black',
+                            linewidths=0.1, zorder=2, transform=globals.data_crs)
+    else:  # === mapplot ===
+        # === prepare values ===
+        with stage('grid'):
+            zz, zz_extent, origin = geotraj_to_geo2d(df, var, grid_stepsize=ref_grid_stepsize,
+                                                     grid=grid)
+
+        # === plot ===
+        with stage('imshow'):
+            im = ax.imshow(zz, cmap=cmap, vmin=v_min, vmax=v_max,
+                           interpolation='nearest', origin=origin,
+                           extent=zz_extent,
+                           transform=globals.data_crs, zorder=2)
+    return im
+
 def mapplot(df, var, metric, ref_short, ref_grid_stepsize=None, plot_extent=None, colormap=None, projection=None,
-                add_cbar=True, figsize=globals.map_figsize, dpi=globals.dpi,
-                **style_kwargs):
+                add_cbar=True, figsize=globals.map_figsize, dpi=globals.dpi, value_range=None,
+                background=None, draw=True, grid=None, **style_kwargs):
         """
         Create an overview map from df using df[var] as color.
         Plots a scatterplot for ISMN and a image plot for other input values.
@@ -100,6 +128,23 @@ def mapplot(df, var, metric, ref_short, ref_grid_stepsize=None, plot_extent=None
             Figure size in inches. The default is globals.map_figsize.
         dpi: int, optional
             Resolution for raster graphic output. The default is globals.dpi.
+        value_range: tuple, optional
+            (v_min, v_max) of the colormap. If None, it is derived from df[var].
+            The default is None.
+        background: MapBackgroundCache, optional
+            Cache of styled base maps. If passed, the figure of the base map
+            for the extent, projection and style is reused (it is created and
+            styled only once) and only the values and the colorbar are drawn.
+            The figure is not managed by pyplot and is cleared when the same
+            base map is requested again. The default is None.
+        draw: bool, optional
+            Draw the figure before it is returned, necessary bcs of a bug in
+            cartopy (grid labels are not in the tight bounding box before the
+            first draw). Not needed when the figure is saved with save_figure,
+            which renders it anyway. The default is True.
+        grid: GridDescriptor, optional
+            The grid behind the locations in df (e.g. QA4SMImg.grid), so that
+            it is not inferred again for each map. The default is None.
         **style_kwargs :
             Keyword arguments for plotter.style_map().
         Returns
@@ -110,11 +155,10 @@ def mapplot(df, var, metric, ref_short, ref_grid_stepsize=None, plot_extent=None
             DESCRIPTION.
         """
         # === value range ===
-
-        v_min, v_max = get_value_range(df[var], metric)
-
-        # === init plot ===
-        fig, ax, cax = init_plot(figsize, dpi, add_cbar, projection)
+        if value_range is None:
+            v_min, v_max = get_value_range(df[var], metric)
+        else:
+            v_min, v_max = value_range
 
         if not colormap:
             # colormap = globals._colormaps[meta['metric']]
@@ -123,45 +167,134 @@ def mapplot(df, var, metric, ref_short, ref_grid_stepsize=None, plot_extent=None
             cmap = colormap
         # cmap = plt.cm.get_cmap(colormap)
 
-        # === scatter or mapplot ===
-        if ref_short in globals.scattered_datasets:  # === scatterplot ===
-            # === coordiniate range ===
-            if not plot_extent:
-                plot_extent = get_plot_extent(df)
+        scattered = ref_short in globals.scattered_datasets
 
-            # === marker size ===
-            markersize = globals.markersize ** 2  # in points**2
+        # === coordiniate range ===
+        if not plot_extent:
+            with stage('grid'):
+                plot_extent = get_plot_extent(df, grid=not scattered,
+                                              grid_desc=None if scattered else grid)
 
-            # === plot ===
-            lat, lon = globals.index_names
-            im = ax.scatter(df.index.get_level_values(lon), df.index.get_level_values(lat),
-                            c=df[var], cmap=cmap, s=markersize, vmin=v_min, vmax=v_max, edgecolors='black',
-                            linewidths=0.1, zorder=2, transform=globals.data_crs)
-        else:  # === mapplot ===
-            # === coordiniate range ===
-            if not plot_extent:
-                plot_extent = get_plot_extent(df, grid=True)
-
-            # === prepare values ===
-            zz, zz_extent, origin = geotraj_to_geo2d(df, var, grid_stepsize=ref_grid_stepsize)
+        # === init plot ===
+        if background is not None:
+            with stage('background'):
+                bg = background.get(plot_extent, figsize, dpi, add_cbar, projection,
+                                    **style_kwargs)
+            fig, ax, cax = bg.fig, bg.ax, bg.cax
+        else:
+            with stage('init_plot'):
+                fig, ax, cax = init_plot(figsize, dpi, add_cbar, projection)
 
-            # === plot ===
-            im = ax.imshow(zz, cmap=cmap, vmin=v_min, vmax=v_max,
-                           interpolation='nearest', origin=origin,
-                           extent=zz_extent,
-                           transform=globals.data_crs, zorder=2)
+        # === scatter or mapplot ===
+        im = _plot_values(ax, df, var, cmap, v_min, v_max, scattered, ref_grid_stepsize, grid)
 
         # === add colorbar ===
         if add_cbar:
-            _make_cbar(fig, im, cax, ref_short, metric)
+            with stage('colorbar'):
+                _make_cbar(fig, im, cax, ref_short, metric)
 
-        style_map(ax, plot_extent, **style_kwargs)
+        if background is None:
+            with stage('style_map'):
+                style_map(ax, plot_extent, **style_kwargs)
 
         # === layout ===
-        fig.canvas.draw()  # very slow. necessary bcs of a bug in cartopy: https://github.com/SciTools/cartopy/issues/1207
+        if draw and (background is None):
+            with stage('draw'):
+                fig.canvas.draw()  # very slow. necessary bcs of a bug in cartopy: https://github.com/SciTools/cartopy/issues/1207
         # plt.tight_layout()  # pad=1)  # pad=0.5,h_pad=1,w_pad=1,rect=(0, 0, 1, 1))
         return fig, ax
 
+def mapplot_multi(df, varnames, metric, ref_short, ref_grid_stepsize=None, plot_extent=None,
+                  colormap=None, projection=None, add_cbar=True, ncols=None, figsize=None,
+                  dpi=globals.dpi, value_range=None, titles=None, draw=True, grid=None,
+                  **style_kwargs):
+    """
+    Create one figure with a map panel for each variable in varnames (small
+    multiples). All panels share the projection, the extent, the value range
+    and a single colorbar.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        DataFrame with lat and lon in the multiindex and the varnames as columns.
+    varnames : list
+        Variables to be plotted, one panel each.
+    metric : str
+        Metric of the variables.
+    ref_short : str
+        Short name of the reference dataset.
+    ref_grid_stepsize : float or None, optional (default: None)
+        Angular grid stepsize of irregular reference grids, see mapplot.
+    plot_extent : tuple, optional (default: None)
+        (x_min, x_max, y_min, y_max) in Data coordinates. If None, it is
+        derived from df.
+    colormap : Colormap, optional (default: None)
+        If None, defaults to globals._colormaps.
+    projection : cartopy.crs, optional (default: None)
+        If None, defaults to globals.crs.
+    add_cbar : bool, optional (default: True)
+        Add a colorbar below the panels.
+    ncols : int, optional (default: None)
+        Number of panels per row. If None, globals.multi_map_ncols.
+    figsize : tuple, optional (default: None)
+        Figure size in inches. If None, globals.multi_map_panel_size per panel.
+    dpi : int, optional
+        Resolution for raster graphic output. The default is globals.dpi.
+    value_range : tuple, optional (default: None)
+        (v_min, v_max) of the colormap. If None, the union of the value ranges
+        of all variables.
+    titles : list, optional (default: None)
+        Title of each panel.
+    draw : bool, optional (default: True)
+        Draw the figure before it is returned, see mapplot.
+    grid : GridDescriptor, optional (default: None)
+        The grid behind the locations in df, e.g. QA4SMImg.grid.
+    **style_kwargs :
+        Keyword arguments for plotter.style_map().
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+    axes : list
+        The map axes, one per variable.
+    """
+    # === value range ===
+    if value_range is None:
+        ranges = np.array([get_value_range(df[var], metric) for var in varnames], dtype=float)
+        v_min, v_max = np.nanmin(ranges[:, 0]), np.nanmax(ranges[:, 1])
+    else:
+        v_min, v_max = value_range
+
+    cmap = colormap if colormap else globals._colormaps[metric]
+    scattered = ref_short in globals.scattered_datasets
+
+    # === coordiniate range ===
+    if not plot_extent:
+        with stage('grid'):
+            plot_extent = get_plot_extent(df, grid=not scattered,
+                                          grid_desc=None if scattered else grid)
+
+    with stage('init_plot'):
+        fig, axes, cax = init_multi_plot(len(varnames), ncols, figsize, dpi, add_cbar, projection)
+
+    for i, (ax, var) in enumerate(zip(axes, varnames)):
+        im = _plot_values(ax, df, var, cmap, v_min, v_max, scattered, ref_grid_stepsize, grid)
+        # geometries of the features are clipped and projected once for all panels (see features.py)
+        with stage('style_map'):
+            style_map(ax, plot_extent, **style_kwargs)
+        if titles is not None:
+            ax.set_title(titles[i], fontsize='medium')
+
+    # === add colorbar ===
+    if add_cbar:
+        with stage('colorbar'):
+            _make_cbar(fig, im, cax, ref_short, metric)
+
+    if draw:
+        with stage('draw'):
+            fig.canvas.draw()  # bug in cartopy, see mapplot
+    return fig, axes
+
 def get_dir_name_type(out_name, out_type='png', out_dir=None):
     """
     Standardized behaviour for filenames.
@@ -211,7 +344,7 @@ def get_dir_name_type(out_name, out_type='png', out_dir=None):
 
 class QA4SMPlotter(object):
 
-    def __init__(self, image, out_dir=None):
+    def __init__(self, image, out_dir=None, reuse_background=True):
         """
         Create box plots from results in a qa4sm output file.
 
@@ -223,24 +356,26 @@ class QA4SMPlotter(object):
             Path to output generated plot.
             If None, defaults to the current working directory.
             The default is None.
+        reuse_background : bool, optional (default: True)
+            Create the styled base map (features, gridlines) once for all maps
+            with the same extent and style and only draw the values and the
+            colorbar for each variable. Only used when maps are saved to out_dir.
         """
         self.img = image
         self.out_dir = out_dir
+        self.backgrounds = MapBackgroundCache() if reuse_background else None
 
-    def _box_stats(self, ds:pd.Series, med:bool=True, std:bool=True,
+    def _box_stats(self, stats:pd.Series, med:bool=True, std:bool=True,
                    count:bool=True) -> str:
-        """ Create the metric part with stats of the box caption """
-
-        std = ds.std() if std else None
-        count = ds.count() if count else None
+        """ Create the metric part with stats (from QA4SMImg.metric_stats) of the box caption """
 
         met_str = []
         if med:
-            met_str.append('median: {:.3g}'.format(ds.median()))
+            met_str.append('median: {:.3g}'.format(stats['median']))
         if std:
-            met_str.append('std. dev.: {:.3g}'.format(ds.std()))
+            met_str.append('std. dev.: {:.3g}'.format(stats['std']))
         if count:
-            met_str.append('N: {:d}'.format(ds.count()))
+            met_str.append('N: {:d}'.format(int(stats['count'])))
 
         return '\n'.join(met_str)
 
@@ -345,7 +480,9 @@ class QA4SMPlotter(object):
         fnames = list()  # list to store all filenames.
 
         # === load values and metadata ===
-        dfs = self.img.metric_df(metric)
+        with stage('values'):
+            dfs = self.img.metric_df(metric)
+            stats = self.img.metric_stats(metric)
         for i, df in enumerate(dfs):
             tcvars = df.columns.values
             REF_META, _, MDS_META = self.img.var_meta(tcvars[0])[metric]
@@ -359,7 +496,7 @@ class QA4SMPlotter(object):
                     caption_header='Other Data:')
 
                 if add_stats:
-                    box_stats = self._box_stats(df[tcvar])
+                    box_stats = self._box_stats(stats.loc[tcvar])
                     box_cap = '{}\n{}'.format(box_cap_ds, box_stats)
                 else:
                     box_cap = box_cap_ds
@@ -380,7 +517,8 @@ class QA4SMPlotter(object):
             figwidth = globals.boxplot_width * (1 + len(df.columns))
             figsize = [figwidth, globals.boxplot_height]
 
-            fig, ax = boxplot(df=df, label=label, figsize=figsize, dpi=globals.dpi)
+            with stage('boxplot'):
+                fig, ax = boxplot(df=df, label=label, figsize=figsize, dpi=globals.dpi)
 
             # === set limits ===
             ##ax.set_ylim(get_value_range(df, metric))
@@ -396,14 +534,12 @@ class QA4SMPlotter(object):
             out_name = 'boxplot_{}_for_{}-{}'.format(metric, MDS_META[0], MDS_META[1]['short_name'])
 
             out_dir, out_name, out_type = get_dir_name_type(out_name, out_type, self.out_dir)
-            if not os.path.exists(out_dir):
-                os.makedirs(out_dir)
-            for ending in out_type:
-                fname = os.path.join(out_dir, out_name+ending)
+            os.makedirs(out_dir, exist_ok=True)
+            fnames_fig = [os.path.join(out_dir, out_name+ending) for ending in out_type]
+            for fname in fnames_fig:
                 if os.path.isfile(fname):
                     warnings.warn('Overwriting file {}'.format(fname))
-                plt.savefig(fname, dpi='figure', bbox_inches='tight')
-                fnames.append(fname)
+            fnames += save_figure(fig, fnames_fig)
             plt.close()
         return fnames
 
@@ -440,7 +576,9 @@ class QA4SMPlotter(object):
         fnames = list()  # list to store all filenames.
 
         # === load values and metadata ===
-        df = self.img.metric_df(metric)
+        with stage('values'):
+            df = self.img.metric_df(metric)
+            stats = self.img.metric_stats(metric)
         metric_meta = self.img.metric_meta(metric)
         ref_meta = self.img.ref_meta()[1]
 
@@ -448,12 +586,12 @@ class QA4SMPlotter(object):
         for var, meta in metric_meta.items():
             dss_meta = meta[1]
 
-            if var in self.img.ls_vars(True)['common']:
+            if self.img.find_group(var) is self.img.common:
                 box_cap_ds = 'All datasets'
             else:
                 box_cap_ds = self._box_caption(dss_meta)
             if add_stats:
-                box_stats = self._box_stats(df[var])
+                box_stats = self._box_stats(stats.loc[var])
                 box_cap = '{}\n{}'.format(box_cap_ds, box_stats)
             else:
                 box_cap = box_cap_ds
@@ -473,7 +611,8 @@ class QA4SMPlotter(object):
         figwidth = globals.boxplot_width * (1 + len(df.columns))
         figsize = [figwidth, globals.boxplot_height]
 
-        fig, ax = boxplot(df=df, label=label, figsize=figsize, dpi=globals.dpi)
+        with stage('boxplot'):
+            fig, ax = boxplot(df=df, label=label, figsize=figsize, dpi=globals.dpi)
 
         # === set limits ===
         #ax.set_ylim(get_value_range(df, metric))
@@ -493,12 +632,9 @@ class QA4SMPlotter(object):
             return fig, ax
         else:
             out_dir, out_name, out_type = get_dir_name_type(out_name, out_type, self.out_dir)
-            if not os.path.exists(out_dir):
-                os.makedirs(out_dir)
-            for ending in out_type:
-                fname = os.path.join(out_dir, out_name+ending)
-                plt.savefig(fname, dpi='figure', bbox_inches='tight')
-                fnames.append(fname)
+            os.makedirs(out_dir, exist_ok=True)
+            fnames = save_figure(fig, [os.path.join(out_dir, out_name+ending)
+                                       for ending in out_type])
             plt.close('all')
             return fnames
 
@@ -534,7 +670,8 @@ class QA4SMPlotter(object):
             Axes or list of axes containing the plot.
 
         """
-        df = self.img._ds2df([varname])
+        with stage('values'):
+            df = self.img._ds2df([varname])
         var_meta = self.img.var_meta(varname)
 
         assert len(list(var_meta.keys())) == 1
@@ -543,9 +680,24 @@ class QA4SMPlotter(object):
         ref_short = self.img.ref_dataset
         ref_grid_stepsize = self.img.ref_dataset_grid_stepsize
 
+        if 'value_range' not in plot_kwargs:
+            with stage('value_range'):
+                stats = self.img.metric_stats(metric).loc[varname]
+                plot_kwargs['value_range'] = get_value_range(
+                    None, metric, quantile_values=[stats[quantile_name(q)]
+                                                   for q in globals.stats_quantiles])
+
+        if ref_short not in globals.scattered_datasets:  # same grid for all variables
+            plot_kwargs.setdefault('grid', self.img.grid)
+
+        if self.out_dir is not None:  # the figure is rendered once by save_figure
+            plot_kwargs.setdefault('background', self.backgrounds)
+            plot_kwargs.setdefault('draw', False)
+
         # === plot values ===
-        fig, ax = mapplot(df=df, var=varname, metric=metric, ref_short=ref_short, ref_grid_stepsize = ref_grid_stepsize,
-                          plot_extent=self.img.extent, **plot_kwargs)
+        with stage('mapplot'):
+            fig, ax = mapplot(df=df, var=varname, metric=metric, ref_short=ref_short, ref_grid_stepsize = ref_grid_stepsize,
+                              plot_extent=self.img.extent, **plot_kwargs)
 
         # === add title ===
         if var_meta[metric][1] is None:
@@ -593,16 +745,100 @@ class QA4SMPlotter(object):
             fnames = []
             out_dir, out_name, out_type = \
                 get_dir_name_type(out_name, out_type, self.out_dir)
-            if not os.path.exists(out_dir):
-                os.makedirs(out_dir)
-            for ending in out_type:
-                fname = os.path.join(out_dir, out_name+ending)
-                plt.savefig(fname, dpi='figure', bbox_inches='tight')
-                fnames.append(fname)
+            os.makedirs(out_dir, exist_ok=True)
+            fnames = save_figure(fig, [os.path.join(out_dir, out_name+ending)
+                                       for ending in out_type])
             plt.close('all')
             return fnames
 
-    def mapplot(self, metric, out_type=None, **plot_kwargs):
+    def _panel_title(self, var_meta:dict, metric:str) -> str:
+        """ Short title of the panel of a variable in mapplot_multi: the (other) dataset """
+        if var_meta[metric][1] is None:
+            return globals._metric_name[metric]
+        if metric in globals.metric_groups[3]:
+            ds_num, ds_meta = var_meta[metric][2]
+        else:
+            ds_num, ds_meta = var_meta[metric][1][0]
+        return '{}-{} ({})'.format(ds_num, ds_meta['pretty_name'], ds_meta['pretty_version'])
+
+    def mapplot_multi(self, metric, out_name=None, out_type=None, **plot_kwargs):
+        """
+        Plots all variables of a metric to one figure, a map panel for each
+        variable, with a shared value range and colorbar (see mapplot_multi).
+
+        Parameters
+        ----------
+        metric : str
+            Name of a metric. File is searched for variables for that metric.
+        out_name : [ None | str ], optional
+            Name of output file.
+            If None, defaults to a name that is generated based on the metric.
+            The default is None.
+        out_type : [ str | list | None ], optional
+            The file type, e.g. 'png', 'pdf', 'svg', 'tiff'...
+            If list, a plot is saved for each type.
+            The default is png.
+        **plot_kwargs : dict, optional
+            Additional keyword arguments that are passed to mapplot_multi.
+
+        Returns
+        -------
+        fig, axes or fnames :
+            The figure and the map axes if the plotter has no out_dir, else
+            the list of files that were created.
+        """
+        metric_meta = self.img.metric_meta(metric)
+        varnames = list(metric_meta.keys())
+        with stage('values'):
+            df = self.img._ds2df(varnames)
+
+        ref_short = self.img.ref_dataset
+
+        if 'value_range' not in plot_kwargs:
+            with stage('value_range'):
+                stats = self.img.metric_stats(metric)
+                ranges = np.array([get_value_range(
+                    None, metric, quantile_values=[stats.loc[var, quantile_name(q)]
+                                                   for q in globals.stats_quantiles])
+                    for var in varnames], dtype=float)
+                plot_kwargs['value_range'] = (np.nanmin(ranges[:, 0]), np.nanmax(ranges[:, 1]))
+
+        if ref_short not in globals.scattered_datasets:  # same grid for all variables
+            plot_kwargs.setdefault('grid', self.img.grid)
+
+        if self.out_dir is not None:  # the figure is rendered once by save_figure
+            plot_kwargs.setdefault('draw', False)
+
+        titles = [self._panel_title({metric: metric_meta[var]}, metric) for var in varnames]
+
+        # === plot values ===
+        with stage('mapplot_multi'):
+            fig, axes = mapplot_multi(df=df, varnames=varnames, metric=metric, ref_short=ref_short,
+                                      ref_grid_stepsize=self.img.ref_dataset_grid_stepsize,
+                                      plot_extent=self.img.extent, titles=titles, **plot_kwargs)
+
+        # === add title ===
+        ref_num, ref_meta = metric_meta[varnames[0]][0]
+        fig.suptitle(self._box_title_basic(ref_meta, metric, max_len=globals.max_title_len))
+
+        # === add watermark ===
+        if globals.watermark_pos not in [None, False]:
+            make_watermark(fig, globals.watermark_pos, for_map=True)
+
+        if self.out_dir is None:
+            return fig, axes
+
+        # === save ===
+        if not out_name:
+            out_name = 'overview_{}-{}_{}_panels'.format(ref_num, ref_short, metric)
+        out_dir, out_name, out_type = get_dir_name_type(out_name, out_type, self.out_dir)
+        os.makedirs(out_dir, exist_ok=True)
+        fnames = save_figure(fig, [os.path.join(out_dir, out_name+ending)
+                                   for ending in out_type])
+        plt.close(fig)
+        return fnames
+
+    def mapplot(self, metric, out_type=None, multi=False, **plot_kwargs):
         """
         Plot ALL variables for a given metric in the loaded file.
 
@@ -612,19 +848,27 @@ class QA4SMPlotter(object):
             Path to the *.nc file to be processed.
         metric : str
             Name of a metric. File is searched for variables for that metric.
+        multi : bool, optional (default: False)
+            Plot all variables into one figure with a panel for each variable
+            (see mapplot_multi) instead of one figure per variable.
         **kwargs : dict, optional
-            Additional keyword arguments that are passed to mapplot_var
+            Additional keyword arguments that are passed to mapplot_var (or
+            mapplot_multi)
 
         Returns
         -------
         fnames : list
             List of files that were created
         """
+        if multi:
+            with stage('mapplot_multi', metric=str(metric)):
+                return self.mapplot_multi(metric, out_type=out_type, **plot_kwargs)
 
         varnames = list(self.img.metric_meta(metric).keys())
         fnames = []
         for varname in varnames:
-            fns = self.mapplot_var(varname, out_name=None, out_type=out_type, **plot_kwargs)
+            with stage('mapplot_var', var=varname):
+                fns = self.mapplot_var(varname, out_name=None, out_type=out_type, **plot_kwargs)
             plt.close('all')
             for fn in fns: fnames.append(fn)
         return fnames
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial index over the locations of a qa4sm results file, for fast box,
+polygon, radius and nearest neighbour queries.
+"""
+from qa4sm_reader import globals
+import numpy as np
+from matplotlib.path import Path
+from pygeogrids.grids import BasicGrid
+
+def _haversine(lon, lat, lons, lats):
+    "Great circle distance in m between the point (lon, lat) and the points (lons, lats)"
+    lon, lat, lons, lats = map(np.radians, (lon, lat, lons, lats))
+    a = np.sin((lats - lat) / 2.) ** 2 + \
+        np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2.) ** 2
+    return 2. * globals.earth_radius * np.arcsin(np.sqrt(np.clip(a, 0., 1.)))
+
+class QA4SMSpatialIndex(object):
+    """
+    Index of locations, built once. Points are sorted into regular lat/lon
+    cells (buckets), so that box, polygon and radius queries only test the
+    points in the cells they cover. Nearest neighbours are found with a
+    KD-tree (from pygeogrids) that is set up on the first query.
+    All queries return positions of points in the passed lon/lat arrays.
+    """
+    def __init__(self, lon, lat, cell_size=globals.spatial_index_cell_size):
+        """
+        Parameters
+        ----------
+        lon : np.array
+            Longitudes of the locations (-180 to 180)
+        lat : np.array
+            Latitudes of the locations (-90 to 90)
+        cell_size : float, optional (default: from globals)
+            Size of the cells that points are sorted into, in degrees.
+        """
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.cell_size = cell_size
+
+        self._n_cols = int(np.ceil(360. / cell_size))
+        self._n_rows = int(np.ceil(180. / cell_size))
+        cells = self._rows(self.lat) * self._n_cols + self._cols(self.lon)
+        self._order = np.argsort(cells, kind='stable')
+        self._cells = cells[self._order]
+
+        self._grid = None
+
+    def __len__(self):
+        return len(self.lon)
+
+    def _cols(self, lon):
+        return np.clip(np.floor((np.asarray(lon) + 180.) / self.cell_size),
+                       0, self._n_cols - 1).astype(np.int64)
+
+    def _rows(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90.) / self.cell_size),
+                       0, self._n_rows - 1).astype(np.int64)
+
+    def _candidates(self, min_lon, max_lon, min_lat, max_lat) -> np.array:
+        """ Positions of all points in the cells that the box touches """
+        rows = np.arange(self._rows(min_lat), self._rows(max_lat) + 1)
+        first = rows * self._n_cols + self._cols(min_lon)
+        last = rows * self._n_cols + self._cols(max_lon)
+        starts = np.searchsorted(self._cells, first, side='left')
+        ends = np.searchsorted(self._cells, last, side='right')
+        if len(starts) == 0:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([self._order[s:e] for s, e in zip(starts, ends)])
+
+    def _in_box(self, idx, min_lon, max_lon, min_lat, max_lat) -> np.array:
+        lon, lat = self.lon[idx], self.lat[idx]
+        return idx[(lon >= min_lon) & (lon <= max_lon) &
+                   (lat >= min_lat) & (lat <= max_lat)]
+
+    def bbox(self, min_lon, max_lon, min_lat, max_lat) -> np.array:
+        """
+        Find the points in a box (borders included).
+
+        Parameters
+        ----------
+        min_lon, max_lon, min_lat, max_lat : float
+            Box corners. If min_lon > max_lon, the box crosses the antimeridian.
+
+        Returns
+        -------
+        idx : np.array
+            Sorted positions of the points in the box.
+        """
+        if min_lon > max_lon:  # box crosses the antimeridian
+            return np.union1d(self.bbox(min_lon, 180., min_lat, max_lat),
+                              self.bbox(-180., max_lon, min_lat, max_lat))
+        idx = self._candidates(min_lon, max_lon, min_lat, max_lat)
+        return np.sort(self._in_box(idx, min_lon, max_lon, min_lat, max_lat))
+
+    def polygon(self, vertices) -> np.array:
+        """
+        Find the points in a polygon.
+
+        Parameters
+        ----------
+        vertices : list or np.array
+            (lon, lat) pairs of the polygon outline.
+
+        Returns
+        -------
+        idx : np.array
+            Sorted positions of the points in the polygon.
+        """
+        vertices = np.asarray(vertices, dtype=np.float64)
+        idx = self.bbox(vertices[:, 0].min(), vertices[:, 0].max(),
+                        vertices[:, 1].min(), vertices[:, 1].max())
+        inside = Path(vertices).contains_points(
+            np.column_stack([self.lon[idx], self.lat[idx]]))
+        return idx[inside]
+
+    def radius(self, lon, lat, radius) -> (np.array, np.array):
+        """
+        Find the points within a distance around a location.
+
+        Parameters
+        ----------
+        lon, lat : float
+            Location to search around.
+        radius : float
+            Maximum (great circle) distance in m.
+
+        Returns
+        -------
+        idx : np.array
+            Positions of the points, sorted by distance.
+        dist : np.array
+            Distances of the points in m.
+        """
+        dlat = np.degrees(radius / globals.earth_radius)
+        min_lat, max_lat = max(lat - dlat, -90.), min(lat + dlat, 90.)
+        if max(abs(min_lat), abs(max_lat)) >= 90. or dlat >= 90.:
+            idx = self.bbox(-180., 180., min_lat, max_lat)  # covers a pole
+        else:
+            dlon = dlat / np.cos(np.radians(max(abs(min_lat), abs(max_lat))))
+            if dlon >= 180.:
+                idx = self.bbox(-180., 180., min_lat, max_lat)
+            else:
+                min_lon = (lon - dlon + 180.) % 360. - 180.
+                max_lon = (lon + dlon + 180.) % 360. - 180.
+                idx = self.bbox(min_lon, max_lon, min_lat, max_lat)
+        dist = _haversine(lon, lat, self.lon[idx], self.lat[idx])
+        within = dist <= radius
+        idx, dist = idx[within], dist[within]
+        order = np.argsort(dist, kind='stable')
+        return idx[order], dist[order]
+
+    def nearest(self, lon, lat, k=1, max_dist=np.inf) -> (np.array, np.array):
+        """
+        Find the k nearest points to a location.
+
+        Parameters
+        ----------
+        lon, lat : float
+            Location to search around.
+        k : int, optional (default: 1)
+            Number of points to find.
+        max_dist : float, optional (default: np.inf)
+            Maximum distance in m, points further away are not returned.
+
+        Returns
+        -------
+        idx : np.array
+            Positions of the points, sorted by distance.
+        dist : np.array
+            Great circle distances of the points in m.
+        """
+        if len(self) == 0:
+            return np.array([], dtype=np.int64), np.array([])
+        if self._grid is None:
+            self._grid = BasicGrid(self.lon, self.lat)
+        k = min(k, len(self))
+        idx, _ = self._grid.find_k_nearest_gpi(lon, lat, k=k)
+        idx = np.atleast_1d(np.asarray(idx, dtype=np.int64).squeeze())
+        dist = _haversine(lon, lat, self.lon[idx], self.lat[idx])
+        within = dist <= max_dist
+        return idx[within], dist[within]
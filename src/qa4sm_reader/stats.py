@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Summary statistics of metric variables, computed for all variables of a
+metric at once.
+"""
+from qa4sm_reader import globals
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+import warnings
+
+def quantile_name(q:float) -> str:
+    """ Name of the column of a quantile in the summary statistics """
+    return 'q{:g}'.format(q)
+
+def _stats_frame(index, quantiles, count, mean, std, v_min, q, v_max,
+                 whislo, whishi) -> pd.DataFrame:
+    """ Combine the statistics (arrays over the variables) in a frame """
+    columns = OrderedDict([('mean', mean), ('std', std), ('min', v_min),
+                           ('q1', q[0]), ('median', q[1]), ('q3', q[2]),
+                           ('max', v_max), ('whislo', whislo), ('whishi', whishi)])
+    for i, quantile in enumerate(quantiles):
+        columns[quantile_name(quantile)] = q[3 + i]
+
+    stats = pd.DataFrame(index=index)
+    stats['count'] = np.asarray(count, dtype=np.int64)
+    for name, values in columns.items():
+        stats[name] = np.asarray(values, dtype=np.float64)
+    return stats
+
+def summary_stats(df:pd.DataFrame, quantiles:list=globals.stats_quantiles,
+                  whis:float=globals.stats_whis) -> pd.DataFrame:
+    """
+    Compute summary statistics for all columns of a data frame in one pass.
+    Each column is sorted once (in one call for the whole 2d array) and all
+    quantiles are read from the sorted values. NaNs are ignored. Mean and std
+    are computed in the (floating point) type of the values, as in pandas.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Values of the variables in the columns.
+    quantiles : list, optional (default: from globals)
+        Additional quantiles to compute (between 0 and 1), linearly
+        interpolated as in pandas.
+    whis : float, optional (default: from globals)
+        Whiskers are the most extreme values within whis times the IQR below
+        the first and above the third quartile.
+
+    Returns
+    -------
+    stats : pd.DataFrame
+        The columns of df in the rows, with count, mean, std (ddof=1), min,
+        q1, median, q3, max, whislo, whishi and the quantiles (see
+        quantile_name) in the columns.
+    """
+    dtype = np.result_type(*df.dtypes) if len(df.columns) > 0 else np.float64
+    if not np.issubdtype(dtype, np.floating):
+        dtype = np.float64
+    a = df.to_numpy(dtype=dtype, na_value=np.nan)
+    a = a.reshape(len(df.index), len(df.columns))
+    if a.shape[0] == 0:  # no values, all statistics are NaN
+        a = np.full((1, a.shape[1]), np.nan, dtype=dtype)
+    s = np.sort(a, axis=0)  # NaNs are sorted to the end
+    count = np.sum(~np.isnan(a), axis=0)
+
+    qs = np.array([0.25, 0.5, 0.75] + list(quantiles), dtype=np.float64)
+    pos = qs[:, np.newaxis] * np.maximum(count - 1, 0)[np.newaxis, :]
+    lo, hi = np.floor(pos).astype(np.int64), np.ceil(pos).astype(np.int64)
+    v_lo = np.take_along_axis(s, lo, axis=0).astype(np.float64)
+    v_hi = np.take_along_axis(s, hi, axis=0).astype(np.float64)
+    q = v_lo + (v_hi - v_lo) * (pos - lo)
+    q[:, count == 0] = np.nan
+
+    with warnings.catch_warnings():  # columns without values are NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean = np.nanmean(a, axis=0)
+        std = np.nanstd(a, axis=0, ddof=1)
+        iqr = q[2] - q[0]
+        whislo = np.nanmin(np.where(a >= q[0] - whis * iqr, a, np.nan), axis=0)
+        whishi = np.nanmax(np.where(a <= q[2] + whis * iqr, a, np.nan), axis=0)
+        v_min = np.nanmin(a, axis=0)
+        v_max = np.nanmax(a, axis=0)
+
+    return _stats_frame(df.columns, quantiles, count, mean, std, v_min, q, v_max,
+                        whislo, whishi)
+
+def chunked_summary_stats(da, quantiles:list=globals.stats_quantiles,
+                          whis:float=globals.stats_whis) -> pd.DataFrame:
+    """
+    Compute the summary statistics (see summary_stats) of a single dask backed
+    variable, chunk by chunk. Requires dask.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Values of the variable, backed by dask.
+    quantiles : list, optional (default: from globals)
+        Additional quantiles to compute.
+    whis : float, optional (default: from globals)
+        Whisker range in IQRs.
+
+    Returns
+    -------
+    stats : pd.DataFrame
+        Statistics of the variable, in a single row named after it.
+    """
+    import dask
+    import dask.array as dska
+
+    a = da.data.ravel()
+    q = chunked_quantiles(a, [0.25, 0.5, 0.75] + list(quantiles))
+    iqr = q[2] - q[0]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        count, mean, std, v_min, v_max, whislo, whishi = dask.compute(
+            (~dska.isnan(a)).sum(), dska.nanmean(a), dska.nanstd(a, ddof=1),
+            dska.nanmin(a), dska.nanmax(a),
+            dska.nanmin(dska.where(a >= q[0] - whis * iqr, a, np.nan)),
+            dska.nanmax(dska.where(a <= q[2] + whis * iqr, a, np.nan)))
+
+    return _stats_frame([da.name], quantiles, [count], [mean], [std], [v_min],
+                        q[:, np.newaxis], [v_max], [whislo], [whishi])
+
+def _bin_index(a, mask, v_min, v_max, bins):
+    """ Histogram bin of each value in mask (of bins over [v_min, v_max]), other values go to an extra bin """
+    import dask.array as da
+    idx = da.floor((da.where(mask, a, v_min) - v_min) / (v_max - v_min) * bins)
+    return da.where(mask, da.clip(idx, 0, bins - 1), bins).astype(np.int64)
+
+def chunked_quantiles(a, quantiles, bins=globals.chunked_quantile_bins,
+                      max_values=globals.chunked_quantile_max_values):
+    """
+    Get quantiles of a dask array without loading it at once. The values are
+    counted in a histogram chunk by chunk. The bins that hold the quantiles
+    are divided by further histograms (over the values in the bin only),
+    until they hold at most max_values values. Only the values of these bins
+    are loaded to interpolate the exact result (linear, as in pandas), so
+    that skewed values (e.g. a single outlier) do not put most values into a
+    single bin that is loaded at once.
+
+    Parameters
+    ----------
+    a : dask.array.Array
+        Input values, NaNs are ignored.
+    quantiles : list
+        quantiles to compute, between 0 and 1.
+    bins : int, optional
+        Number of histogram bins. The default is globals.chunked_quantile_bins.
+    max_values : int, optional
+        Maximum number of values of a bin that is loaded. The default is
+        globals.chunked_quantile_max_values.
+
+    Returns
+    -------
+    q : np.array
+        The quantiles, NaN if there are no valid values.
+    """
+    import dask
+    import dask.array as da
+
+    a = a.ravel()
+    valid = ~da.isnan(a)
+    n, a_min, a_max = dask.compute(valid.sum(), da.nanmin(a), da.nanmax(a))
+    if n == 0:
+        return np.full(len(quantiles), np.nan)
+    if a_min == a_max:
+        return np.full(len(quantiles), a_min, dtype=np.float64)
+
+    # ranks (in the sorted values) that are needed for the interpolation
+    pos = np.asarray(quantiles, dtype=np.float64) * (n - 1)
+    ranks = np.unique(np.concatenate([np.floor(pos), np.ceil(pos)]).astype(np.int64))
+
+    # each group is a set of values (mask) with `below` smaller values, its
+    # number of values, its range and the ranks that are in the set
+    order_stats = {}
+    groups = [(valid, 0, int(n), a_min, a_max, ranks)]
+    while groups:
+        small = [g for g in groups if (g[2] <= max_values) or (g[3] == g[4])]
+        large = [g for g in groups if (g[2] > max_values) and (g[3] != g[4])]
+
+        # sets are ordered by value, so the sorted values of a set are in the
+        # same order as in the sorted array of all values.
+        loaded = dask.compute(*[a[mask] for mask, _, count, v_min, v_max, _ in small
+                                if v_min != v_max])
+        loaded = iter(loaded)
+        for mask, below, count, v_min, v_max, rs in small:
+            values = np.full(1, v_min) if v_min == v_max else np.sort(next(loaded))
+            for r in rs:
+                order_stats[r] = values[min(r - below, len(values) - 1)]
+
+        # divide the large sets, each rank goes into the bin that holds it
+        idxs = [_bin_index(a, mask, v_min, v_max, bins) for mask, _, _, v_min, v_max, _ in large]
+        hists = dask.compute(*[da.bincount(idx, minlength=bins + 1)[:bins] for idx in idxs])
+        subsets = []
+        for (mask, below, count, v_min, v_max, rs), idx, counts in zip(large, idxs, hists):
+            cum = below + np.cumsum(counts)
+            rank_bins = np.searchsorted(cum, rs, side='right')
+            for b in np.unique(rank_bins):
+                subsets.append((mask & (idx == b), int(cum[b] - counts[b]), int(counts[b]),
+                                rs[rank_bins == b]))
+        ranges = dask.compute(*[(da.nanmin(da.where(sub, a, np.nan)),
+                                 da.nanmax(da.where(sub, a, np.nan))) for sub, _, _, _ in subsets])
+        groups = [(sub, below, count, v_min, v_max, rs)
+                  for (sub, below, count, rs), (v_min, v_max) in zip(subsets, ranges)]
+
+    lo = np.array([order_stats[r] for r in np.floor(pos).astype(np.int64)])
+    hi = np.array([order_stats[r] for r in np.ceil(pos).astype(np.int64)])
+    return lo + (hi - lo) * (pos - np.floor(pos))
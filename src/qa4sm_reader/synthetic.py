@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic (but valid) QA4SM results files, e.g. to benchmark reading and
+plotting at production scale. Files are written one variable at a time, so
+that files with millions of locations can be created with little memory.
+"""
+from qa4sm_reader import globals
+import xarray as xr
+import numpy as np
+import itertools
+import os
+
+# short name: (short version, pretty name, pretty version, variable)
+_datasets = {
+    'SMAP': ('SMAP_V6_PM', 'SMAP level 3', 'v6 PM/ascending', 'soil_moisture'),
+    'C3S': ('C3S_V201912', 'C3S', 'v201912', 'sm'),
+    'ASCAT': ('ASCAT_H113', 'H-SAF ASCAT SSM CDR', 'H113', 'sm'),
+    'SMOS': ('SMOS_105_ASC', 'SMOS IC', 'V.105 Ascending', 'Soil_Moisture'),
+    'GLDAS': ('GLDAS_NOAH025_3H_2_1', 'GLDAS', 'NOAH025 3H.2.1', 'SoilMoi0_10cm_inst'),
+    'ERA5_LAND': ('ERA5_LAND_V20190904', 'ERA5-Land', 'v20190904', 'swvl1'),
+    'ISMN': ('ISMN_V20191211', 'ISMN', '20191211 global', 'soil moisture'),
+}
+_fill_value = -99999
+
+def _metric_values(metric:str, n:int, rng:np.random.Generator) -> np.array:
+    """ Random values of a metric, in a plausible range """
+    if metric in ['R', 'rho', 'tau']:
+        values = np.clip(rng.normal(0.6, 0.2, n), -1, 1)
+    elif metric in ['p_R', 'p_rho', 'p_tau']:
+        values = rng.random(n) ** 4
+    elif metric in ['RMSD', 'urmsd', 'err_std']:
+        values = np.abs(rng.normal(0.05, 0.02, n))
+    elif metric in ['mse', 'mse_corr', 'mse_bias', 'mse_var']:
+        values = rng.normal(0.05, 0.02, n) ** 2
+    elif metric == 'RSS':
+        values = rng.gamma(2., 0.5, n)
+    elif metric == 'BIAS':
+        values = rng.normal(0., 0.05, n)
+    elif metric == 'snr':
+        values = rng.normal(5., 5., n)
+    elif metric == 'beta':
+        values = rng.normal(1., 0.2, n)
+    else:
+        raise ValueError("No synthetic values for the metric '{}'.".format(metric))
+    return values.astype(np.float32)
+
+def _locations(n_points:int, scattered:bool, grid_stepsize:float,
+               rng:np.random.Generator) -> (np.array, np.array):
+    """
+    Locations of the points: cells of a regular global grid (in random order
+    of rows, as in the results of gridded datasets) or random points in
+    (roughly) the area of the US and Europe, like ISMN stations.
+    """
+    if scattered:
+        lons = np.where(rng.random(n_points) < 0.5, rng.uniform(-125, -70, n_points),
+                        rng.uniform(-10, 30, n_points))
+        lats = np.where(lons < -60, rng.uniform(25, 50, n_points), rng.uniform(35, 60, n_points))
+        return lats, lons
+    grid_lons = np.arange(-180 + grid_stepsize / 2, 180, grid_stepsize)
+    grid_lats = np.arange(-90 + grid_stepsize / 2, 90, grid_stepsize)
+    n_cells = len(grid_lons) * len(grid_lats)
+    if n_points > n_cells:
+        raise ValueError("The grid with a stepsize of {} has only {} cells, {} points requested."
+                         .format(grid_stepsize, n_cells, n_points))
+    cells = np.sort(rng.choice(n_cells, n_points, replace=False))
+    return grid_lats[cells // len(grid_lons)], grid_lons[cells % len(grid_lons)]
+
+def _varnames(names:list, tc:bool) -> list:
+    """
+    Names of all variables of a results file with these datasets (the
+    reference first), as (metric, varname) pairs.
+    """
+    ref_ds = '0-{}'.format(names[0])
+    others = ['{}-{}'.format(i, name) for i, name in enumerate(names) if i > 0]
+    varnames = [('n_obs', 'n_obs')]
+    for other in others:
+        for metric in globals.metric_groups[2]:
+            varnames.append((metric, '{}_between_{}_and_{}'.format(metric, ref_ds, other)))
+    if tc:
+        for sat0, sat1 in itertools.combinations(others, 2):
+            for metric in globals.metric_groups[3]:
+                for mds in [sat0, sat1]:
+                    varnames.append((metric, '{}_{}_between_{}_and_{}_and_{}'.format(
+                        metric, mds, ref_ds, sat0, sat1)))
+    return varnames
+
+def _attrs(names:list, scattered:bool, grid_stepsize:float) -> dict:
+    """ Global attributes of a results file, the reference is dc 0 """
+    attrs = {'date_created': '2021-01-01 00:00:00',
+             'qa4sm_version': '1.3.1',
+             'val_interval_from': '1978-01-01 00:00',
+             'val_interval_to': '2020-12-31 23:59'}
+    for dc, name in enumerate(names):
+        version, pretty_name, pretty_version, var = _datasets[name]
+        attrs.update({globals._ds_short_name_attr.format(dc): name,
+                      globals._version_short_name_attr.format(dc): version,
+                      'val_dc_variable{:d}'.format(dc): '{}_{}'.format(name, var),
+                      globals._ds_pretty_name_attr.format(dc): pretty_name,
+                      globals._version_pretty_name_attr.format(dc): pretty_version,
+                      'val_dc_variable_pretty_name{:d}'.format(dc): var,
+                      'val_dc_filters{:d}'.format(dc): 'Variable in valid geophysical range'})
+    attrs.update({globals._ref_ds_attr: globals._ds_short_name_attr.format(0),
+                  'val_scaling_ref': globals._ds_short_name_attr.format(0),
+                  'val_scaling_method': 'mean_std',
+                  'val_anomalies': 'none'})
+    if not scattered:
+        attrs['val_dc_dataset0_grid_stepsize'] = grid_stepsize
+    return attrs
+
+def create_results(out_dir:str, n_points:int=1000, n_datasets:int=2, tc:bool=False,
+                   scattered:bool=False, grid_stepsize:float=None, nan_fraction:float=0.05,
+                   compress:bool=True, seed:int=0) -> str:
+    """
+    Create a synthetic QA4SM results file, with all common, paired and
+    (optionally) triple metrics, named after the datasets as QA4SM does.
+
+    Parameters
+    ----------
+    out_dir : str
+        Directory to create the file in.
+    n_points : int, optional (default: 1000)
+        Number of locations.
+    n_datasets : int, optional (default: 2)
+        Number of datasets, including the reference, between 2 and 6.
+    tc : bool, optional (default: False)
+        Add the triple collocation metrics (for each pair of non-reference
+        datasets), requires at least 3 datasets.
+    scattered : bool, optional (default: False)
+        Use ISMN as the reference, with locations scattered over the US and
+        Europe, instead of the cells of a regular grid.
+    grid_stepsize : float or None, optional (default: None)
+        Stepsize of the grid in degree, if None, the coarsest of 1, 0.5,
+        0.25, 0.1 and 0.05 degree with at least 10 cells per location (or
+        0.05 degree for more locations).
+    nan_fraction : float, optional (default: 0.05)
+        Fraction of missing values in each metric variable.
+    compress : bool, optional (default: True)
+        Compress the variables (zlib, level 6) as QA4SM does.
+    seed : int, optional (default: 0)
+        Seed of the random values, the same settings and seed create the same
+        file.
+
+    Returns
+    -------
+    filepath : str
+        Path of the created file.
+    """
+    others = [name for name in _datasets.keys() if name not in ['ISMN', 'SMAP']]
+    if not 2 <= n_datasets <= len(others) + 1:
+        raise ValueError("The number of datasets must be between 2 and {}.".format(len(others) + 1))
+    if tc and n_datasets < 3:
+        raise ValueError("Triple collocation metrics require at least 3 datasets.")
+    if grid_stepsize is None:
+        grid_stepsize = next((step for step in [1., 0.5, 0.25, 0.1, 0.05]
+                              if (360 / step) * (180 / step) >= 10 * n_points), 0.05)
+
+    rng = np.random.default_rng(seed)
+    names = ['ISMN' if scattered else 'SMAP'] + others[:n_datasets - 1]
+    fname = globals.ds_fn_sep.join(
+        globals.ds_fn_templ.format(i=dc, ds=name, var=_datasets[name][3])
+        for dc, name in enumerate(names)) + '.nc'
+    filepath = os.path.join(out_dir, fname)
+
+    lats, lons = _locations(n_points, scattered, grid_stepsize, rng)
+    lat, lon = globals.index_names
+    ds = xr.Dataset({globals.gpi_name: ('loc', np.arange(n_points, dtype=np.int32)),
+                     lon: ('loc', lons), lat: ('loc', lats)},
+                    attrs=_attrs(names, scattered, grid_stepsize))
+    ds.to_netcdf(filepath, mode='w')
+
+    for metric, varname in _varnames(names, tc):  # one variable at a time
+        if metric == 'n_obs':
+            values = rng.integers(50, 5000, n_points, dtype=np.int32)
+            encoding = {'_FillValue': np.int32(_fill_value)}
+        else:
+            values = _metric_values(metric, n_points, rng)
+            values[rng.random(n_points) < nan_fraction] = np.nan
+            encoding = {'_FillValue': np.float32(_fill_value)}
+        if compress:
+            encoding.update(zlib=True, complevel=6)
+        xr.Dataset({varname: ('loc', values)}).to_netcdf(
+            filepath, mode='a', encoding={varname: encoding})
+
+    return filepath
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Export of metric variables as Web-Mercator XYZ tile pyramids (PNG), e.g. for
+slippy map layers. The values are rasterized once on the grid of the image
+and averaged into coarser cells for each zoom level, where a tile pixel is
+larger than a cell. Tiles are sampled from the raster of their zoom level
+(nearest neighbour) and rendered in a process pool. Tiles without values are
+not written.
+"""
+from qa4sm_reader import globals
+from qa4sm_reader.plot_utils import geotraj_to_geo2d, get_value_range
+from qa4sm_reader.stats import quantile_name
+from qa4sm_reader.timing import stage
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib.image as mimage
+import matplotlib.colors as mcolors
+import matplotlib.pyplot as plt
+import numpy as np
+import warnings
+import os
+
+_worker_layer = None  # the layer that tiles are rendered from in each worker process
+
+def lonlat2tile(lon, lat, zoom) -> (np.array, np.array):
+    """
+    XYZ tile (x, y) that contains the location at zoom level zoom. Latitudes
+    are clipped to the extent of Web-Mercator (+- globals.tile_max_lat).
+    """
+    n = 2 ** zoom
+    lat = np.radians(np.clip(lat, -globals.tile_max_lat, globals.tile_max_lat))
+    x = (np.asarray(lon, dtype=np.float64) + 180.) / 360. * n
+    y = (1. - np.log(np.tan(lat) + 1. / np.cos(lat)) / np.pi) / 2. * n
+    return (np.clip(np.floor(x), 0, n - 1).astype(int),
+            np.clip(np.floor(y), 0, n - 1).astype(int))
+
+def tile_pixels(x, y, zoom, tile_size=globals.tile_size) -> (np.array, np.array):
+    """
+    Longitudes of the pixel columns and latitudes of the pixel rows (at the
+    pixel centers, rows from north to south) of the XYZ tile (x, y).
+    """
+    n = 2 ** zoom
+    pos = (np.arange(tile_size) + 0.5) / tile_size
+    lon = (x + pos) / n * 360. - 180.
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1. - 2. * (y + pos) / n))))
+    return lon, lat
+
+def tile_range(extent, zoom) -> (range, range):
+    """ Tile columns and rows at zoom level zoom that cover extent (x_min, x_max, y_min, y_max) """
+    xs, ys = lonlat2tile(np.array([extent[0], extent[1]]),
+                         np.array([extent[2], extent[3]]), zoom)
+    return range(xs[0], xs[1] + 1), range(ys[1], ys[0] + 1)  # rows count from the north
+
+def block_mean(zz, fy, fx) -> np.array:
+    """
+    Mean of the values (ignoring nans) in blocks of fy rows and fx columns,
+    starting at the first row and column. The raster is padded with nans to
+    a multiple of the block size.
+    """
+    n_rows, n_cols = zz.shape
+    n_by, n_bx = int(np.ceil(n_rows / fy)), int(np.ceil(n_cols / fx))
+    padded = np.full((n_by * fy, n_bx * fx), np.nan, dtype=np.float64)
+    padded[:n_rows, :n_cols] = zz
+    with warnings.catch_warnings():  # blocks without values stay nan
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanmean(padded.reshape(n_by, fy, n_bx, fx), axis=(1, 3))
+
+class TileLayer(object):
+    """
+    A raster of the values of a variable and its colormap, that XYZ tiles
+    are sampled from. For each zoom level, the raster is averaged into cells
+    that are at least as large as a tile pixel, so that no values are missed
+    by the pixels of coarse zoom levels.
+    """
+    def __init__(self, zz, extent, origin, cmap, value_range):
+        """
+        Parameters
+        ----------
+        zz : np.array
+            Raster of the values (nan or masked where there are none).
+        extent : tuple
+            (x_min, x_max, y_min, y_max) of the outer edges of the raster.
+        origin : str
+            'lower' if the first row of zz is in the south, 'upper' else.
+        cmap : matplotlib.colors.Colormap or str
+            Colormap of the values.
+        value_range : tuple
+            (v_min, v_max) of the colormap.
+        """
+        self.zz = np.ma.filled(np.ma.asarray(zz, dtype=np.float64), np.nan)
+        self.extent = tuple(float(e) for e in extent)
+        self.origin = origin
+        self.cmap = plt.cm.get_cmap(cmap) if isinstance(cmap, str) else cmap
+        self.norm = mcolors.Normalize(vmin=value_range[0], vmax=value_range[1])
+        self._levels = {}  # (fy, fx) -> raster and extent averaged in blocks of fy x fx cells
+
+    def _factors(self, zoom, tile_size) -> (int, int):
+        """
+        Number of rows and columns of the raster that are averaged for zoom,
+        so that the cells are at least as large as a tile pixel.
+        """
+        n_rows, n_cols = self.zz.shape
+        x_min, x_max, y_min, y_max = self.extent
+        pixel = 360. / (2 ** zoom * tile_size)  # width of a pixel in degree
+        # pixels are pixel * cos(lat) high, they are highest next to the equator
+        lat_min = 0. if y_min <= 0. <= y_max else min(abs(y_min), abs(y_max))
+        lat_min = min(lat_min, globals.tile_max_lat)
+        fx = int(np.ceil(pixel / ((x_max - x_min) / n_cols)))
+        fy = int(np.ceil(pixel * np.cos(np.radians(lat_min)) / ((y_max - y_min) / n_rows)))
+        return max(fy, 1), max(fx, 1)
+
+    def raster(self, zoom, tile_size=globals.tile_size) -> (np.array, tuple):
+        """
+        The raster (and its extent) that tiles of zoom are sampled from. It is
+        computed once for each zoom level with a different cell size.
+        """
+        fy, fx = self._factors(zoom, tile_size)
+        if (fy, fx) == (1, 1):
+            return self.zz, self.extent
+        if (fy, fx) not in self._levels:
+            n_rows, n_cols = self.zz.shape
+            x_min, x_max, y_min, y_max = self.extent
+            dx, dy = (x_max - x_min) / n_cols, (y_max - y_min) / n_rows
+            zz = block_mean(self.zz, fy, fx)
+            # the padded cells extend the raster to the east and away from the origin
+            x_max = x_min + zz.shape[1] * fx * dx
+            if self.origin == 'upper':
+                y_min = y_max - zz.shape[0] * fy * dy
+            else:
+                y_max = y_min + zz.shape[0] * fy * dy
+            self._levels[(fy, fx)] = (zz, (x_min, x_max, y_min, y_max))
+        return self._levels[(fy, fx)]
+
+    def prepare(self, zooms, tile_size=globals.tile_size):
+        """ Compute the rasters of the zoom levels in advance, e.g. before they are sent to workers """
+        for zoom in zooms:
+            self.raster(zoom, tile_size)
+
+    def _index(self, lon, lat, zz, extent) -> (np.array, np.array):
+        """ Columns and rows of the raster zz at lon and lat, -1 outside of the raster """
+        n_rows, n_cols = zz.shape
+        x_min, x_max, y_min, y_max = extent
+        cols = np.floor((lon - x_min) / (x_max - x_min) * n_cols).astype(int)
+        if self.origin == 'upper':
+            rows = np.floor((y_max - lat) / (y_max - y_min) * n_rows).astype(int)
+        else:
+            rows = np.floor((lat - y_min) / (y_max - y_min) * n_rows).astype(int)
+        cols[(cols < 0) | (cols >= n_cols)] = -1
+        rows[(rows < 0) | (rows >= n_rows)] = -1
+        return cols, rows
+
+    def render(self, x, y, zoom, tile_size=globals.tile_size) -> np.array or None:
+        """
+        Render the XYZ tile (x, y) at zoom level zoom.
+
+        Returns
+        -------
+        rgba : np.array or None
+            (tile_size, tile_size, 4) uint8 image, transparent where there
+            are no values. None if the tile contains no values.
+        """
+        zz, extent = self.raster(zoom, tile_size)
+        lon, lat = tile_pixels(x, y, zoom, tile_size)
+        cols, rows = self._index(lon, lat, zz, extent)
+        if (cols < 0).all() or (rows < 0).all():
+            return None
+        values = zz[rows[:, np.newaxis], cols[np.newaxis, :]]
+        empty = np.isnan(values) | (rows < 0)[:, np.newaxis] | (cols < 0)[np.newaxis, :]
+        if empty.all():
+            return None
+        rgba = self.cmap(self.norm(np.where(empty, 0., values)), bytes=True)
+        rgba[empty] = 0
+        return rgba
+
+    def write_tiles(self, tiles, out_dir, tile_size=globals.tile_size) -> list:
+        """
+        Render and write tiles ((zoom, x, y) each) to out_dir/zoom/x/y.png,
+        empty tiles are skipped. Returns the written files.
+        """
+        fnames = []
+        for zoom, x, y in tiles:
+            rgba = self.render(x, y, zoom, tile_size)
+            if rgba is None:
+                continue
+            tile_dir = os.path.join(out_dir, str(zoom), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            fname = os.path.join(tile_dir, '{}.png'.format(y))
+            mimage.imsave(fname, rgba, format='png')
+            fnames.append(fname)
+        return fnames
+
+def _init_worker(layer):
+    """ Receive the layer once per worker process """
+    global _worker_layer
+    _worker_layer = layer
+
+def _write_tiles(tiles, out_dir, tile_size) -> list:
+    """ Write tiles with the layer of the worker process """
+    return _worker_layer.write_tiles(tiles, out_dir, tile_size)
+
+def get_tile_layer(img, varname, value_range=None, colormap=None) -> TileLayer:
+    """
+    Rasterize a variable of an image for tile export.
+
+    Parameters
+    ----------
+    img : QA4SMImg
+        The results.
+    varname : str
+        Name of a variable in the image.
+    value_range : tuple, optional (default: None)
+        (v_min, v_max) of the colormap. If None, the range of the maps is used
+        (see plot_utils.get_value_range).
+    colormap : matplotlib.colors.Colormap or str, optional (default: None)
+        If None, the colormap of the metric in globals._colormaps.
+
+    Returns
+    -------
+    layer : TileLayer
+    """
+    metric = list(img.var_meta(varname).keys())[0]
+    df = img._ds2df([varname])
+    if value_range is None:
+        stats = img.metric_stats(metric).loc[varname]
+        value_range = get_value_range(None, metric, quantile_values=[
+            stats[quantile_name(q)] for q in globals.stats_quantiles])
+    if colormap is None:
+        colormap = globals._colormaps[metric]
+    grid = None if img.ref_dataset in globals.scattered_datasets else img.grid
+    zz, extent, origin = geotraj_to_geo2d(df, varname, grid_stepsize=img.ref_dataset_grid_stepsize,
+                                          grid=grid)
+    return TileLayer(zz, extent, origin, colormap, value_range)
+
+def export_tiles(img, varname, out_dir, zooms=globals.tile_zooms, tile_size=globals.tile_size,
+                 value_range=None, colormap=None, workers=None) -> list:
+    """
+    Export a variable as Web-Mercator XYZ PNG tile pyramid to
+    out_dir/{z}/{x}/{y}.png. Only tiles that contain values are written.
+
+    Parameters
+    ----------
+    img : QA4SMImg
+        The results.
+    varname : str
+        Name of a variable in the image.
+    out_dir : str
+        Root directory of the pyramid.
+    zooms : iterable, optional (default: globals.tile_zooms)
+        Zoom levels to export.
+    tile_size : int, optional (default: globals.tile_size)
+        Width and height of the tiles in pixels.
+    value_range : tuple, optional (default: None)
+        (v_min, v_max) of the colormap, see get_tile_layer.
+    colormap : matplotlib.colors.Colormap or str, optional (default: None)
+        If None, the colormap of the metric in globals._colormaps.
+    workers : int or None, optional (default: None)
+        Number of processes to render the tiles in. If None, the number of
+        cores is used, if 1, the tiles are rendered in this process.
+
+    Returns
+    -------
+    fnames : list
+        The written tiles, ordered by zoom, x and y.
+    """
+    with stage('tile_layer', var=varname):
+        layer = get_tile_layer(img, varname, value_range, colormap)
+        layer.prepare(zooms, tile_size)  # once, not in each worker
+
+    # one job per column of tiles that overlap the values
+    jobs = []
+    for zoom in zooms:
+        xs, ys = tile_range(layer.extent, zoom)
+        for x in xs:
+            jobs.append([(zoom, x, y) for y in ys])
+
+    with stage('tiles', var=varname, n_jobs=len(jobs)):
+        if workers == 1:
+            results = [layer.write_tiles(tiles, out_dir, tile_size) for tiles in jobs]
+        else:
+            n = len(jobs)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(layer,)) as pool:
+                results = list(pool.map(_write_tiles, jobs, [out_dir] * n, [tile_size] * n,
+                                        chunksize=max(1, n // (4 * (workers or os.cpu_count() or 1)))))
+    return [fname for fnames in results for fname in fnames]
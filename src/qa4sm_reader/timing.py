@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Stage level instrumentation (wall time, cpu time and peak memory) of the
+loading and plotting procedures, e.g. to find the slow parts of plot_all.
+"""
+from qa4sm_reader import globals
+from contextlib import contextmanager
+from collections import OrderedDict
+import os
+import sys
+import json
+import time
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+_active = None  # the timer that stages are currently recorded to
+
+def peak_rss() -> int or None:
+    """ Peak resident set size of the process in bytes, None if it is not available """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':  # kilobytes on linux, bytes on mac
+        rss *= 1024
+    return int(rss)
+
+def active_timer() -> 'StageTimer' or None:
+    """ The timer that stages are recorded to, None if timing is off """
+    return _active
+
+def trace_from_env():
+    """
+    The report path from the environment variable globals.trace_env.
+    None if it is not set (or empty / '0'), True if it is '1' (i.e. the
+    report is written next to the outputs), else the path.
+    """
+    value = os.environ.get(globals.trace_env, '')
+    if value in ['', '0']:
+        return None
+    elif value == '1':
+        return True
+    else:
+        return value
+
+@contextmanager
+def stage(name, **info):
+    """
+    Record a stage with the active timer. Does nothing, if no timer is active,
+    so that it can be used in the plotting functions at no cost.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, e.g. 'savefig'.
+    **info : dict, optional
+        Additional (json serializable) information stored with the record,
+        e.g. the variable that is plotted.
+    """
+    timer = _active
+    if timer is None:
+        yield
+    else:
+        with timer.stage(name, **info):
+            yield
+
+class StageTimer(object):
+    """
+    Records wall time, cpu time and peak memory of (nested) stages. Use it
+    as a context manager to activate it, then all stages that are entered
+    (also in the plotting functions) are recorded:
+
+        with StageTimer() as timer:
+            plotter.mapplot('R')
+        timer.to_json('timing.json')
+    """
+    def __init__(self, callback=None, start=None):
+        """
+        Parameters
+        ----------
+        callback : callable, optional (default: None)
+            Function that is called with every record (a dict), when the
+            stage is finished, e.g. to log the stages while they are running.
+        start : float, optional (default: None)
+            Time (seconds since the epoch) that the start of the stages is
+            relative to, e.g. the start of the timer of the parent process.
+            If None, the time of creation is used.
+        """
+        self.callback = callback
+        self.records = []
+        self._path = []
+        self._previous = []
+        self.start = time.time() if start is None else start
+
+    def __enter__(self):
+        global _active
+        self._previous.append(_active)
+        _active = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _active
+        _active = self._previous.pop()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """ Record a stage, see qa4sm_reader.timing.stage """
+        self._path.append(name)
+        path = '/'.join(self._path)
+        rss_start = peak_rss()
+        start = time.time() - self.start
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall_end, cpu_end = time.perf_counter(), time.process_time()
+            rss_end = peak_rss()
+            self._path.pop()
+            record = OrderedDict([
+                ('stage', name),
+                ('path', path),
+                ('start', start),
+                ('wall', wall_end - wall_start),
+                ('cpu', cpu_end - cpu_start),
+                ('peak_rss', rss_end),
+                ('peak_rss_increase', None if rss_end is None else rss_end - rss_start)])
+            record.update(info)
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    def add_records(self, records, **info):
+        """
+        Add the records of another timer (e.g. of a worker process) below the
+        current stage.
+
+        Parameters
+        ----------
+        records : list
+            Records of the other timer.
+        **info : dict, optional
+            Additional information stored with each record, e.g. the worker.
+        """
+        for record in records:
+            record = OrderedDict(record)
+            record['path'] = '/'.join(self._path + [record['path']])
+            record.update(info)
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    def summary(self) -> OrderedDict:
+        """
+        Sum the records of stages with the same path.
+
+        Returns
+        -------
+        summary : OrderedDict
+            For each path (in order of first finish) the number of calls,
+            total wall and cpu time and the maximum peak rss.
+        """
+        summary = OrderedDict()
+        for record in self.records:
+            s = summary.setdefault(record['path'], OrderedDict(
+                [('calls', 0), ('wall', 0.), ('cpu', 0.), ('peak_rss', None)]))
+            s['calls'] += 1
+            s['wall'] += record['wall']
+            s['cpu'] += record['cpu']
+            if record['peak_rss'] is not None:
+                s['peak_rss'] = max(s['peak_rss'] or 0, record['peak_rss'])
+        return summary
+
+    def to_dict(self) -> dict:
+        """ The records and the summary, as written to the json report """
+        return {'total_wall': time.time() - self.start,
+                'summary': self.summary(),
+                'records': self.records}
+
+    def to_json(self, path):
+        """
+        Write the json report.
+
+        Parameters
+        ----------
+        path : str
+            Path to the report file, parent directories are created.
+        """
+        out_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(out_dir, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
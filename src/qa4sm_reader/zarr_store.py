@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Zarr stores of qa4sm results: detection of stores and conversion of netcdf
+results files into stores with chunks that can be read independently (and in
+parallel). Requires zarr.
+"""
+from qa4sm_reader import globals
+import xarray as xr
+import numpy as np
+import os
+
+_zarr_meta_files = ['.zgroup', '.zmetadata', 'zarr.json']  # zarr v2 and v3 group metadata
+
+def is_zarr(path:str) -> bool:
+    """
+    Check if a path is a zarr store (a directory with the extension .zarr or
+    with zarr group metadata).
+    """
+    if not os.path.isdir(path):
+        return False
+    if os.path.normpath(path).endswith('.zarr'):
+        return True
+    return any(os.path.isfile(os.path.join(path, f)) for f in _zarr_meta_files)
+
+def _chunk_shape(shape:tuple, itemsize:int, chunk_bytes:int) -> tuple:
+    """
+    Chunk shape for an array so that a chunk holds about chunk_bytes. The
+    elements are split evenly over the dimensions (square-ish tiles for grids,
+    long runs of locations for lists of locations).
+    """
+    if len(shape) == 0:
+        return ()
+    n_chunk = max(1, chunk_bytes // itemsize)
+    chunks, dims_left = [1] * len(shape), len(shape)
+    for i in np.argsort(shape, kind='stable'):  # fill the small dimensions first, split the rest
+        edge = max(1, int(round(n_chunk ** (1. / dims_left))))
+        chunks[i] = max(1, min(shape[i], edge))
+        n_chunk = max(1, n_chunk // chunks[i])
+        dims_left -= 1
+    return tuple(chunks)
+
+def _encoding(var:xr.Variable, chunk_bytes:int) -> dict:
+    """ Encoding of a variable in the store, keeps the netcdf packing and fill values """
+    keep = ['dtype', '_FillValue', 'scale_factor', 'add_offset', 'units', 'calendar']
+    encoding = {k: v for k, v in var.encoding.items() if k in keep}
+    encoding['chunks'] = _chunk_shape(var.shape, np.dtype(encoding.get('dtype', var.dtype)).itemsize,
+                                      chunk_bytes)
+    return encoding
+
+def nc_to_zarr(filepath:str, zarr_path:str=None, chunk_bytes:int=globals.zarr_chunk_bytes,
+               overwrite:bool=False) -> str:
+    """
+    Convert a qa4sm netcdf results file into a zarr store. Each variable is
+    chunked so that a chunk holds about chunk_bytes, the metadata of the store
+    is consolidated, so that it is opened with a single read.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the netcdf results file.
+    zarr_path : str or None, optional (default: None)
+        Path of the store to create, if None is passed, the store is created
+        next to the file, with the extension .zarr instead of .nc
+    chunk_bytes : int, optional (default: from globals)
+        Target size of a chunk in bytes (uncompressed).
+    overwrite : bool, optional (default: False)
+        Replace an existing store, otherwise a FileExistsError is raised.
+
+    Returns
+    -------
+    zarr_path : str
+        Path of the created store.
+    """
+    if zarr_path is None:
+        zarr_path = os.path.splitext(filepath)[0] + '.zarr'
+    if os.path.exists(zarr_path) and not overwrite:
+        raise FileExistsError("The zarr store '{}' already exists.".format(zarr_path))
+
+    with xr.open_dataset(filepath) as ds:
+        encoding = {name: _encoding(var, chunk_bytes) for name, var in ds.variables.items()}
+        ds = ds.copy()
+        for var in ds.variables.values():
+            var.encoding = {}
+        ds.to_zarr(zarr_path, mode='w', encoding=encoding, consolidated=True)
+
+    return zarr_path
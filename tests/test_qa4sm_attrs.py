@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
-from qa4sm_reader.handlers import QA4SMAttributes, QA4SMNamedAttributes, QA4SMMetricVariable
+from qa4sm_reader.handlers import QA4SMAttributes, QA4SMNamedAttributes, QA4SMMetricVariable, \
+    QA4SMDatasets
 import os
 import unittest
 import xarray as xr
@@ -68,6 +69,24 @@ class TestQA4SMAttributes(unittest.TestCase):
 
         return other_names
 
+    def test_shared_datasets(self):
+        attrs = test_attributes()
+        datasets = QA4SMDatasets(attrs)
+        assert datasets.ref_dc == 5
+        assert sorted(datasets.other_dcs.keys()) == [0, 1, 2, 3, 4]
+        shared = QA4SMAttributes(attrs, datasets)
+        assert shared.datasets is datasets
+        assert shared.get_all_names() == self.meta.get_all_names()
+        # returned names are copies, the table is not changed
+        shared.get_ref_names()['short_name'] = 'changed'
+        assert datasets.names(5)['short_name'] == 'ISMN'
+
+        var = QA4SMMetricVariable('R_between_6-ISMN_and_4-SMAP', attrs, datasets=datasets)
+        assert all(ds.datasets is datasets for ds in [var.ref_ds] + var.other_dss)
+        assert var.get_varmeta() is var.get_varmeta()
+        assert var.get_varmeta() == QA4SMMetricVariable('R_between_6-ISMN_and_4-SMAP',
+                                                        attrs).get_varmeta()
+
     def test_grid_stepsize(self):
         attrs = test_grid_stepsize()
         assert attrs['val_dc_dataset0_grid_stepsize'] == 0.35
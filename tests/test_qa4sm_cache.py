@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.cache import QA4SMCache
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+class TestQA4SMCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = QA4SMCache(os.path.join(self.cache_dir, 'cache'), max_size=10 ** 6)
+        self.file = os.path.join(self.cache_dir, 'results.nc')
+        with open(self.file, 'w') as f:
+            f.write('results')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.cache_dir)
+
+    def test_file_key(self):
+        key = QA4SMCache.file_key(self.file, extent=None)
+        assert key == QA4SMCache.file_key(self.file, extent=None)
+        assert key != QA4SMCache.file_key(self.file, extent=(0, 1, 0, 1))
+        with open(self.file, 'a') as f:
+            f.write(' changed')
+        assert key != QA4SMCache.file_key(self.file, extent=None)
+
+    def test_roundtrip(self):
+        key = QA4SMCache.file_key(self.file)
+        assert self.cache.read_meta(key) is None
+        assert self.cache.open_arrays(key) is None
+
+        self.cache.write_arrays(key, iter([('a', np.arange(5)),
+                                           ('b.values', np.array([1.5, np.nan], dtype=np.float32))]))
+        self.cache.write_meta(key, {'vars': {'R': ['a']}})
+
+        assert self.cache.read_meta(key) == {'vars': {'R': ['a']}}
+        arrays = self.cache.open_arrays(key)
+        assert np.array_equal(arrays['a'], np.arange(5))
+        assert arrays['b.values'].dtype == np.float32
+
+        self.cache.clear()
+        assert self.cache.read_meta(key) is None
+
+    def test_evict_lru(self):
+        self.cache.max_size = 3 * 8000 + 1000
+        for key in ['first', 'second', 'third']:
+            self.cache.write_arrays(key, iter([('a', np.zeros(1000))]))
+            self.cache.write_meta(key, {})
+            time.sleep(0.05)
+        self.cache.read_meta('first')  # now the second entry is the oldest one
+
+        self.cache.write_arrays('fourth', iter([('a', np.zeros(1000))]))
+        self.cache.write_meta('fourth', {})
+
+        assert self.cache.read_meta('second') is None
+        for key in ['first', 'third', 'fourth']:
+            assert self.cache.read_meta(key) is not None
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.collection import QA4SMImgCollection
+from qa4sm_reader.img import QA4SMImg
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+
+class TestQA4SMImgCollection(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.testdir = os.path.join(os.path.dirname(__file__), 'test_data', 'tc')
+        self.coll = QA4SMImgCollection(self.testdir, workers=2)
+
+    def test_load(self):
+        assert len(self.coll) == 2
+        names = [name for name, _ in self.coll]
+        assert names == sorted(os.listdir(self.testdir))
+        for name, img in self.coll:
+            assert isinstance(img, QA4SMImg)
+            assert img.filepath == os.path.join(self.testdir, name)
+        assert 'snr' in self.coll.ls_metrics()
+        for _, img in self.coll:  # no values are sent back from the workers
+            assert img.lazy and img.df is None
+            assert all(Var._values is None for Var in img._vars.values())
+
+    def test_metadata(self):
+        meta = self.coll.metadata()
+        assert meta.index.name == 'file'
+        assert meta.loc['3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.nc', 'ref_dataset'] == 'ERA5_LAND'
+        assert meta.loc['3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.nc', 'datasets'] == \
+               ['ERA5_LAND', 'C3S', 'ASCAT']
+
+    def test_metric_df(self):
+        df = self.coll.metric_df('R')
+        assert df.index.names[0] == 'file'
+        for name, img in self.coll:
+            single = img.metric_df('R')
+            pd.testing.assert_frame_equal(df.loc[name][single.columns], single,
+                                          check_names=False)
+        snr = self.coll.metric_df('snr')
+        assert len(snr.index.get_level_values('file').unique()) == 2
+        with self.assertRaises(ValueError):
+            self.coll.metric_df('not_a_metric')
+
+    def test_lazy(self):
+        lazy = QA4SMImgCollection(os.path.join(self.testdir, '3-ERA5*.nc'), lazy=True)
+        assert len(lazy) == 1
+        pd.testing.assert_frame_equal(lazy.metric_df('R'), self.coll.metric_df('R').loc[
+            ['3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.nc']].dropna(axis=1, how='all'))
+
+    def test_cache(self):
+        cache_dir = os.path.join(tempfile.mkdtemp(), 'cache')  # created by the workers
+        try:
+            for lazy in [False, True]:
+                for _ in range(2):  # first stored, then loaded from the cache in the workers
+                    coll = QA4SMImgCollection(self.testdir, workers=2, cache=cache_dir, lazy=lazy)
+                    assert len(coll) == 2
+                    pd.testing.assert_frame_equal(coll.metric_df('R'), self.coll.metric_df('R'))
+        finally:
+            shutil.rmtree(os.path.dirname(cache_dir))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.img import QA4SMImg
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+try:
+    import pyarrow
+    from qa4sm_reader.export import read_arrow, read_parquet, read_meta
+except ImportError:
+    pyarrow = None
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestQA4SMExport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.testfile_path = os.path.join(os.path.dirname(__file__), 'test_data', 'tc',
+                                          '3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.nc')
+        self.img = QA4SMImg(self.testfile_path)
+        self.outdir = tempfile.mkdtemp()
+        self.regions = {'west': (-160, -157, 15, 25), 'east': (-157, -150, 15, 25)}
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.outdir)
+
+    def test_arrow(self):
+        path = os.path.join(self.outdir, 'results.arrow')
+        self.img.to_arrow(path, metrics=['R', 'snr'])
+        table = read_arrow(path)
+        meta, var_meta = read_meta(table)
+        assert meta['filename'] == self.img.filename
+        assert meta['ref_dataset']['short_name'] == 'ERA5_LAND'
+        assert sorted(var_meta.keys()) == sorted(
+            [Var.varname for Var in list(self.img.double['R']) + list(self.img.triple['snr'])])
+        assert var_meta['R_between_3-ERA5_LAND_and_1-C3S']['datasets'][0][1]['short_name'] == 'C3S'
+
+        df = table.to_pandas().set_index(self.img.index_names)
+        for var in var_meta.keys():
+            expected = self.img._ds2df([var])[var]
+            np.testing.assert_array_equal(df[var].dropna().values, expected.values)
+
+    def test_parquet_regions(self):
+        path = os.path.join(self.outdir, 'results.parquet')
+        self.img.to_parquet(path, regions=self.regions)
+        table = read_parquet(path)
+        meta, _ = read_meta(table)
+        assert [name for name, _ in meta['regions']] == ['west', 'east']
+        assert table.num_rows == self.img.ds.sizes['dim']
+
+        east = read_parquet(path, regions=['east'], columns=['lon', 'n_obs'])
+        assert east.num_rows == len(self.img.query_bbox(-157, -150, 15, 25)) - \
+               len(np.intersect1d(self.img.query_bbox(-157, -150, 15, 25),
+                                  self.img.query_bbox(*self.regions['west'])))
+        assert east.column_names == ['lon', 'n_obs']
+        assert all(lon >= -157 for lon in east.column('lon').to_pylist())
+
+        arrow_path = os.path.join(self.outdir, 'results.arrow')
+        self.img.to_arrow(arrow_path, regions=self.regions)
+        assert read_arrow(arrow_path, regions=['east']).equals(
+            read_parquet(path, regions=['east']))
+
+if __name__ == '__main__':
+    unittest.main()
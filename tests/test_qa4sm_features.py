@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader import features
+from qa4sm_reader import globals
+import unittest
+import cartopy.crs as ccrs
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        features.clear_feature_cache()
+        self.extent = (10., 20., 40., 50.)
+
+    def tearDown(self) -> None:
+        features.clear_feature_cache()
+
+    def test_load_once(self):
+        geoms = features.load_geometries('physical', 'coastline', '110m')
+        assert len(geoms) > 0
+        assert features.load_geometries('physical', 'coastline', '110m') is geoms
+
+    def test_clipped(self):
+        clipped = features.clipped_geometries('physical', 'land', '110m', self.extent)
+        assert features.clipped_geometries('physical', 'land', '110m', self.extent) is clipped
+        assert 0 < len(clipped) < len(features.load_geometries('physical', 'land', '110m'))
+        pad = globals.feature_clip_pad
+        for geom in clipped:
+            min_x, min_y, max_x, max_y = geom.bounds
+            assert min_x >= self.extent[0] - pad - 1e-6
+            assert max_x <= self.extent[1] + pad + 1e-6
+            assert min_y >= self.extent[2] - pad - 1e-6
+            assert max_y <= self.extent[3] + pad + 1e-6
+
+    def test_projected_feature(self):
+        crs = ccrs.Mollweide()
+        feature = features.get_feature('physical', 'coastline', '110m', self.extent, crs,
+                                       edgecolor='black', facecolor='none')
+        assert feature.crs == crs
+        geoms = list(feature.geometries())
+        assert len(geoms) > 0
+        assert max(abs(g.bounds[2]) for g in geoms) > 1000  # in metres, not degree
+
+    def test_warm_and_clear(self):
+        features.warm_feature_cache('110m', extent=self.extent)
+        assert len(features._geometries) == len(features.map_features)
+        assert len(features._clipped) == len(features.map_features)
+        features.clear_feature_cache(resolution='50m')
+        assert len(features._geometries) == len(features.map_features)
+        features.clear_feature_cache(resolution='110m')
+        assert len(features._geometries) == 0
+        assert len(features._clipped) == 0
+
+if __name__ == '__main__':
+    unittest.main()
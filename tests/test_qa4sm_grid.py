@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.grid import GridDescriptor, infer_step, _get_grid
+from qa4sm_reader.plot_utils import oversample
+from qa4sm_reader.cache import QA4SMCache
+from qa4sm_reader import grid as grid_module
+import unittest
+import tempfile
+import shutil
+import warnings
+import numpy as np
+
+class TestGridInference(unittest.TestCase):
+
+    def setUp(self) -> None:
+        lon, lat = np.meshgrid(np.arange(-10., 10., 0.25) + 0.125, np.arange(35., 45., 0.25) + 0.125)
+        keep = np.random.RandomState(0).rand(lon.size) > 0.3  # gaps in the grid
+        self.lon, self.lat = lon.ravel()[keep], lat.ravel()[keep]
+
+    def test_infer_step(self):
+        assert infer_step(self.lon) == 0.25
+        assert infer_step(np.array([0., 0.5, 1.25, 2.])) == 0.25  # only multiples of the step
+        assert infer_step(np.array([1., 1., 1.])) is None
+        assert infer_step(np.array([0., 1., 1.13, 3.7])) is None  # irregular
+
+    def test_noise(self):
+        noise = np.random.RandomState(1).uniform(-1e-6, 1e-6, self.lon.size)
+        lon = (self.lon + noise).astype(np.float32)
+        assert infer_step(lon) == 0.25
+        a_min, a_max, da, len_a = _get_grid(lon)
+        assert da == 0.25
+        assert len_a == 80
+
+        grid = GridDescriptor(lon, self.lat)
+        assert not grid.binned
+        assert grid.shape == (40, 80)
+        zz = grid.to_raster(np.arange(lon.size, dtype=float))
+        assert np.count_nonzero(~np.isnan(zz)) == lon.size  # no locations share a cell
+
+    def test_irregular(self):
+        rs = np.random.RandomState(2)
+        lon, lat = rs.uniform(-10, 10, 1000), rs.uniform(35, 45, 1000)
+        grid = GridDescriptor(lon, lat, max_bytes=80 * 1024)
+        assert grid.binned
+        assert grid.shape[0] * grid.shape[1] * 8 <= 80 * 1024
+        zz = grid.to_raster(np.ones(1000))
+        assert np.nanmin(zz) == np.nanmax(zz) == 1.  # means of the cells
+
+    def test_memory_guard(self):
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            grid = GridDescriptor(self.lon, self.lat, max_bytes=8 * 200)
+            assert len(w) == 1
+        assert grid.binned
+        assert grid.shape[0] * grid.shape[1] <= 200
+        zz = grid.to_raster(np.ones(self.lon.size))
+        assert np.nansum(~np.isnan(zz)) > 0
+        assert grid.data_extent[0] <= self.lon.min() and grid.data_extent[1] >= self.lon.max()
+        assert grid.data_extent[2] <= self.lat.min() and grid.data_extent[3] >= self.lat.max()
+
+class TestOversampleLut(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rs = np.random.RandomState(3)
+        self.lon, self.lat = rs.uniform(-10, 10, 500), rs.uniform(35, 45, 500)
+        self.values = rs.rand(500)
+        self.cache_dir = tempfile.mkdtemp()
+        grid_module._luts.clear()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.cache_dir)
+        grid_module._luts.clear()
+
+    def test_same_as_oversample(self):
+        grid = GridDescriptor(self.lon, self.lat, grid_stepsize=0.5)
+        dx, dy = grid.step
+        expected, _ = oversample(self.lon, self.lat, self.values, grid.data_extent, dx, dy)
+        zz = grid.oversample(self.values)
+        np.testing.assert_array_equal(zz.mask, expected.mask)
+        np.testing.assert_array_equal(zz.compressed(), expected.compressed())
+        # values of a subset of the locations, in a different order
+        order = np.arange(499, 99, -1)
+        zz_sub = grid.oversample(self.values[order], self.lon[order], self.lat[order])
+        assert zz_sub.shape == zz.shape
+        assert zz_sub.count() <= zz.count()
+
+    def test_cached(self):
+        cache = QA4SMCache(self.cache_dir)
+        grid = GridDescriptor(self.lon, self.lat, grid_stepsize=0.5, lut_cache=cache)
+        lut = grid.nn_lut()
+        assert grid.nn_lut() is lut
+        assert cache.read_meta(grid.lut_key()) is not None
+
+        grid_module._luts.clear()  # e.g. another process
+        other = GridDescriptor(self.lon, self.lat, grid_stepsize=0.5, lut_cache=cache)
+        np.testing.assert_array_equal(other.nn_lut()[0], lut[0])
+        assert other.nn_lut()[1] == lut[1]
+
+        shifted = GridDescriptor(self.lon + 1., self.lat, grid_stepsize=0.5, lut_cache=cache)
+        assert shifted.lut_key() != grid.lut_key()
+
+if __name__ == '__main__':
+    unittest.main()
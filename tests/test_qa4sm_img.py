@@ -4,8 +4,16 @@ from qa4sm_reader.img import QA4SMImg
 import os
 import numpy as np
 import unittest
+import tempfile
+import pickle
+import shutil
 from qa4sm_reader import globals
 
+try:
+    import dask
+except ImportError:
+    dask = None
+
 class TestQA4SMImgBasicIntercomp(unittest.TestCase):
 
     def setUp(self) -> None:
@@ -109,6 +117,151 @@ class TestQA4SMImgBasicIntercomp(unittest.TestCase):
 
 
 
+class TestQA4SMImgTCIntercomp(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.testfile = '3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.nc'
+        self.testfile_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                                          'test_data', 'tc', self.testfile)
+        self.img = QA4SMImg(self.testfile_path, ignore_empty=False)
+
+    def test_classify_vars(self):
+        metrics_vars = self.img._classify_vars(['R', 'snr', 'n_obs'])
+        assert sorted(metrics_vars.keys()) == ['R', 'n_obs', 'snr']
+        r_vars = [Var.varname for Var in metrics_vars['R']]
+        assert r_vars == sorted(r_vars)
+        assert r_vars == ['R_between_3-ERA5_LAND_and_1-C3S',
+                          'R_between_3-ERA5_LAND_and_2-ASCAT']
+        for Var in metrics_vars['snr']:
+            assert Var.g == 3
+
+    def test_load_subset(self):
+        img = QA4SMImg(self.testfile_path, metrics=['snr', 'R'])
+        assert list(img.double.keys()) == ['R']
+        assert list(img.triple.keys()) == ['snr']
+        assert img.common == {}
+        for metric in ['R', 'snr']:
+            assert [Var.varname for Var in img.find_group(metric)[metric]] == \
+                   [Var.varname for Var in self.img.find_group(metric)[metric]]
+
+    def test_lookup_index(self):
+        for metric, vars in self.img.triple.items():
+            assert self.img.find_group(metric) is self.img.triple
+            for Var in vars:
+                assert self.img.find_group(Var.varname) is self.img.triple
+                assert self.img.var_meta(Var.varname) == {metric: Var.get_varmeta()}
+        assert self.img.find_group('not_a_var') is None
+        varname = 'R_between_3-ERA5_LAND_and_1-C3S'
+        assert self.img.var_meta(varname)['R'] is self.img.var_meta(varname)['R']
+        assert self.img.ref_meta() == self.img.ref_meta()
+        sub = self.img.query_bbox(-157, -155, 19, 21, as_image=True)
+        assert sub.ls_vars(False).tolist() == self.img.ls_vars(False).tolist()
+        assert sub.find_group('snr') is sub.triple
+
+    def test_iter_variables(self):
+        img = QA4SMImg(self.testfile_path, lazy=True)
+        visited = []
+        for Var, values, gpis in img.iter_variables(metrics=['R', 'snr']):
+            visited.append(Var.varname)
+            assert Var._values is None  # values are not kept
+            expected = img._ds2df([Var.varname])[Var.varname]
+            np.testing.assert_array_equal(values, expected.values)
+            assert len(gpis) == len(values)
+        assert visited == list(self.img.ls_vars()['double'][:2]) + \
+               [v for v in self.img.ls_vars()['triple'] if v.startswith('snr')]
+
+        extent = (-156, -155.3, 19, 20)
+        cut = QA4SMImg(self.testfile_path, extent=extent)
+        for Var, values, gpis in img.iter_variables(metrics=['n_obs'], extent=extent):
+            np.testing.assert_array_equal(values, cut.metric_df('n_obs')['n_obs'].values)
+            assert all(gpis == cut.ds['gpi'].values)
+
+    def test_lazy_values(self):
+        img = QA4SMImg(self.testfile_path, ignore_empty=False, lazy=True)
+        assert img.df is None
+        assert img.ls_vars(False).tolist() == self.img.ls_vars(False).tolist()
+        for Var in img.find_group('R')['R']:
+            assert Var._values is None
+        assert img.metric_df('R').equals(self.img.metric_df('R'))
+        for Var in img.find_group('R')['R']:
+            assert Var._values is not None
+        img.release_values(['R'])
+        for Var in img.find_group('R')['R']:
+            assert Var._values is None
+        for df, df_should in zip(img.metric_df('snr'), self.img.metric_df('snr')):
+            assert df.equals(df_should)
+
+    def test_lazy_ignore_empty(self):
+        img = QA4SMImg(self.testfile_path, ignore_empty=True, lazy=True)
+        # empty variables are found without reading the values
+        assert all(Var._values is None for Var in img._vars.values())
+        should = QA4SMImg(self.testfile_path, ignore_empty=True)
+        assert img.ls_vars(False).tolist() == should.ls_vars(False).tolist()
+
+    @unittest.skipIf(dask is None, "dask is not installed")
+    def test_chunked(self):
+        img = QA4SMImg(self.testfile_path, ignore_empty=False, chunks={'dim': 10})
+        assert img.lazy
+        assert img.ls_vars(False).tolist() == self.img.ls_vars(False).tolist()
+        assert img._ds2da('R_between_3-ERA5_LAND_and_1-C3S').chunks is not None
+        assert img.metric_df('R').equals(self.img.metric_df('R'))
+
+    def test_extent_cut(self):
+        extent = (-158, -155, 19.7, 23)
+        img = QA4SMImg(self.testfile_path, extent=extent, ignore_empty=False)
+        assert img._extent_cut
+        lat, lon = globals.index_names
+        lats, lons = img.ds[lat].values, img.ds[lon].values
+        assert 0 < len(lats) < self.img.ds.sizes['dim']
+        assert np.all((lons >= extent[0]) & (lons <= extent[1]) &
+                      (lats >= extent[2]) & (lats <= extent[3]))
+        full = self.img.metric_df('R')
+        cut = full[(full.index.get_level_values(lon) >= extent[0]) &
+                   (full.index.get_level_values(lon) <= extent[1]) &
+                   (full.index.get_level_values(lat) >= extent[2]) &
+                   (full.index.get_level_values(lat) <= extent[3])]
+        assert img.metric_df('R').equals(cut)
+
+    def test_spatial_queries(self):
+        lat, lon = globals.index_names
+        lats, lons = self.img.ds[lat].values, self.img.ds[lon].values
+
+        idx = self.img.query_bbox(-158, -155, 19.7, 23)
+        should = np.flatnonzero((lons >= -158) & (lons <= -155) &
+                                (lats >= 19.7) & (lats <= 23))
+        assert np.array_equal(idx, should)
+
+        sub = self.img.query_bbox(-158, -155, 19.7, 23, as_image=True)
+        extent_img = QA4SMImg(self.testfile_path, extent=(-158, -155, 19.7, 23),
+                              ignore_empty=False)
+        assert sub.ls_vars(False).tolist() == extent_img.ls_vars(False).tolist()
+        assert sub.metric_df('R').equals(extent_img.metric_df('R'))
+
+        idx, dist = self.img.query_nearest(lons[5], lats[5])
+        assert idx.tolist() == [5] and dist[0] == 0
+        idx, dist = self.img.query_radius(lons[5], lats[5], 50000)
+        assert idx[0] == 5 and np.all(dist <= 50000)
+        idx = self.img.query_polygon([(-160, 19), (-155, 19), (-155, 23), (-160, 23)])
+        assert len(idx) == len(lats)
+
+    def test_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        extent = (-158, -155, 19.7, 23)
+        should = QA4SMImg(self.testfile_path, extent=extent)
+        for lazy in [False, False, True]:  # first is stored, then loaded
+            img = QA4SMImg(self.testfile_path, extent=extent, cache=cache_dir,
+                           lazy=lazy)
+            assert img.ls_vars(False).tolist() == should.ls_vars(False).tolist()
+            assert img.metric_df('R').equals(should.metric_df('R'))
+            assert img.metric_meta('snr') == should.metric_meta('snr')
+            # images loaded from the cache can be sent to other processes
+            img.release_values()
+            loaded = pickle.loads(pickle.dumps(img))
+            assert loaded.metric_df('R').equals(should.metric_df('R'))
+        assert len(os.listdir(cache_dir)) == 2
+        shutil.rmtree(cache_dir)
+
+
 if __name__ == '__main__':
     suite = unittest.TestSuite()
     suite.addTest(TestQA4SMImgBasicIntercomp("test_vars_in_file"))
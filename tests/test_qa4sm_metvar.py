@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from qa4sm_reader.handlers import QA4SMMetricVariable
+from qa4sm_reader.handlers import QA4SMMetricVariable, parse_varnames
 import unittest
 from tests.test_qa4sm_attrs import test_tc_attributes, test_attributes
 import pandas as pd
@@ -68,6 +68,22 @@ class TestMetricVariableTC(unittest.TestCase):
         assert mds_meta['short_version'] == 'C3S_V201812'
         assert mds_meta['pretty_version'] == 'v201812'
 
+    def test_parse_varnames(self):
+        parsed = parse_varnames(['n_obs', 'R_between_3-ERA5_LAND_and_1-C3S',
+                                 'beta_1-C3S_between_3-ERA5_LAND_and_1-C3S_and_2-ASCAT',
+                                 'mse_corr_between_3-ERA5_LAND_and_1-C3S',
+                                 'lat', 'snr_between_3-ERA5_LAND_and_1-C3S'])
+        assert parsed[0] == ('n_obs', 0, {'metric': 'n_obs'})
+        assert parsed[1] == ('R', 2, {'metric': 'R', 'ref_id': 3, 'ref_ds': 'ERA5_LAND',
+                                      'sat_id0': 1, 'sat_ds0': 'C3S'})
+        assert parsed[2] == ('beta', 3, {'metric': 'beta', 'mds_id': 1, 'mds': 'C3S',
+                                         'ref_id': 3, 'ref_ds': 'ERA5_LAND',
+                                         'sat_id0': 1, 'sat_ds0': 'C3S',
+                                         'sat_id1': 2, 'sat_ds1': 'ASCAT'})
+        assert parsed[3][:2] == ('mse_corr', 2)
+        assert parsed[4] == parsed[5] == (None, None, None)
+        assert self.beta.g == 3 and self.beta.metric == 'beta'
+
 class TestMetricVariableBasic(unittest.TestCase):
 
     def setUp(self) -> None:
@@ -76,6 +92,8 @@ class TestMetricVariableBasic(unittest.TestCase):
         self.n_obs = QA4SMMetricVariable('n_obs', attrs, values=df_nobs)
 
         self.r = QA4SMMetricVariable('R_between_6-ISMN_and_4-SMAP', attrs)
+        self.r_lazy = QA4SMMetricVariable('R_between_6-ISMN_and_4-SMAP', attrs,
+                                          loader=lambda v: pd.DataFrame(index=range(3), data={v: range(3)}))
         self.pr = QA4SMMetricVariable('p_rho_between_6-ISMN_and_5-ASCAT', attrs)
 
     def test_get_varmeta(self):
@@ -119,6 +137,17 @@ class TestMetricVariableBasic(unittest.TestCase):
         assert ds_meta['pretty_version'] == 'H113'
         assert mds is None
 
+    def test_lazy_values(self):
+        assert self.r.isempty()
+        self.r.release()  # no loader, nothing to release
+        assert self.n_obs.values is not None
+
+        assert self.r_lazy._values is None
+        assert not self.r_lazy.isempty()
+        assert list(self.r_lazy.values.columns) == ['R_between_6-ISMN_and_4-SMAP']
+        self.r_lazy.release()
+        assert self.r_lazy._values is None
+
 if __name__ == '__main__':
     unittest.main()
     # suite = unittest.TestSuite()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.plot_all import plot_all
+from qa4sm_reader.timing import StageTimer
+import os
+import unittest
+import tempfile
+import shutil
+
+class TestPlotAllParallel(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.testfile_path = os.path.join(os.path.dirname(__file__), 'test_data', 'tc',
+                                          '3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.nc')
+        self.serial_dir = tempfile.mkdtemp()
+        self.parallel_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.serial_dir)
+        shutil.rmtree(self.parallel_dir)
+
+    def test_same_files(self):
+        metrics = ['R', 'n_obs', 'snr']
+        boxes, maps = plot_all(self.testfile_path, metrics=metrics, out_dir=self.serial_dir)
+        timer = StageTimer()
+        boxes_par, maps_par = plot_all(self.testfile_path, metrics=metrics, out_dir=self.parallel_dir,
+                                       workers=2, trace=timer)
+        rel = lambda fnames, d: [os.path.relpath(fn, d) for fn in fnames]
+        assert rel(boxes, self.serial_dir) == rel(boxes_par, self.parallel_dir)
+        assert rel(maps, self.serial_dir) == rel(maps_par, self.parallel_dir)
+        assert sorted(os.listdir(self.serial_dir)) == sorted(os.listdir(self.parallel_dir))
+
+        # timing records of the workers are collected
+        map_records = [r for r in timer.records if r['path'] == 'plot_all/mapplot_var']
+        assert len(map_records) == len(maps_par)
+        assert all(r['worker'] != os.getpid() for r in map_records)
+
+    def test_multi(self):
+        metrics = ['R', 'n_obs']
+        for multi in [False, True]:
+            boxes, maps = plot_all(self.testfile_path, metrics=metrics, out_dir=self.serial_dir,
+                                   mapplot_kwargs={'multi': multi})
+            boxes_par, maps_par = plot_all(self.testfile_path, metrics=metrics,
+                                           out_dir=self.parallel_dir, workers=2,
+                                           mapplot_kwargs={'multi': multi})
+            rel = lambda fnames, d: [os.path.relpath(fn, d) for fn in fnames]
+            assert rel(maps, self.serial_dir) == rel(maps_par, self.parallel_dir)
+            if multi:
+                assert len(maps_par) == len(metrics)  # one figure per metric
+        assert sorted(os.listdir(self.serial_dir)) == sorted(os.listdir(self.parallel_dir))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,14 @@ import os
 import unittest
 import tempfile
 import shutil
+import numpy as np
+import matplotlib.pyplot as plt
+from qa4sm_reader.plot_utils import get_quantiles, get_stats, save_figure
+
+try:
+    import dask
+except ImportError:
+    dask = None
 
 class TestQA4SMMetaImgISMNPlotter_newFormat(unittest.TestCase):
 
@@ -147,6 +155,115 @@ class TestQA4SMMetaImgBasicPlotter(unittest.TestCase):
 
         shutil.rmtree(self.plotdir)
 
+    @unittest.skipIf(dask is None, "dask is not installed")
+    def test_chunked_stats(self):
+        img = QA4SMImg(self.testfile_path, chunks={'dim': 5})
+        plotter = QA4SMPlotter(img, self.plotdir)
+        for var in img.ls_vars(False):
+            da = img._ds2da(var)
+            series = self.img._ds2df([var])[var]
+            assert np.allclose(get_stats(da), get_stats(series))
+            assert np.allclose(get_quantiles(da, [0.025, 0.975]),
+                               get_quantiles(series, [0.025, 0.975]))
+        for metric in img.ls_metrics(False):
+            stats = img.metric_stats(metric)
+            assert np.allclose(stats.values.astype(float),
+                               self.img.metric_stats(metric).values.astype(float),
+                               equal_nan=True)
+            for var in stats.index:
+                assert plotter._box_stats(stats.loc[var]) == \
+                       self.plotter._box_stats(self.img.metric_stats(metric).loc[var])
+
+        r_files = plotter.boxplot_basic('R', out_type='png')
+        assert len(list(r_files)) == 1
+        snr_files = plotter.boxplot_tc('snr', out_type='png')
+        assert len(list(snr_files)) == 2
+
+        shutil.rmtree(self.plotdir)
+
+    def test_grid(self):
+        grid = self.img.grid
+        assert self.img.grid is grid  # inferred once
+        assert not grid.irregular
+        lons, lats = self.img._locations()
+        assert len(grid.rows) == len(grid.cols) == len(lons)
+        assert (grid.rows.max() < grid.shape[0]) and (grid.cols.max() < grid.shape[1])
+        for var in self.img.metric_meta('R'):
+            df = self.img._ds2df([var])
+            zz, extent, origin = geotraj_to_geo2d(df, var)
+            zz_grid, extent_grid, origin_grid = geotraj_to_geo2d(df, var, grid=grid)
+            assert origin == origin_grid == 'lower'
+            assert zz_grid.shape == grid.shape
+            np.testing.assert_array_equal(np.sort(zz[~np.isnan(zz)]),
+                                          np.sort(zz_grid[~np.isnan(zz_grid)]))
+            if extent == extent_grid:
+                np.testing.assert_array_equal(zz, zz_grid)
+
+    def test_map_background(self):
+        r_files = self.plotter.mapplot('R', out_type='png')
+        assert len(self.plotter.backgrounds) == 1  # all variables share the base map
+        bg = list(self.plotter.backgrounds._backgrounds.values())[0]
+        n_images = len(bg.ax.images)
+        assert n_images == 1  # the values of the last map
+        bg.clear()
+        assert len(bg.ax.images) == 0
+        assert bg.ax.get_title() == ''
+
+        # same files and sizes as without reuse
+        plotdir = tempfile.mkdtemp()
+        plotter = QA4SMPlotter(self.img, plotdir, reuse_background=False)
+        assert plotter.backgrounds is None
+        r_files_new = plotter.mapplot('R', out_type='png')
+        assert [os.path.basename(f) for f in r_files] == [os.path.basename(f) for f in r_files_new]
+        for f, f_new in zip(r_files, r_files_new):
+            assert os.path.getsize(f) > 0
+            assert plt.imread(f).shape == plt.imread(f_new).shape
+
+        shutil.rmtree(plotdir)
+        shutil.rmtree(self.plotdir)
+
+    def test_mapplot_multi(self):
+        r_files = self.plotter.mapplot('R', out_type=['png', 'svg'], multi=True)
+        assert len(r_files) == 2  # one figure for both variables
+        assert sorted(os.listdir(self.plotdir)) == sorted(os.path.basename(f) for f in r_files)
+
+        plotter = QA4SMPlotter(self.img)
+        fig, axes = plotter.mapplot_multi('R')
+        assert len(axes) == len(self.img.metric_meta('R'))
+        images = [ax.images[0] for ax in axes]
+        assert len(set(im.get_clim() for im in images)) == 1  # shared value range
+        assert len(fig.axes) == len(axes) + 1  # a single colorbar
+        assert all(ax.get_title() != '' for ax in axes)
+        plt.close(fig)
+
+        shutil.rmtree(self.plotdir)
+
+class TestSaveFigure(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.plotdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        plt.close('all')
+        shutil.rmtree(self.plotdir)
+
+    def test_save_figure(self):
+        fig, ax = plt.subplots(figsize=(4, 3), dpi=100)
+        ax.plot([0, 1], [0, 1])
+        ax.set_title('title')
+        fig.text(0.5, 0., 'watermark')
+        fnames = [os.path.join(self.plotdir, 'fig' + ext) for ext in ['.png', '.svg', '.pdf', '.jpg']]
+        assert save_figure(fig, fnames) == fnames
+        for fname in fnames:
+            assert os.path.getsize(fname) > 0
+
+        ref = os.path.join(self.plotdir, 'ref.png')
+        fig.savefig(ref, dpi='figure', bbox_inches='tight')
+        png, ref_png = plt.imread(fnames[0]), plt.imread(ref)
+        assert abs(png.shape[0] - ref_png.shape[0]) <= 1
+        assert abs(png.shape[1] - ref_png.shape[1]) <= 1
+        assert plt.imread(fnames[3]).shape[:2] == png.shape[:2]
+
 class TestQA4SMMetaImgIrregularGridPlotter(unittest.TestCase):
     def setUp(self) -> None:
         self.testfile = '0-SMAP.soil_moisture_with_1-C3S.sm.nc'
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.spatial import QA4SMSpatialIndex, _haversine
+import numpy as np
+import unittest
+
+class TestQA4SMSpatialIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(42)
+        self.lon = rng.uniform(-180, 180, 20000)
+        self.lat = rng.uniform(-90, 90, 20000)
+        self.index = QA4SMSpatialIndex(self.lon, self.lat, cell_size=2.)
+
+    def test_bbox(self):
+        lon, lat = self.lon, self.lat
+        idx = self.index.bbox(-10, 30, 35, 70)
+        should = np.flatnonzero((lon >= -10) & (lon <= 30) & (lat >= 35) & (lat <= 70))
+        assert np.array_equal(idx, should)
+
+        # crossing the antimeridian
+        idx = self.index.bbox(170, -170, -10, 10)
+        should = np.flatnonzero(((lon >= 170) | (lon <= -170)) & (lat >= -10) & (lat <= 10))
+        assert np.array_equal(idx, should)
+
+        assert len(self.index.bbox(-180, 180, -90, 90)) == len(lon)
+
+    def test_polygon(self):
+        triangle = [(0, 0), (40, 0), (0, 40)]
+        idx = self.index.polygon(triangle)
+        lon, lat = self.lon[idx], self.lat[idx]
+        assert len(idx) > 0
+        assert np.all((lon >= 0) & (lat >= 0) & (lon + lat <= 40))
+        should = np.flatnonzero((self.lon > 0.1) & (self.lat > 0.1) &
+                                (self.lon + self.lat < 39.9))
+        assert set(should).issubset(set(idx))
+
+    def test_radius(self):
+        for lon, lat, radius in [(0, 0, 500e3), (179.9, 10, 300e3), (10, 89.5, 200e3)]:
+            idx, dist = self.index.radius(lon, lat, radius)
+            should = _haversine(lon, lat, self.lon, self.lat) <= radius
+            assert set(idx) == set(np.flatnonzero(should))
+            assert np.all(np.diff(dist) >= 0)
+
+    def test_nearest(self):
+        for lon, lat in [(0, 0), (-179.9, -45), (120, 89.9)]:
+            dist_all = _haversine(lon, lat, self.lon, self.lat)
+            idx, dist = self.index.nearest(lon, lat, k=3)
+            assert np.array_equal(idx, np.argsort(dist_all)[:3])
+            assert np.allclose(dist, np.sort(dist_all)[:3])
+
+        idx, dist = self.index.nearest(0, 0, k=3, max_dist=1.)
+        assert len(idx) == len(dist) == 0
+
+if __name__ == '__main__':
+    unittest.main()
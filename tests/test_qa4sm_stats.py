@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.stats import summary_stats, chunked_summary_stats, chunked_quantiles, \
+    quantile_name
+from qa4sm_reader.img import QA4SMImg
+import os
+import unittest
+import numpy as np
+import pandas as pd
+
+try:
+    import dask
+except ImportError:
+    dask = None
+
+class TestSummaryStats(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(42)
+        a = rng.normal(size=(500, 3))
+        a[rng.random(a.shape) < 0.2] = np.nan
+        a[:, 2] = np.nan
+        a[:4, 2] = [1., 2., 3., 100.]
+        self.df = pd.DataFrame(a, columns=['a', 'b', 'c'])
+
+    def test_summary_stats(self):
+        stats = summary_stats(self.df, quantiles=[0.025, 0.975])
+        assert list(stats.index) == ['a', 'b', 'c']
+        for col in self.df.columns:
+            s = self.df[col].dropna()
+            q1, q3 = s.quantile(0.25), s.quantile(0.75)
+            assert stats.loc[col, 'count'] == s.count()
+            np.testing.assert_allclose(
+                stats.loc[col, ['mean', 'std', 'min', 'q1', 'median', 'q3', 'max',
+                                quantile_name(0.025), quantile_name(0.975)]].values.astype(float),
+                [s.mean(), s.std(), s.min(), q1, s.median(), q3, s.max(),
+                 s.quantile(0.025), s.quantile(0.975)])
+            assert stats.loc[col, 'whislo'] == s[s >= q1 - 1.5 * (q3 - q1)].min()
+            assert stats.loc[col, 'whishi'] == s[s <= q3 + 1.5 * (q3 - q1)].max()
+        assert stats.loc['c', 'whishi'] == 3.
+
+    def test_empty(self):
+        stats = summary_stats(pd.DataFrame({'a': [np.nan, np.nan]}))
+        assert stats.loc['a', 'count'] == 0
+        assert np.isnan(stats.loc['a', 'median'])
+        stats = summary_stats(pd.DataFrame({'a': []}, dtype=float))
+        assert stats.loc['a', 'count'] == 0
+
+    @unittest.skipIf(dask is None, "dask is not installed")
+    def test_chunked_summary_stats(self):
+        import xarray as xr
+        stats = summary_stats(self.df)
+        for col in self.df.columns:
+            da = xr.DataArray(self.df[col].values, name=col).chunk(50)
+            chunked = chunked_summary_stats(da)
+            pd.testing.assert_frame_equal(chunked, stats.loc[[col]])
+
+    @unittest.skipIf(dask is None, "dask is not installed")
+    def test_chunked_quantiles_skewed(self):
+        import dask.array as dska
+        rng = np.random.default_rng(1)
+        a = np.concatenate([rng.random(100000), [1e9], [np.nan] * 10])
+        a[:1000] = 0.5  # duplicates
+        quantiles = [0.025, 0.25, 0.5, 0.75, 0.975, 1.]
+        q = chunked_quantiles(dska.from_array(a, chunks=10000), quantiles, bins=100,
+                              max_values=500)
+        np.testing.assert_allclose(q, pd.Series(a).quantile(quantiles).values)
+
+    def test_img_metric_stats(self):
+        testfile_path = os.path.join(os.path.dirname(__file__), 'test_data', 'tc',
+                                     '3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.nc')
+        img = QA4SMImg(testfile_path)
+        stats = img.metric_stats('snr')
+        assert stats is img.metric_stats('snr')  # cached
+        assert list(stats.index) == [Var.varname for Var in img.triple['snr']]
+        for var in stats.index:
+            s = img._ds2df([var])[var]
+            assert stats.loc[var, 'count'] == s.count()
+            assert np.isclose(stats.loc[var, 'median'], s.median())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.synthetic import create_results
+from qa4sm_reader.img import QA4SMImg
+from qa4sm_reader import globals
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+class TestQA4SMSynthetic(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.outdir)
+
+    def test_gridded(self):
+        filepath = create_results(self.outdir, n_points=500, n_datasets=2)
+        assert os.path.basename(filepath) == '0-SMAP.soil_moisture_with_1-C3S.sm.nc'
+        img = QA4SMImg(filepath)
+        assert img.ds.sizes['loc'] == 500
+        assert img.ref_dataset_grid_stepsize == 1.
+        assert img.parse_filename()['ds1'] == 'C3S'
+        assert len(img.ls_vars(False)) == 1 + len(globals.metric_groups[2])
+        R = img.metric_df('R').iloc[:, 0]  # without the missing values
+        assert 400 < len(R) < 500
+        assert R.min() >= -1 and R.max() <= 1
+
+    def test_tc_scattered(self):
+        filepath = create_results(self.outdir, n_points=100, n_datasets=4, tc=True,
+                                  scattered=True)
+        img = QA4SMImg(filepath)
+        assert img.ref_meta()[1]['short_name'] == 'ISMN'
+        assert 'val_dc_dataset0_grid_stepsize' not in img.ds.attrs
+        # 3 pairs of the non-reference datasets, a variable per metric dataset in each
+        assert len(img.ls_vars(False)) == 1 + 3 * len(globals.metric_groups[2]) + \
+               3 * 2 * len(globals.metric_groups[3])
+        assert len(img.metric_df('snr')) == 3
+
+    def test_seed(self):
+        a = create_results(self.outdir, n_points=50, seed=1, compress=False)
+        values_a = QA4SMImg(a).metric_df('BIAS').values
+        os.remove(a)
+        b = create_results(self.outdir, n_points=50, seed=1)
+        np.testing.assert_array_equal(values_a, QA4SMImg(b).metric_df('BIAS').values)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            create_results(self.outdir, n_points=10, n_datasets=2, tc=True)
+        with self.assertRaises(ValueError):
+            create_results(self.outdir, n_points=10, n_datasets=7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.img import QA4SMImg
+from qa4sm_reader.tiles import export_tiles, get_tile_layer, lonlat2tile, tile_pixels, tile_range, \
+    TileLayer
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import matplotlib.pyplot as plt
+
+class TestTileGeometry(unittest.TestCase):
+
+    def test_tiles(self):
+        assert lonlat2tile(0., 0., 0) == (0, 0)
+        x, y = lonlat2tile(np.array([-179., 179.]), np.array([80., -80.]), 1)
+        assert list(x) == [0, 1] and list(y) == [0, 1]
+        lon, lat = tile_pixels(0, 0, 0, tile_size=4)
+        assert np.allclose(lon, [-135., -45., 45., 135.])
+        assert (np.diff(lat) < 0).all()  # from north to south
+        xs, ys = tile_range((10., 20., 40., 50.), 4)
+        assert list(xs) == [8] and list(ys) == [5, 6]
+
+    def test_sparse_values(self):
+        # a single value in a global 0.1 degree raster is in the tiles of all zoom levels
+        zz = np.full((1800, 3600), np.nan)
+        zz[1000, 2000] = 0.5
+        layer = TileLayer(zz, (-180., 180., -90., 90.), 'lower', 'viridis', (0., 1.))
+        lon, lat = -180. + 2000.05 * 0.1, -90. + 1000.05 * 0.1
+        for zoom in range(0, 9):
+            x, y = lonlat2tile(lon, lat, zoom)
+            rgba = layer.render(x, y, zoom)
+            assert rgba is not None
+            assert np.count_nonzero(rgba[..., 3]) >= 1
+        assert len(layer._levels) > 0
+
+class TestTileExport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.testfile_path = os.path.join(os.path.dirname(__file__), 'test_data', 'tc',
+                                          '3-GLDAS.SoilMoi0_10cm_inst_with_1-C3S.sm_with_2-SMOS.Soil_Moisture.nc')
+        self.img = QA4SMImg(self.testfile_path)
+        self.varname = list(self.img.metric_meta('R').keys())[0]
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.outdir)
+
+    def test_export(self):
+        fnames = export_tiles(self.img, self.varname, self.outdir, zooms=[0, 1, 2, 3], workers=2)
+        assert len(fnames) > 0
+        assert fnames == export_tiles(self.img, self.varname, self.outdir, zooms=[0, 1, 2, 3],
+                                      workers=1)
+        zooms = set(int(os.path.relpath(f, self.outdir).split(os.sep)[0]) for f in fnames)
+        assert zooms == {0, 1, 2, 3}
+        assert [f for f in fnames if os.path.relpath(f, self.outdir).startswith('0')] == \
+               [os.path.join(self.outdir, '0', '0', '0.png')]
+        tile = plt.imread(fnames[0])
+        assert tile.shape == (256, 256, 4)
+        assert 0 < np.count_nonzero(tile[..., 3]) < 256 * 256  # transparent where there are no values
+
+    def test_empty_tiles(self):
+        layer = get_tile_layer(self.img, self.varname)
+        df = self.img._ds2df([self.varname]).dropna()
+        lat, lon = df.index.get_level_values('lat')[0], df.index.get_level_values('lon')[0]
+        x, y = lonlat2tile(lon, lat, 3)
+        assert layer.render((x + 4) % 8, y, 3) is None  # other side of the globe
+        assert layer.render(x, y, 3) is not None
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.timing import StageTimer, stage, active_timer, trace_from_env
+from qa4sm_reader.plot_all import plot_all
+from qa4sm_reader import globals
+import os
+import json
+import unittest
+import tempfile
+import shutil
+
+class TestStageTimer(unittest.TestCase):
+
+    def test_stages(self):
+        records = []
+        with stage('not_recorded'):  # no timer active
+            pass
+        assert active_timer() is None
+        with StageTimer(callback=records.append) as timer:
+            assert active_timer() is timer
+            with stage('outer', metric='R'):
+                for _ in range(2):
+                    with stage('inner'):
+                        sum(range(10000))
+        assert active_timer() is None
+
+        assert [r['path'] for r in timer.records] == ['outer/inner', 'outer/inner', 'outer']
+        assert records == timer.records
+        outer = timer.records[-1]
+        assert outer['metric'] == 'R'
+        assert outer['wall'] >= sum(r['wall'] for r in timer.records[:2])
+        assert outer['cpu'] >= 0
+
+        summary = timer.summary()
+        assert summary['outer/inner']['calls'] == 2
+        assert summary['outer']['calls'] == 1
+
+    def test_trace_from_env(self):
+        old = os.environ.pop(globals.trace_env, None)
+        try:
+            assert trace_from_env() is None
+            os.environ[globals.trace_env] = '1'
+            assert trace_from_env() is True
+            os.environ[globals.trace_env] = '/tmp/report.json'
+            assert trace_from_env() == '/tmp/report.json'
+        finally:
+            os.environ.pop(globals.trace_env, None)
+            if old is not None:
+                os.environ[globals.trace_env] = old
+
+class TestPlotAllTrace(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.testfile_path = os.path.join(os.path.dirname(__file__), 'test_data', 'basic',
+                                          '0-ISMN.soil moisture_with_1-C3S.sm.nc')
+        self.plotdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.plotdir)
+
+    def test_report(self):
+        fnames_box, fnames_maps = plot_all(self.testfile_path, metrics=['R', 'n_obs'],
+                                           out_dir=self.plotdir, trace=True)
+        report_path = os.path.join(self.plotdir, globals.trace_report)
+        assert os.path.isfile(report_path)
+        with open(report_path) as f:
+            report = json.load(f)
+        paths = set(report['summary'].keys())
+        assert {'plot_all', 'plot_all/load', 'plot_all/boxplot', 'plot_all/maps'} <= paths
+        assert report['summary']['plot_all/boxplot']['calls'] == 2
+        saved = [r for r in report['records'] if r['stage'] == 'savefig']
+        assert len(saved) == len(fnames_box) + len(fnames_maps)
+        maps = [r for r in report['records'] if r['stage'] == 'mapplot_var']
+        assert len(maps) == len(fnames_maps)
+
+    def test_timer(self):
+        timer = StageTimer()
+        plot_all(self.testfile_path, metrics=['R'], out_dir=self.plotdir, trace=timer)
+        assert not os.path.isfile(os.path.join(self.plotdir, globals.trace_report))
+        assert timer.records[-1]['path'] == 'plot_all'
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from qa4sm_reader.img import QA4SMImg
+from qa4sm_reader.collection import QA4SMImgCollection
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+
+try:
+    import zarr
+    from qa4sm_reader.zarr_store import nc_to_zarr, is_zarr
+except ImportError:
+    zarr = None
+
+@unittest.skipIf(zarr is None, "zarr is not installed")
+class TestQA4SMZarr(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.testfile_path = os.path.join(os.path.dirname(__file__), 'test_data', 'tc',
+                                          '3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.nc')
+        self.outdir = tempfile.mkdtemp()
+        self.zarr_path = nc_to_zarr(self.testfile_path, os.path.join(
+            self.outdir, '3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.zarr'),
+                                    chunk_bytes=256)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.outdir)
+
+    def test_convert(self):
+        assert is_zarr(self.zarr_path)
+        assert not is_zarr(self.testfile_path)
+        with self.assertRaises(FileExistsError):
+            nc_to_zarr(self.testfile_path, self.zarr_path)
+        store = zarr.open_group(self.zarr_path, mode='r')
+        assert store['R_between_3-ERA5_LAND_and_1-C3S'].chunks == (64,)  # 256 bytes of float32
+
+    def test_load(self):
+        img_nc = QA4SMImg(self.testfile_path)
+        img_zarr = QA4SMImg(self.zarr_path)
+        assert img_zarr.filename == '3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.zarr'
+        assert img_zarr.parse_filename() == img_nc.parse_filename()
+        assert list(img_zarr.ls_vars(False)) == list(img_nc.ls_vars(False))
+        for metric in ['R', 'snr']:
+            df_nc, df_zarr = img_nc.metric_df(metric), img_zarr.metric_df(metric)
+            if isinstance(df_nc, list):
+                df_nc, df_zarr = pd.concat(df_nc, axis=1), pd.concat(df_zarr, axis=1)
+            pd.testing.assert_frame_equal(df_nc, df_zarr)
+
+    def test_lazy_extent(self):
+        extent = (-160, -155, 15, 25)
+        img_nc = QA4SMImg(self.testfile_path, extent=extent, lazy=True)
+        img_zarr = QA4SMImg(self.zarr_path, extent=extent, lazy=True)
+        pd.testing.assert_frame_equal(img_nc.metric_stats('R'), img_zarr.metric_stats('R'))
+
+    def test_collection(self):
+        shutil.copy(self.testfile_path, os.path.join(self.outdir, 'results.nc'))
+        coll = QA4SMImgCollection(self.outdir, workers=1)
+        assert [name for name, _ in coll] == \
+               ['3-ERA5_LAND.swvl1_with_1-C3S.sm_with_2-ASCAT.sm.zarr', 'results.nc']
+
+if __name__ == '__main__':
+    unittest.main()